@@ -0,0 +1,117 @@
+"""Answer cache for /chat/ with an exact-question tier and an embedding-similarity tier.
+
+Every entry is stored under the data version it was answered from, so any
+upload or clear (which bumps the version) makes older answers unreachable.
+Entries are evicted least-recently-used first and expire after a TTL.
+"""
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional
+
+import numpy as np
+
+MAX_ENTRIES = int(os.getenv("CSV_RAG_ANSWER_CACHE_SIZE", "1000"))
+TTL_SECONDS = float(os.getenv("CSV_RAG_ANSWER_CACHE_TTL", "3600"))
+# Cosine similarity two questions need before one's answer is reused for the other.
+SIMILARITY_THRESHOLD = float(os.getenv("CSV_RAG_ANSWER_CACHE_SIMILARITY", "0.95"))
+
+
+def question_key(question: str, top_k: int, page: str = "") -> str:
+    """Cache key for a question; `page` tells apart the pages of a paginated list answer."""
+    key = f"{' '.join(question.lower().split())}|{top_k}"
+    return f"{key}|{page}" if page else key
+
+
+class AnswerCache:
+    def __init__(self, max_entries: int = MAX_ENTRIES, ttl: float = TTL_SECONDS,
+                 similarity_threshold: float = SIMILARITY_THRESHOLD):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.similarity_threshold = similarity_threshold
+        self._entries = OrderedDict()
+        self._version = None
+        self._lock = threading.Lock()
+        self.exact_hits = 0
+        self.semantic_hits = 0
+        self.misses = 0
+
+    def _switch_version(self, version: int) -> bool:
+        """Moves the cache to `version`, dropping older answers that can never be served again.
+
+        Returns False for a version older than the current one.
+        """
+        if self._version is not None and version < self._version:
+            return False
+        if version != self._version:
+            self._entries.clear()
+            self._version = version
+        return True
+
+    def _live(self, key) -> Optional[dict]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if entry["expires_at"] < time.monotonic():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return entry
+
+    def get_exact(self, version: int, key: str) -> Optional[dict]:
+        with self._lock:
+            entry = self._live(key) if self._switch_version(version) else None
+            if entry is None:
+                return None
+            self.exact_hits += 1
+            return entry["value"]
+
+    def get_similar(self, version: int, embedding: np.ndarray, top_k: int) -> Optional[dict]:
+        """Returns the answer of the most similar cached question, if it is similar enough."""
+        with self._lock:
+            current = self._switch_version(version)
+            keys = [key for key, entry in self._entries.items()
+                    if current and entry["embedding"] is not None and entry["top_k"] == top_k]
+            if keys:
+                matrix = np.vstack([self._entries[key]["embedding"] for key in keys])
+                scores = matrix @ embedding.reshape(-1)
+                best = int(np.argmax(scores))
+                if scores[best] >= self.similarity_threshold:
+                    entry = self._live(keys[best])
+                    if entry is not None:
+                        self.semantic_hits += 1
+                        return entry["value"]
+            self.misses += 1
+            return None
+
+    def record_miss(self):
+        with self._lock:
+            self.misses += 1
+
+    def put(self, version: int, key: str, value: dict, top_k: int, embedding: Optional[np.ndarray] = None):
+        with self._lock:
+            # An answer computed while an upload landed is already stale; don't keep it.
+            if not self._switch_version(version):
+                return
+            self._entries[key] = {
+                "value": value,
+                "top_k": top_k,
+                "embedding": None if embedding is None else embedding.reshape(-1).astype(np.float32),
+                "expires_at": time.monotonic() + self.ttl,
+            }
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.exact_hits + self.semantic_hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "data_version": self._version,
+                "exact_hits": self.exact_hits,
+                "semantic_hits": self.semantic_hits,
+                "misses": self.misses,
+                "hit_rate": round((self.exact_hits + self.semantic_hits) / lookups, 4) if lookups else 0.0,
+            }
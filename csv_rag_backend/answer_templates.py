@@ -0,0 +1,81 @@
+"""Template answers for the exact-match tools, rendered without the LLM.
+
+A USN lookup, a year filter or a structured count already has the exact
+rows or numbers; asking Gemini to restate them only adds seconds of latency.
+With answer_style "auto" (the default) those answers are formatted straight
+from the stored rows; the LLM still writes the answer for vector search,
+follow-ups, exact-tool questions that ask for more than the facts
+("explain", "compare", ...) or that a structured plan only partly covers,
+and for every question sent with answer_style "prose". AnswerStats counts how often the LLM was bypassed and why.
+"""
+import re
+import threading
+from typing import List
+
+from context_packing import render_table
+from field_index import parse_display_text
+
+# Tools whose results are exact, so a template states them as well as the LLM would.
+TEMPLATE_TOOLS = {"usn", "year_filter", "structured"}
+OPEN_ENDED_PATTERN = re.compile(
+    r"\b(why|how come|explain|compare|summari[sz]e|describe|suggest|recommend|advise|write|should|could you tell)\b",
+    re.IGNORECASE,
+)
+# How an answer was produced, for AnswerStats; everything but "llm" bypassed the LLM.
+ANSWER_SOURCES = ("llm", "template", "cache", "direct")
+
+
+def wants_template(tool: str, argument, question: str, answer_style: str) -> bool:
+    """True when an exact tool's result should be rendered instead of written by the LLM.
+
+    A structured plan is only rendered when it accounts for every word of the question.
+    """
+    if answer_style == "prose" or tool not in TEMPLATE_TOOLS or OPEN_ENDED_PATTERN.search(question):
+        return False
+    return tool != "structured" or not argument["unexplained"]
+
+
+def render_record(doc: dict) -> str:
+    """One stored row as "- column: value" lines."""
+    return "\n".join(f"- **{col}**: {value}" for col, value in parse_display_text(doc.get("text", "")).items())
+
+
+def render_usn(usn: str, docs: List[dict]) -> str:
+    if len(docs) == 1:
+        return f"Here are the details for USN {usn.upper()}:\n\n{render_record(docs[0])}"
+    return f"Found {len(docs)} records for USN {usn.upper()}:\n\n{render_table(docs)}"
+
+
+def render_list(summary: str, table: str) -> str:
+    """A list tool's first page: the exact match count, then the table of rows."""
+    return f"{summary}\n\n{table}"
+
+
+def year_summary(year: str, total: int) -> str:
+    return f"Found {total} {'student' if total == 1 else 'students'} in {year.title()}."
+
+
+class AnswerStats:
+    """Counts answers by how they were produced; the LLM-bypass rate is the share not written by the LLM."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counts = {source: 0 for source in ANSWER_SOURCES}
+        self._template_tools = {tool: 0 for tool in sorted(TEMPLATE_TOOLS)}
+
+    def record(self, source: str, tool: str = ""):
+        with self._lock:
+            self._counts[source] += 1
+            if source == "template":
+                self._template_tools[tool] += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            answers = sum(self._counts.values())
+            bypassed = answers - self._counts["llm"]
+            return {
+                "answers": answers,
+                **{f"{source}_answers": count for source, count in self._counts.items()},
+                "template_answers_by_tool": dict(self._template_tools),
+                "llm_bypass_rate": round(bypassed / answers, 4) if answers else 0.0,
+            }
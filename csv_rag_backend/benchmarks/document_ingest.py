@@ -0,0 +1,101 @@
+"""Throughput of PDF ingestion: extraction and chunking per worker count, then embedding.
+
+Writes a synthetic multi-page PDF (circular-style paragraphs of student and
+exam text), extracts and chunks it with the extraction pool at each worker
+count, and embeds the resulting chunks in CSV_RAG_EMBED_BATCH_SIZE batches,
+so CSV_RAG_EXTRACT_WORKERS can be picked from measured pages/s.
+
+Run from the csv_rag_backend directory:
+
+    python -m benchmarks.document_ingest --pages 500
+    python -m benchmarks.document_ingest --workers 1 2 4 8 --json pdf.json
+"""
+import argparse
+import json
+import os
+import tempfile
+import time
+
+import numpy as np
+
+from benchmarks.embedding_backends import DEPARTMENTS, FIRST_NAMES, LAST_NAMES, MODEL_NAME, YEARS
+from document_ingest import ExtractionPool
+from embedding_backend import load_embedding_model
+
+LINES_PER_PAGE = 40
+
+
+def synthetic_pdf(path: str, pages: int, seed: int = 0):
+    """A PDF of `pages` pages, each with LINES_PER_PAGE lines of notice text."""
+    import fitz
+
+    rng = np.random.default_rng(seed)
+    doc = fitz.open()
+    for page_no in range(pages):
+        lines = [f"Notice {page_no + 1}: examination arrangements for {rng.choice(YEARS)} students."]
+        for _ in range(LINES_PER_PAGE - 1):
+            name = f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}"
+            lines.append(f"{name} of {rng.choice(DEPARTMENTS)} sits in hall GLH-{rng.integers(1, 20):02d}, "
+                         f"seat {rng.integers(1, 60)}, attendance {rng.integers(40, 100)}%.")
+        page = doc.new_page()
+        page.insert_text((36, 36), "\n".join(lines), fontsize=8)
+    doc.save(path)
+    doc.close()
+
+
+def measure_extraction(path: str, workers: int) -> dict:
+    pool = ExtractionPool(workers)
+    # Warm-up: start the worker processes (and let them import PyMuPDF) outside the timed run.
+    for _ in pool.iter_pdf_chunks(path):
+        pass
+    start = time.perf_counter()
+    chunks, pages = [], 0
+    for batch, pages_done, _ in pool.iter_pdf_chunks(path):
+        chunks.extend(text for _, _, text in batch)
+        pages = pages_done
+    seconds = time.perf_counter() - start
+    pool.shutdown()
+    return {"workers": workers, "pages": pages, "chunks": len(chunks), "seconds": round(seconds, 3),
+            "pages_per_s": round(pages / seconds, 1), "texts": chunks}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pages", type=int, default=500)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--batch-size", type=int, default=int(os.getenv("CSV_RAG_EMBED_BATCH_SIZE", "256")))
+    parser.add_argument("--backend", default=os.getenv("CSV_RAG_EMBEDDING_BACKEND", "torch"))
+    parser.add_argument("--json", help="also write the report to this file")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "notices.pdf")
+        synthetic_pdf(path, args.pages)
+        print(f"📊 {args.pages}-page PDF ({os.path.getsize(path) / 1e6:.1f} MB)")
+        extraction = []
+        for workers in args.workers:
+            result = measure_extraction(path, workers)
+            extraction.append(result)
+            print(f"extract+chunk workers={workers:<2} {result['pages_per_s']} pages/s  "
+                  f"{result['chunks']} chunks in {result['seconds']}s")
+
+    texts = extraction[-1]["texts"]
+    model, backend = load_embedding_model(MODEL_NAME, args.backend)
+    model.encode(texts[:args.batch_size], convert_to_numpy=True, show_progress_bar=False)  # warm-up
+    start = time.perf_counter()
+    for i in range(0, len(texts), args.batch_size):
+        model.encode(texts[i:i + args.batch_size], convert_to_numpy=True, show_progress_bar=False)
+    embed_s = time.perf_counter() - start
+    embedding = {"backend": backend, "chunks_per_s": round(len(texts) / embed_s, 1),
+                 "pages_per_s": round(args.pages / embed_s, 1)}
+    print(f"embed ({backend}) {embedding['chunks_per_s']} chunks/s = {embedding['pages_per_s']} pages/s")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"pages": args.pages, "batch_size": args.batch_size,
+                       "extraction": [{k: v for k, v in row.items() if k != "texts"} for row in extraction],
+                       "embedding": embedding}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
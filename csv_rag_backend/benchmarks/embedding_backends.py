@@ -0,0 +1,120 @@
+"""Throughput and query-encode latency of the embedding backends.
+
+Encodes the same synthetic student rows and questions with every
+CSV_RAG_EMBEDDING_BACKEND, and reports ingest throughput (rows/s in
+CSV_RAG_EMBED_BATCH_SIZE batches), single-question encode latency, and how
+closely each backend's vectors agree with eager PyTorch.
+
+Run from the csv_rag_backend directory:
+
+    python -m benchmarks.embedding_backends --rows 5000
+    python -m benchmarks.embedding_backends --backends torch onnx-int8 --json embed.json
+"""
+import argparse
+import json
+import os
+import time
+
+import numpy as np
+
+from embedding_backend import BACKENDS, load_embedding_model
+
+MODEL_NAME = "all-MiniLM-L6-v2"
+FIRST_NAMES = ["ADIL", "AISHA", "FATHIMA", "MOHAMMED", "RAHUL", "SNEHA", "UMMAL", "VIKAS", "ZAIN", "PRIYA"]
+LAST_NAMES = ["HAFEEZ", "KHAIR", "SHETTY", "RAO", "NAIK", "KUMAR", "P K", "BHAT", "D'SOUZA", "HEGDE"]
+DEPARTMENTS = ["AI", "CS", "EC", "ME", "CV"]
+YEARS = ["First Year", "Second Year", "Third Year", "Final Year"]
+
+
+def synthetic_rows(count: int, seed: int = 0):
+    """Row embedding texts shaped like the uploaded student sheets."""
+    rng = np.random.default_rng(seed)
+    rows = []
+    for i in range(count):
+        usn = f"4DM{rng.integers(19, 25)}{rng.choice(DEPARTMENTS)}{rng.integers(1, 200):03d}"
+        name = f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}"
+        rows.append(f"{i + 1} {usn} {name} {rng.choice(YEARS)} GLH-{rng.integers(1, 20):02d} G")
+    return rows
+
+
+def synthetic_questions(count: int, seed: int = 1):
+    rng = np.random.default_rng(seed)
+    templates = ["who is {name}", "which class is {name} in", "details of {name}", "where does {name} sit"]
+    return [
+        rng.choice(templates).format(name=f"{rng.choice(FIRST_NAMES).title()} {rng.choice(LAST_NAMES).title()}")
+        for _ in range(count)
+    ]
+
+
+def normalized(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return np.divide(vectors, norms, where=norms != 0).astype(np.float32)
+
+
+def measure(model, rows, questions, batch_size: int) -> dict:
+    model.encode(rows[:batch_size], convert_to_numpy=True, show_progress_bar=False)  # warm-up
+    start = time.perf_counter()
+    row_vectors = [model.encode(rows[i:i + batch_size], convert_to_numpy=True, show_progress_bar=False)
+                   for i in range(0, len(rows), batch_size)]
+    ingest_s = time.perf_counter() - start
+
+    latencies, question_vectors = [], []
+    for question in questions:
+        start = time.perf_counter()
+        question_vectors.append(model.encode([question], convert_to_numpy=True, show_progress_bar=False)[0])
+        latencies.append((time.perf_counter() - start) * 1000)
+    latencies = np.array(latencies)
+    return {
+        "rows_per_s": round(len(rows) / ingest_s, 1),
+        "query_p50_ms": round(float(np.percentile(latencies, 50)), 2),
+        "query_p99_ms": round(float(np.percentile(latencies, 99)), 2),
+        "row_vectors": normalized(np.vstack(row_vectors)),
+        "question_vectors": normalized(np.vstack(question_vectors)),
+    }
+
+
+def agreement(result: dict, reference: dict, k: int) -> dict:
+    """Cosine similarity to the reference vectors and overlap of the top-k rows per question."""
+    cosines = np.sum(result["row_vectors"] * reference["row_vectors"], axis=1)
+    found = np.argsort(-(result["question_vectors"] @ result["row_vectors"].T), axis=1)[:, :k]
+    truth = np.argsort(-(reference["question_vectors"] @ reference["row_vectors"].T), axis=1)[:, :k]
+    overlap = sum(len(set(f) & set(t)) for f, t in zip(found, truth)) / truth.size
+    return {"mean_cosine": round(float(cosines.mean()), 5), "min_cosine": round(float(cosines.min()), 5),
+            f"top{k}_overlap": round(overlap, 4)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--backends", nargs="+", choices=BACKENDS, default=list(BACKENDS))
+    parser.add_argument("--rows", type=int, default=5000)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--batch-size", type=int, default=int(os.getenv("CSV_RAG_EMBED_BATCH_SIZE", "256")))
+    parser.add_argument("-k", type=int, default=5)
+    parser.add_argument("--json", help="also write the report to this file")
+    args = parser.parse_args()
+
+    rows, questions = synthetic_rows(args.rows), synthetic_questions(args.queries)
+    backends = ["torch"] + [backend for backend in args.backends if backend != "torch"]
+    print(f"📊 {MODEL_NAME}: {len(rows)} rows in batches of {args.batch_size}, {len(questions)} single questions")
+    results, report = {}, []
+    for backend in backends:
+        model, used = load_embedding_model(MODEL_NAME, backend)
+        if used != backend:
+            print(f"{backend:<10} skipped (not available here)")
+            continue
+        results[backend] = measure(model, rows, questions, args.batch_size)
+        row = {"backend": backend, **{key: value for key, value in results[backend].items() if "vectors" not in key}}
+        row.update(agreement(results[backend], results["torch"], args.k))
+        report.append(row)
+        print(f"{backend:<10} {row['rows_per_s']} rows/s  query p50={row['query_p50_ms']}ms "
+              f"p99={row['query_p99_ms']}ms  cosine vs torch mean={row['mean_cosine']} min={row['min_cosine']} "
+              f"top{args.k} overlap={row[f'top{args.k}_overlap']}")
+    report = [row for row in report if row["backend"] in args.backends]
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"model": MODEL_NAME, "rows": len(rows), "batch_size": args.batch_size, "results": report},
+                      f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+"""Delete-then-search check for every index type and codec.
+
+Builds each index kind over synthetic vectors, removes a block of rows,
+appends new ones and removes a few of those, then checks that searches
+never return a removed id and that the surviving rows still find themselves
+under their own ids, before and after a rebuild into another index type.
+Exits non-zero if any combination fails.
+
+Run from the csv_rag_backend directory:
+
+    python -m benchmarks.index_deletes
+    python -m benchmarks.index_deletes --rows 50000 --json deletes.json
+"""
+import argparse
+import json
+import sys
+
+import faiss
+import numpy as np
+
+import vector_index
+from benchmarks.index_recall import synthetic_vectors
+
+KINDS = ("flat", "ivf", "hnsw")
+# Below this share of rows finding themselves first, ids are considered scrambled;
+# compressed codecs lose some self-hits to quantization even when ids are right.
+MIN_SELF_HIT = 0.6
+
+
+def search_all(index, queries: np.ndarray) -> np.ndarray:
+    if vector_index.index_kind(index) == "ivf":
+        # Exhaustive probing, so only id bookkeeping can cause a miss.
+        faiss.extract_index_ivf(index).nprobe = faiss.extract_index_ivf(index).nlist
+    _, I = index.search(queries, 5)
+    return I
+
+
+def check(vectors: np.ndarray, kind: str, codec: str) -> dict:
+    rows = len(vectors)
+    first, second = int(rows * 0.8), rows
+    removed = np.r_[0:rows // 5, first + 10:first + 110]
+    live = np.setdiff1d(np.arange(rows), removed)
+
+    index = vector_index.create_index(vectors.shape[1], kind, vector_index.ivf_list_count(first) if kind == "ivf" else 0, codec)
+    if not index.is_trained:
+        index.train(vectors[:first])
+    index.add_with_ids(vectors[:first], np.arange(first, dtype=np.int64))
+    index = vector_index.remove_ids(index, range(rows // 5))
+    index.add_with_ids(vectors[first:second], np.arange(first, second, dtype=np.int64))
+    index = vector_index.remove_ids(index, range(first + 10, first + 110))
+
+    result = {"kind": kind, "codec": codec, "ntotal": int(index.ntotal)}
+    for stage, current in (("after_delete", index), ("after_rebuild", vector_index.rebuild_index(index, "flat" if kind == "ivf" else "ivf"))):
+        found = search_all(current, vectors)
+        result[f"{stage}_removed_returned"] = int(np.isin(found, removed).sum())
+        result[f"{stage}_self_hit"] = round(float((found[live, 0] == live).mean()), 4)
+    result["ok"] = (result["ntotal"] == len(live)
+                    and result["after_delete_removed_returned"] == 0 and result["after_rebuild_removed_returned"] == 0
+                    and min(result["after_delete_self_hit"], result["after_rebuild_self_hit"]) >= MIN_SELF_HIT)
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=20000)
+    parser.add_argument("--dim", type=int, default=64)
+    parser.add_argument("--json", help="also write the report to this file")
+    args = parser.parse_args()
+
+    vectors = synthetic_vectors(args.rows, args.dim)
+    report = [check(vectors, kind, codec) for kind in KINDS for codec in vector_index.CODECS]
+    for row in report:
+        print(f"{'✅' if row['ok'] else '❌'} {row['kind']:<5} {row['codec']:<8} ntotal={row['ntotal']} "
+              f"self-hit {row['after_delete_self_hit']} (rebuilt {row['after_rebuild_self_hit']}), "
+              f"removed ids returned {row['after_delete_removed_returned']} (rebuilt {row['after_rebuild_removed_returned']})")
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"rows": args.rows, "results": report}, f, indent=2)
+    if not all(row["ok"] for row in report):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
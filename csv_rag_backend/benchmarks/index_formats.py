@@ -0,0 +1,173 @@
+"""Memory and cold-start report for the vector codecs and memory-mapped loading.
+
+For every CSV_RAG_VECTOR_CODEC the same synthetic corpus is indexed, saved,
+dropped from the page cache and loaded again in a fresh process, once read
+into RAM and once memory-mapped (CSV_RAG_MMAP_INDEX=1). Memory is reported per
+100k rows, split into private memory (paid again by every uvicorn worker) and
+page-cache-backed file memory (shared between workers).
+
+Run from the csv_rag_backend directory:
+
+    python -m benchmarks.index_formats --rows 100000
+    python -m benchmarks.index_formats --kind hnsw --json formats.json
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+import faiss
+import numpy as np
+
+import vector_index
+from benchmarks.index_recall import recall_at_k, synthetic_vectors
+
+ADD_BATCH_SIZE = 50000
+PROBE_QUERIES = 50
+
+
+def memory_mb() -> dict:
+    """Private (anonymous) and file-backed resident memory of this process, in MB."""
+    usage = {}
+    with open("/proc/self/status") as f:
+        for line in f:
+            key, _, value = line.partition(":")
+            if key in ("RssAnon", "RssFile"):
+                usage[key] = int(value.split()[0]) / 1024
+    return usage
+
+
+def drop_from_page_cache(path: str):
+    """Evicts a file's pages so the next read really comes from disk."""
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+        os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_DONTNEED)
+    finally:
+        os.close(fd)
+
+
+def build(vectors: np.ndarray, kind: str, codec: str):
+    nlist = vector_index.ivf_list_count(len(vectors)) if kind == "ivf" else 0
+    index = vector_index.create_index(vectors.shape[1], kind, nlist, codec)
+    if not index.is_trained:
+        rng = np.random.default_rng(2)
+        sample_size = max(nlist * vector_index.TRAIN_POINTS_PER_LIST, vector_index.CODEC_TRAIN_POINTS)
+        index.train(vectors[rng.choice(len(vectors), size=min(sample_size, len(vectors)), replace=False)])
+    for start in range(0, len(vectors), ADD_BATCH_SIZE):
+        batch = vectors[start:start + ADD_BATCH_SIZE]
+        index.add_with_ids(batch, np.arange(start, start + len(batch), dtype=np.int64))
+    return index
+
+
+def probe(path: str, mmap: bool):
+    """Runs in a fresh process: loads the index and reports time and memory as JSON."""
+    before = memory_mb()
+    start = time.perf_counter()
+    index = vector_index.tune_index(vector_index.load_index(path, mmap=mmap))
+    load_s = time.perf_counter() - start
+    loaded = memory_mb()
+
+    rng = np.random.default_rng(3)
+    queries = rng.standard_normal((PROBE_QUERIES, index.d)).astype(np.float32)
+    faiss.normalize_L2(queries)
+    start = time.perf_counter()
+    index.search(queries[:1], 5)
+    first_query_ms = (time.perf_counter() - start) * 1000
+    index.search(queries[1:], 5)
+    searched = memory_mb()
+    print(json.dumps({
+        "load_s": round(load_s, 4),
+        "first_query_ms": round(first_query_ms, 2),
+        "private_mb": round(searched["RssAnon"] - before["RssAnon"], 1),
+        "file_mb": round(searched["RssFile"] - before["RssFile"], 1),
+        "private_mb_after_load": round(loaded["RssAnon"] - before["RssAnon"], 1),
+    }))
+
+
+def cold_start(path: str, mmap: bool) -> dict:
+    drop_from_page_cache(path)
+    command = [sys.executable, "-m", "benchmarks.index_formats", "--probe", path]
+    if mmap:
+        command.append("--mmap")
+    output = subprocess.run(command, check=True, capture_output=True, text=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def run(vectors: np.ndarray, queries: np.ndarray, k: int, kind: str, codecs, workdir: str) -> list:
+    per_100k = 100000 / len(vectors)
+    exact = build(vectors, "flat", "float32")
+    _, truth = exact.search(queries, k)
+    report = []
+    for codec in codecs:
+        start = time.perf_counter()
+        index = build(vectors, kind, codec)
+        build_s = round(time.perf_counter() - start, 2)
+        _, found = index.search(queries, k)
+        path = os.path.join(workdir, f"{kind}_{codec}.faiss")
+        vector_index.save_index_file(index, path)
+        del index
+        row = {
+            "kind": kind,
+            "codec": codec,
+            "build_s": build_s,
+            f"recall@{k}": recall_at_k(found, truth),
+            "file_mb_per_100k": round(os.path.getsize(path) / 2 ** 20 * per_100k, 1),
+        }
+        for mode, mmap in (("ram", False), ("mmap", True)):
+            stats = cold_start(path, mmap)
+            row[mode] = {
+                "cold_load_s": stats["load_s"],
+                "first_query_ms": stats["first_query_ms"],
+                "private_mb_per_100k": round(stats["private_mb"] * per_100k, 1),
+                "shared_mb_per_100k": round(stats["file_mb"] * per_100k, 1),
+            }
+        report.append(row)
+        os.remove(path)
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=100000, help="synthetic corpus size")
+    parser.add_argument("--dim", type=int, default=384, help="synthetic vector dimension")
+    parser.add_argument("--kind", choices=("flat", "ivf", "hnsw"), default="flat")
+    parser.add_argument("--codecs", nargs="+", choices=vector_index.CODECS, default=list(vector_index.CODECS))
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("-k", type=int, default=5)
+    parser.add_argument("--json", help="also write the report to this file")
+    parser.add_argument("--probe", help=argparse.SUPPRESS)
+    parser.add_argument("--mmap", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.probe:
+        probe(args.probe, args.mmap)
+        return
+
+    vectors = synthetic_vectors(args.rows, args.dim)
+    rng = np.random.default_rng(1)
+    queries = vectors[rng.integers(0, len(vectors), size=args.queries)]
+    queries = queries + 0.1 * rng.standard_normal(queries.shape).astype(np.float32)
+    faiss.normalize_L2(queries)
+
+    print(f"📊 {args.rows} {args.kind} vectors, recall@{args.k} against exact float32; memory per 100k rows")
+    # Saved next to data_store so the cold reads hit the same disk as the real index.
+    with tempfile.TemporaryDirectory(dir=".") as workdir:
+        report = run(vectors, queries, args.k, args.kind, args.codecs, workdir)
+    for row in report:
+        print(f"{row['codec']:<8} recall={row[f'recall@{args.k}']:<7} file={row['file_mb_per_100k']}MB "
+              f"build={row['build_s']}s")
+        for mode in ("ram", "mmap"):
+            stats = row[mode]
+            print(f"  {mode:<5} cold load={stats['cold_load_s']}s first query={stats['first_query_ms']}ms "
+                  f"private={stats['private_mb_per_100k']}MB shared={stats['shared_mb_per_100k']}MB")
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"rows": args.rows, "kind": args.kind, "k": args.k, "results": report}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
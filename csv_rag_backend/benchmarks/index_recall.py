@@ -0,0 +1,122 @@
+"""Recall-vs-latency report for the approximate index types.
+
+Every IVF and HNSW setting is compared against an exact flat index over the
+same vectors, so CSV_RAG_INDEX_TYPE / CSV_RAG_IVF_NPROBE / CSV_RAG_HNSW_EF_SEARCH
+can be picked from measured numbers.
+
+Run from the csv_rag_backend directory:
+
+    python -m benchmarks.index_recall --rows 200000
+    python -m benchmarks.index_recall --from-store --json report.json
+"""
+import argparse
+import json
+import time
+
+import faiss
+import numpy as np
+
+import vector_index
+from snapshots import SnapshotStore
+
+STORE_DIR = "data_store"
+
+
+def synthetic_vectors(rows: int, dim: int, seed: int = 0) -> np.ndarray:
+    """Clustered unit vectors, closer to real sentence embeddings than uniform noise."""
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((max(rows // 500, 8), dim)).astype(np.float32)
+    labels = rng.integers(0, len(centers), size=rows)
+    vectors = centers[labels] + 0.35 * rng.standard_normal((rows, dim)).astype(np.float32)
+    faiss.normalize_L2(vectors)
+    return vectors
+
+
+def store_vectors() -> np.ndarray:
+    snapshots = SnapshotStore(STORE_DIR)
+    index = faiss.read_index(snapshots.index_path(snapshots.current()))
+    return np.vstack([batch for _, batch in vector_index.iter_vectors(index)]).astype(np.float32)
+
+
+def time_search(index, queries: np.ndarray, k: int):
+    latencies, results = [], []
+    for q in queries:
+        start = time.perf_counter()
+        _, I = index.search(q.reshape(1, -1), k)
+        latencies.append((time.perf_counter() - start) * 1000)
+        results.append(I[0])
+    latencies = np.array(latencies)
+    return np.vstack(results), {
+        "p50_ms": round(float(np.percentile(latencies, 50)), 4),
+        "p99_ms": round(float(np.percentile(latencies, 99)), 4),
+        "qps": round(float(1000 / latencies.mean()), 1),
+    }
+
+
+def recall_at_k(found: np.ndarray, truth: np.ndarray) -> float:
+    hits = sum(len(set(f[f >= 0]) & set(t)) for f, t in zip(found, truth))
+    return round(hits / truth.size, 4)
+
+
+def run(vectors: np.ndarray, queries: np.ndarray, k: int, nprobes, ef_searches) -> list:
+    dim = vectors.shape[1]
+    report = []
+
+    flat = vector_index.create_index(dim, "flat")
+    flat.add_with_ids(vectors, np.arange(len(vectors), dtype=np.int64))
+    truth, stats = time_search(flat, queries, k)
+    report.append({"type": "flat", "build_s": 0.0, "recall": 1.0, **stats})
+
+    start = time.perf_counter()
+    ivf = vector_index.rebuild_index(flat, "ivf")
+    build_s = round(time.perf_counter() - start, 2)
+    nlist = faiss.extract_index_ivf(ivf).nlist
+    for nprobe in nprobes:
+        faiss.extract_index_ivf(ivf).nprobe = nprobe
+        found, stats = time_search(ivf, queries, k)
+        report.append({"type": "ivf", "nlist": nlist, "nprobe": nprobe, "build_s": build_s,
+                       "recall": recall_at_k(found, truth), **stats})
+
+    start = time.perf_counter()
+    hnsw = vector_index.rebuild_index(flat, "hnsw")
+    build_s = round(time.perf_counter() - start, 2)
+    for ef in ef_searches:
+        vector_index.inner_index(hnsw).hnsw.efSearch = ef
+        found, stats = time_search(hnsw, queries, k)
+        report.append({"type": "hnsw", "M": vector_index.HNSW_M, "ef_search": ef, "build_s": build_s,
+                       "recall": recall_at_k(found, truth), **stats})
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=100000, help="synthetic corpus size")
+    parser.add_argument("--dim", type=int, default=384, help="synthetic vector dimension")
+    parser.add_argument("--from-store", action="store_true", help="use the vectors in data_store instead")
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("-k", type=int, default=5)
+    parser.add_argument("--nprobe", type=int, nargs="+", default=[1, 4, 8, 16, 32, 64])
+    parser.add_argument("--ef-search", type=int, nargs="+", default=[16, 32, 64, 128])
+    parser.add_argument("--json", help="also write the report to this file")
+    args = parser.parse_args()
+
+    vectors = store_vectors() if args.from_store else synthetic_vectors(args.rows, args.dim)
+    # Queries are perturbed corpus vectors, like questions that paraphrase a row.
+    rng = np.random.default_rng(1)
+    queries = vectors[rng.integers(0, len(vectors), size=args.queries)]
+    queries = queries + 0.1 * rng.standard_normal(queries.shape).astype(np.float32)
+    faiss.normalize_L2(queries)
+
+    print(f"📊 {len(vectors)} vectors, {args.queries} queries, recall@{args.k} against flat")
+    report = run(vectors, queries, args.k, args.nprobe, args.ef_search)
+    for row in report:
+        setting = {key: row[key] for key in ("nlist", "nprobe", "M", "ef_search") if key in row}
+        print(f"{row['type']:<5} {str(setting):<32} recall={row['recall']:<7} "
+              f"p50={row['p50_ms']}ms p99={row['p99_ms']}ms qps={row['qps']} build={row['build_s']}s")
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"rows": len(vectors), "k": args.k, "results": report}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
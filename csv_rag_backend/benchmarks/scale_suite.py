@@ -0,0 +1,265 @@
+"""End-to-end scaling benchmark for the chat backend.
+
+For every corpus size a fresh process gets an empty store in a temporary
+directory, generates synthetic student sheets in the 4DM.. USN format (plus
+a small faculty sheet), and reports:
+
+- /upload-csv/ throughput (rows/s) and peak RSS,
+- /chat/ latency percentiles per router tool (USN lookup, year filter,
+  vector search, question paper search),
+- recall@k of the vector index against an exact brute-force scan of the
+  embedded rows.
+
+Gemini is replaced by an instant stub and Serper by benchmarks/serper_stub.py,
+so the numbers are the backend's own. The answer cache is disabled so every
+question does the full work. Results are printed and written as JSON so runs
+can be compared.
+
+Run from the csv_rag_backend directory:
+
+    python -m benchmarks.scale_suite --sizes 1000 10000 100000 --json scale.json
+"""
+import argparse
+import json
+import os
+import platform
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+FIRST_NAMES = np.array(["ABDUL", "ADIL", "AFRID", "AISHA", "FATHIMA", "MOHAMMED", "NIHAL", "PRIYA", "RAHUL",
+                        "SNEHA", "UMMAL", "VIKAS", "ZAIN", "SHREYA", "ARJUN", "MEGHA"])
+LAST_NAMES = np.array(["KHAN", "HAFEEZ", "SHETTY", "RAO", "NAIK", "KUMAR", "P K", "BHAT", "HEGDE", "V V",
+                       "ISMAIL", "K A", "PASHA", "EBRAHIM"])
+YEARS = np.array(["First Year", "Second Year", "Third Year", "Final Year"])
+FLOORS = np.array(["G", "1ST", "2ND", "3RD"])
+DEPARTMENTS = np.array(["AI", "CS", "EC", "ME", "CV", "IS"])
+DESIGNATIONS = np.array(["Assistant Professor", "Associate Professor", "Professor", "Lab Instructor"])
+USNS_PER_BLOCK = 999
+ADMISSION_YEARS = 10
+QUESTIONS_PER_TOOL = 50
+FACULTY_PER_STUDENT = 1 / 40
+STUB_ANSWER = "Stub answer."
+
+
+def student_sheet(rows: int, seed: int = 0) -> pd.DataFrame:
+    """Students with unique USNs 4DM<yy><dept><nnn>, built column-wise."""
+    rng = np.random.default_rng(seed)
+    i = np.arange(rows)
+    block = i // USNS_PER_BLOCK
+    admission = 15 + block % ADMISSION_YEARS
+    dept_code = block // ADMISSION_YEARS
+    dept = (pd.Series(np.char.add(np.array(list("ABCDEFGHIJKLMNOPQRSTUVWXYZ"))[(dept_code // 26) % 26],
+                                  np.array(list("ABCDEFGHIJKLMNOPQRSTUVWXYZ"))[dept_code % 26])))
+    usn = "4DM" + pd.Series(admission).astype(str) + dept + pd.Series(i % USNS_PER_BLOCK + 1).astype(str).str.zfill(3)
+    names = pd.Series(FIRST_NAMES[rng.integers(0, len(FIRST_NAMES), rows)]) + " " + \
+        pd.Series(LAST_NAMES[rng.integers(0, len(LAST_NAMES), rows)])
+    return pd.DataFrame({
+        "SEAT NO.": (i + 1).astype(str),
+        "USN": usn,
+        "STUDENT NAME": names,
+        "YEAR": YEARS[(24 - admission).clip(0, 3)],
+        "CLASS": pd.Series(np.array(["GLH", "FLH", "SLH", "TLH"])[i % 4]) + "-" + pd.Series(i % 20 + 1).astype(str).str.zfill(2),
+        "FLOOR": FLOORS[i % 4],
+    })
+
+
+def faculty_sheet(rows: int, seed: int = 1) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({
+        "FACULTY ID": [f"YIT{n:05d}" for n in range(1, rows + 1)],
+        "NAME": pd.Series(FIRST_NAMES[rng.integers(0, len(FIRST_NAMES), rows)]) + " " +
+        pd.Series(LAST_NAMES[rng.integers(0, len(LAST_NAMES), rows)]),
+        "DEPARTMENT": DEPARTMENTS[rng.integers(0, len(DEPARTMENTS), rows)],
+        "DESIGNATION": DESIGNATIONS[rng.integers(0, len(DESIGNATIONS), rows)],
+    })
+
+
+def peak_rss_mb() -> float:
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def percentiles(latencies) -> dict:
+    latencies = np.array(latencies)
+    return {
+        "p50_ms": round(float(np.percentile(latencies, 50)), 2),
+        "p95_ms": round(float(np.percentile(latencies, 95)), 2),
+        "p99_ms": round(float(np.percentile(latencies, 99)), 2),
+        "count": len(latencies),
+    }
+
+
+def upload(client, path: str, poll_interval: float = 0.05) -> dict:
+    with open(path, "rb") as f:
+        start = time.perf_counter()
+        job = client.post("/upload-csv/", files={"file": (os.path.basename(path), f, "text/csv")}).json()
+    while True:
+        status = client.get(f"/upload-status/{job['job_id']}").json()
+        if status["status"] in ("completed", "failed"):
+            break
+        time.sleep(poll_interval)
+    elapsed = time.perf_counter() - start
+    if status["status"] == "failed":
+        raise RuntimeError(f"Upload of {path} failed: {status['error']}")
+    return {"rows": status["rows_indexed"], "seconds": round(elapsed, 2),
+            "rows_per_s": round(status["rows_indexed"] / elapsed, 1)}
+
+
+def tool_questions(students: pd.DataFrame, rng) -> dict:
+    sample = students.iloc[rng.integers(0, len(students), QUESTIONS_PER_TOOL)]
+    return {
+        "usn": [f"What are the details for USN {usn}?" for usn in sample["USN"]],
+        "year_filter": [f"list all {year.split()[0].lower()} year students" for year in sample["YEAR"]],
+        "vector": [f"which class is {name.title()} in" for name in sample["STUDENT NAME"]],
+        "question_paper": [f"question paper of {subject}" for subject in rng.choice(["DSA", "DBMS", "OS", "CN"],
+                                                                                  QUESTIONS_PER_TOOL)],
+    }
+
+
+def row_vectors(main, sheets, ids) -> np.ndarray:
+    """Embedded vectors of rows by id (ids are assigned in upload order), from the embedding cache."""
+    from ingest_jobs import build_row_texts
+    texts, offsets = [], np.cumsum([0] + [len(sheet) for sheet in sheets])
+    for doc_id in ids:
+        sheet = int(np.searchsorted(offsets, doc_id, side="right")) - 1
+        texts.extend(build_row_texts(sheets[sheet].iloc[[doc_id - offsets[sheet]]].fillna(""))[0])
+    return main.embedding_cache.encode(texts, main.embed_documents)[0]
+
+
+def exact_top_k(main, sheets, queries: np.ndarray, k: int, batch_rows: int = 50000):
+    """Brute-force top-k (scores, ids) over the embedded rows."""
+    from ingest_jobs import build_row_texts
+    best_scores = np.full((len(queries), 0), -np.inf, dtype=np.float32)
+    best_ids = np.empty((len(queries), 0), dtype=np.int64)
+    first_id = 0
+    for sheet in sheets:
+        for start in range(0, len(sheet), batch_rows):
+            texts, _ = build_row_texts(sheet.iloc[start:start + batch_rows].fillna(""))
+            vectors, _, _ = main.embedding_cache.encode(texts, main.embed_documents)
+            scores = np.hstack([best_scores, queries @ vectors.T])
+            ids = np.hstack([best_ids, np.tile(np.arange(len(texts)) + first_id + start, (len(queries), 1))])
+            top = np.argsort(-scores, axis=1, kind="stable")[:, :k]
+            best_scores, best_ids = np.take_along_axis(scores, top, 1), np.take_along_axis(ids, top, 1)
+        first_id += len(sheet)
+    return best_scores, best_ids
+
+
+def recall_at_k(main, sheets, queries: np.ndarray, found: np.ndarray, k: int) -> float:
+    """Share of returned rows that belong in the exact top k.
+
+    Synthetic sheets repeat names, so rows often tie with the k-th best score;
+    any of those counts as correct.
+    """
+    truth_scores, _ = exact_top_k(main, sheets, queries, k)
+    hits = 0
+    for query, ids, scores in zip(queries, found, truth_scores):
+        ids = ids[ids >= 0]
+        if len(ids):
+            hits += int(np.sum(row_vectors(main, sheets, ids) @ query >= scores[-1] - 1e-5))
+    return round(hits / truth_scores.size, 4)
+
+
+def run_size(rows: int, k: int) -> dict:
+    """One corpus size, in this (fresh) process."""
+    from benchmarks import serper_stub
+    _, serper_url, _ = serper_stub.start()
+    os.environ["SERPER_URL"] = serper_url
+    os.environ.setdefault("GEMINI_API_KEY", "benchmark")
+    os.environ.setdefault("SERPER_API_KEY", "benchmark")
+    os.environ["CSV_RAG_ANSWER_CACHE_SIZE"] = "0"
+
+    workdir = tempfile.mkdtemp(prefix="csv_rag_bench_")
+    os.chdir(workdir)
+    rng = np.random.default_rng(7)
+    students = student_sheet(rows)
+    faculty = faculty_sheet(max(10, int(rows * FACULTY_PER_STUDENT)))
+    students.to_csv("students.csv", index=False)
+    faculty.to_csv("faculty.csv", index=False)
+
+    import main
+    from fastapi.testclient import TestClient
+
+    async def stub_async(prompt):
+        return STUB_ANSWER
+
+    async def stub_stream(prompt):
+        yield STUB_ANSWER
+
+    main.get_llm_response = lambda prompt: STUB_ANSWER
+    main.get_llm_response_async = stub_async
+    main.stream_llm_response = stub_stream
+
+    result = {"rows": rows}
+    with TestClient(main.app) as client:
+        result["rss_after_startup_mb"] = round(peak_rss_mb(), 1)
+        result["upload"] = upload(client, "students.csv")
+        result["upload"]["faculty"] = upload(client, "faculty.csv")
+        result["peak_rss_mb"] = round(peak_rss_mb(), 1)
+        result["index"] = main.vector_index.describe_index(main.index)
+
+        questions = tool_questions(students, rng)
+        result["chat"] = {}
+        for tool, tool_qs in questions.items():
+            latencies = []
+            for question in tool_qs:
+                start = time.perf_counter()
+                response = client.post("/chat/", json={"question": question})
+                latencies.append((time.perf_counter() - start) * 1000)
+                response.raise_for_status()
+            result["chat"][tool] = percentiles(latencies)
+
+        queries = main.encode_queries(questions["vector"])
+        with main.index_lock:
+            _, found = main.index.search(queries, k)
+        result[f"recall@{k}"] = recall_at_k(main, [students, faculty], queries, found, k)
+    os.chdir(tempfile.gettempdir())
+    shutil.rmtree(workdir, ignore_errors=True)
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000, 1000000])
+    parser.add_argument("-k", type=int, default=5)
+    parser.add_argument("--json", help="also write the report to this file")
+    parser.add_argument("--run-size", type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run_size:
+        print(json.dumps(run_size(args.run_size, args.k)))
+        return
+
+    report = {
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "cpus": os.cpu_count(),
+        "config": {key: value for key, value in sorted(os.environ.items()) if key.startswith("CSV_RAG_")},
+        "results": [],
+    }
+    for rows in args.sizes:
+        print(f"📊 {rows} rows...")
+        command = [sys.executable, "-m", "benchmarks.scale_suite", "--run-size", str(rows), "-k", str(args.k)]
+        child = subprocess.run(command, capture_output=True, text=True)
+        if child.returncode != 0:
+            print(child.stderr[-2000:])
+            raise SystemExit(f"❌ Benchmark for {rows} rows failed.")
+        result = json.loads(child.stdout.strip().splitlines()[-1])
+        report["results"].append(result)
+        chat = "  ".join(f"{tool} p50={stats['p50_ms']}ms p99={stats['p99_ms']}ms"
+                         for tool, stats in result["chat"].items())
+        print(f"  upload {result['upload']['rows_per_s']} rows/s, peak RSS {result['peak_rss_mb']}MB, "
+              f"index {result['index']['type']}/{result['index']['codec']}, recall@{args.k}={result[f'recall@{args.k}']}")
+        print(f"  {chat}")
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+"""Local stand-in for the Serper search API.
+
+Answers every POST with a few canned "organic" results for the query, after an
+optional delay, and counts the requests it served. Point the backend at it
+with SERPER_URL:
+
+    python -m benchmarks.serper_stub --port 8765 --delay 0.5
+    SERPER_URL=http://127.0.0.1:8765/search uvicorn main:app
+"""
+import argparse
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+def make_handler(delay: float, results: int):
+    class SerperStubHandler(BaseHTTPRequestHandler):
+        requests_served = 0
+        counter_lock = threading.Lock()
+
+        def do_POST(self):
+            body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+            with self.counter_lock:
+                SerperStubHandler.requests_served += 1
+            time.sleep(delay)
+            query = body.get("q", "")
+            organic = [{"title": f"{query} #{i + 1}", "link": f"https://example.com/papers/{i + 1}.pdf"}
+                       for i in range(results)]
+            payload = json.dumps({"searchParameters": {"q": query}, "organic": organic}).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def log_message(self, format, *args):
+            pass
+
+    return SerperStubHandler
+
+
+def start(port: int = 0, delay: float = 0.0, results: int = 5):
+    """Starts the stand-in on a background thread; returns (server, url, handler class)."""
+    handler = make_handler(delay, results)
+    server = ThreadingHTTPServer(("127.0.0.1", port), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}/search", handler
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--delay", type=float, default=0.0, help="seconds to wait before answering")
+    parser.add_argument("--results", type=int, default=5)
+    args = parser.parse_args()
+    server, url, _ = start(args.port, args.delay, args.results)
+    print(f"🌐 Serper stand-in listening on {url}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
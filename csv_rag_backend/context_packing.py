@@ -0,0 +1,52 @@
+"""Fits retrieved rows into the LLM prompt and renders list answers without the LLM.
+
+Rows are packed in retrieval order until CSV_RAG_CONTEXT_TOKENS is used up,
+so the prompt stays bounded no matter how many rows a lookup matches. Tokens
+are estimated from character counts (about four characters per token for
+Gemini's tokenizer on this kind of text) rather than by running a tokenizer.
+"""
+import os
+from typing import List, Tuple
+
+from field_index import parse_display_text
+
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CSV_RAG_CONTEXT_TOKENS", "3000"))
+CHARS_PER_TOKEN = 4
+# A row is only cut short to fit when at least this many tokens of budget are left for it.
+MIN_TRUNCATED_TOKENS = 32
+
+
+def estimate_tokens(text: str) -> int:
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+
+def pack_context(docs: List[dict], budget: int = CONTEXT_TOKEN_BUDGET) -> Tuple[List[str], int]:
+    """Returns the row texts that fit in `budget` tokens (best-ranked first) and how many rows were left out."""
+    packed, used = [], 0
+    for position, doc in enumerate(docs):
+        text = doc.get("text", "")
+        cost = estimate_tokens(text) + 1  # the newline between rows
+        if used + cost > budget:
+            remaining = budget - used
+            if not packed or remaining >= MIN_TRUNCATED_TOKENS:
+                packed.append(text[:max(remaining - 1, 0) * CHARS_PER_TOKEN] + " ...")
+                position += 1
+            return packed, len(docs) - position
+        packed.append(text)
+        used += cost
+    return packed, 0
+
+
+def render_table(docs: List[dict]) -> str:
+    """A Markdown table of the rows' columns, in row order and first-seen column order."""
+    records = [parse_display_text(doc.get("text", "")) for doc in docs]
+    columns = list(dict.fromkeys(col for record in records for col in record))
+    if not columns:
+        return ""
+
+    def cell(value: str) -> str:
+        return value.replace("|", "\\|")
+
+    lines = ["| " + " | ".join(cell(col) for col in columns) + " |", "|" + " --- |" * len(columns)]
+    lines.extend("| " + " | ".join(cell(record.get(col, "")) for col in columns) + " |" for record in records)
+    return "\n".join(lines)
@@ -0,0 +1,114 @@
+"""Text extraction for PDF and Excel uploads.
+
+PDFs are read with PyMuPDF page by page in a pool of worker processes: each
+task opens the file, extracts a run of pages and splits every page into
+overlapping chunks of about CSV_RAG_DOC_CHUNK_CHARS characters, so a chunk
+never spans two pages and keeps its page number. Excel workbooks are read one
+sheet per worker; their rows then go through the same row pipeline as CSV
+uploads, with the sheet name kept on every row.
+
+The pool is started on the first PDF or workbook and reused afterwards.
+"""
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import Iterator, List, Tuple
+
+import pandas as pd
+
+from process_pool import spawn_pool
+
+DOC_CHUNK_CHARS = max(1, int(os.getenv("CSV_RAG_DOC_CHUNK_CHARS", "1000")))
+DOC_CHUNK_OVERLAP = int(os.getenv("CSV_RAG_DOC_CHUNK_OVERLAP", "200"))
+if not 0 <= DOC_CHUNK_OVERLAP < DOC_CHUNK_CHARS:
+    print(f"⚠️ CSV_RAG_DOC_CHUNK_OVERLAP must be below CSV_RAG_DOC_CHUNK_CHARS ({DOC_CHUNK_CHARS}); "
+          f"using {DOC_CHUNK_CHARS // 5}.")
+    DOC_CHUNK_OVERLAP = DOC_CHUNK_CHARS // 5
+EXTRACT_WORKERS = int(os.getenv("CSV_RAG_EXTRACT_WORKERS", str(min(4, os.cpu_count() or 1))))
+# Pages per extraction task: large enough to amortize opening the file, small enough to spread a document.
+PAGES_PER_TASK = 16
+DOCUMENT_EXTENSIONS = (".pdf", ".xlsx")
+
+
+def chunk_text(text: str, size: int = DOC_CHUNK_CHARS, overlap: int = DOC_CHUNK_OVERLAP) -> List[str]:
+    """Splits text into chunks of at most `size` characters that repeat the last `overlap` of the previous one.
+
+    Cuts fall on whitespace where possible, so words are not split between chunks.
+    An overlap of `size` or more is clamped below it, so every chunk moves forward.
+    """
+    size = max(size, 1)
+    overlap = min(max(overlap, 0), size - 1)
+    text = " ".join(text.split())
+    if len(text) <= size:
+        return [text] if text else []
+    chunks, start = [], 0
+    while start < len(text):
+        end = min(start + size, len(text))
+        if end < len(text):
+            cut = text.rfind(" ", start + overlap + 1, end)
+            end = cut if cut > start else end
+        chunks.append(text[start:end].strip())
+        if end == len(text):
+            break
+        next_start = end - overlap
+        # Start the overlap on a word boundary too.
+        space = text.find(" ", next_start, end)
+        start = space + 1 if space != -1 else next_start
+    return chunks
+
+
+def extract_pdf_pages(path: str, first: int, last: int, size: int = DOC_CHUNK_CHARS,
+                      overlap: int = DOC_CHUNK_OVERLAP) -> List[Tuple[int, int, str]]:
+    """(page number, chunk number, text) for every chunk of pages first..last-1 (page numbers start at 1)."""
+    import fitz
+
+    chunks = []
+    with fitz.open(path) as doc:
+        for page_index in range(first, last):
+            for chunk_index, text in enumerate(chunk_text(doc[page_index].get_text(), size, overlap)):
+                chunks.append((page_index + 1, chunk_index, text))
+    return chunks
+
+
+def read_sheet(path: str, sheet: str) -> pd.DataFrame:
+    return pd.read_excel(path, sheet_name=sheet, dtype=str).fillna("")
+
+
+class ExtractionPool:
+    """A reusable pool of worker processes for PDF and Excel extraction."""
+
+    def __init__(self, workers: int = EXTRACT_WORKERS):
+        self.workers = max(1, workers)
+        self._executor = None
+
+    def _pool(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            self._executor = spawn_pool(self.workers)
+            print(f"✅ Extraction pool started with {self.workers} workers.")
+        return self._executor
+
+    def iter_pdf_chunks(self, path: str) -> Iterator[Tuple[List[Tuple[int, int, str]], int, int]]:
+        """Yields (chunks of a run of pages, pages done so far, total pages), in page order."""
+        import fitz
+
+        with fitz.open(path) as doc:
+            total = doc.page_count
+        ranges = [(first, min(first + PAGES_PER_TASK, total)) for first in range(0, total, PAGES_PER_TASK)]
+        futures = [self._pool().submit(extract_pdf_pages, path, first, last) for first, last in ranges]
+        for (_, last), future in zip(ranges, futures):
+            yield future.result(), last, total
+
+    def iter_sheets(self, path: str) -> Iterator[Tuple[str, pd.DataFrame, int, int]]:
+        """Yields (sheet name, all-string frame, sheets done so far, total sheets), in workbook order."""
+        from openpyxl import load_workbook
+
+        workbook = load_workbook(path, read_only=True)
+        sheets = workbook.sheetnames
+        workbook.close()
+        futures = [self._pool().submit(read_sheet, path, sheet) for sheet in sheets]
+        for done, (sheet, future) in enumerate(zip(sheets, futures), start=1):
+            yield sheet, future.result(), done, len(sheets)
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
@@ -0,0 +1,105 @@
+"""Inference backend for the sentence embedding model.
+
+CSV_RAG_EMBEDDING_BACKEND selects how all-MiniLM-L6-v2 runs on the CPU:
+"torch" (eager PyTorch, the default), "onnx" (ONNX Runtime, same float32
+weights) or "onnx-int8" (ONNX Runtime with dynamically quantized int8 weights,
+CSV_RAG_ONNX_INT8_FILE picks the exported file for the CPU's instruction set).
+The ONNX backends need `pip install "sentence-transformers[onnx]"`; without it
+the model falls back to torch.
+
+torch and onnx produce the same vectors to within float rounding, so they
+share an embedding signature and can serve the same index. int8 vectors are
+close but not identical, so switching to or from it changes the signature,
+which makes the store re-embed its rows.
+
+With CSV_RAG_EMBED_WORKERS > 0, bulk document embedding is sharded across a
+pool of worker processes that each load their own copy of the model. The pool
+is started once and reused for every upload; questions are still embedded in
+the server process, where a single short text is faster than a round trip.
+"""
+import os
+from typing import List, Optional, Tuple
+
+import numpy as np
+from sentence_transformers import SentenceTransformer
+
+from process_pool import spawn_pool
+
+EMBEDDING_BACKEND = os.getenv("CSV_RAG_EMBEDDING_BACKEND", "torch").lower()
+# all-MiniLM-L6-v2 ships onnx/model_qint8_{avx2,avx512,avx512_vnni,arm64}.onnx.
+ONNX_INT8_FILE = os.getenv("CSV_RAG_ONNX_INT8_FILE", "onnx/model_qint8_avx2.onnx")
+BACKENDS = ("torch", "onnx", "onnx-int8")
+EMBED_WORKERS = int(os.getenv("CSV_RAG_EMBED_WORKERS", "0"))
+
+
+def embedding_signature(model_name: str, backend: str) -> str:
+    """Identifies the vectors a model/backend pair produces; equal signatures mean interchangeable vectors."""
+    if backend == "onnx-int8":
+        return f"{model_name}|{ONNX_INT8_FILE}"
+    return model_name
+
+
+def load_embedding_model(model_name: str, backend: str = EMBEDDING_BACKEND) -> Tuple[SentenceTransformer, str]:
+    """Loads the model on the requested backend and returns it with the backend actually used."""
+    if backend not in BACKENDS:
+        print(f"⚠️ Unknown CSV_RAG_EMBEDDING_BACKEND '{backend}', using torch.")
+        backend = "torch"
+    if backend == "torch":
+        return SentenceTransformer(model_name), backend
+    model_kwargs = {"file_name": ONNX_INT8_FILE} if backend == "onnx-int8" else None
+    try:
+        return SentenceTransformer(model_name, backend="onnx", model_kwargs=model_kwargs), backend
+    except Exception as e:
+        # Older sentence-transformers, or optimum/onnxruntime not installed.
+        print(f"⚠️ Could not load the {backend} embedding backend ({e}); using torch.")
+        return SentenceTransformer(model_name), "torch"
+
+
+# The model of a pool worker process, loaded once by _init_worker.
+_worker_model: Optional[SentenceTransformer] = None
+
+
+def _init_worker(model_name: str, backend: str, threads: int):
+    global _worker_model
+    try:
+        import torch
+        # Split the cores between workers instead of every worker using all of them.
+        torch.set_num_threads(threads)
+    except ImportError:
+        pass
+    _worker_model, _ = load_embedding_model(model_name, backend)
+
+
+def _encode_shard(texts: List[str]) -> np.ndarray:
+    return _worker_model.encode(texts, convert_to_numpy=True, show_progress_bar=False)
+
+
+class EmbeddingPool:
+    """A reusable pool of worker processes, each with its own copy of the embedding model."""
+
+    def __init__(self, model_name: str, backend: str, workers: int = EMBED_WORKERS):
+        self.model_name = model_name
+        self.backend = backend
+        self.workers = workers
+        self._executor = None
+        self.start()
+
+    def start(self):
+        threads = max(1, (os.cpu_count() or 1) // self.workers)
+        self._executor = spawn_pool(self.workers, _init_worker, (self.model_name, self.backend, threads))
+        print(f"✅ Embedding pool started with {self.workers} workers ({threads} threads each).")
+
+    def restart(self):
+        self.shutdown()
+        self.start()
+
+    def encode(self, texts: List[str]) -> np.ndarray:
+        """Embeds `texts` split into one contiguous shard per worker; rows come back in input order."""
+        shard_size = -(-len(texts) // self.workers)
+        shards = [texts[start:start + shard_size] for start in range(0, len(texts), shard_size)]
+        return np.vstack(list(self._executor.map(_encode_shard, shards)))
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
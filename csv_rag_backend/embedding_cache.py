@@ -0,0 +1,119 @@
+"""On-disk embedding cache keyed by a hash of the text that was embedded.
+
+Admins keep re-uploading the same master sheets with a few edited rows, so
+vectors for unchanged rows are served from a small SQLite table in STORE_DIR
+instead of going through the embedding model again.
+
+The table is bounded: entries written under another embedding signature are
+dropped when the cache is opened, /clear-index/ empties it, and past
+CSV_RAG_EMBEDDING_CACHE_MAX_ROWS the least recently used entries are evicted.
+"""
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from typing import Callable, List, Tuple
+
+import numpy as np
+
+from metadata_store import LOOKUP_CHUNK
+
+MAX_ROWS = int(os.getenv("CSV_RAG_EMBEDDING_CACHE_MAX_ROWS", "500000"))
+# Eviction goes this far below the cap, so it doesn't run again on the next batch.
+EVICT_TO_RATIO = 0.9
+
+
+def text_key(model_name: str, text: str) -> str:
+    """Cache key for a text; the model name is part of it so switching models never mixes vectors."""
+    return hashlib.sha256(f"{model_name}\0{text}".encode("utf-8")).hexdigest()
+
+
+class EmbeddingCache:
+    def __init__(self, path: str, model_name: str, max_rows: int = MAX_ROWS):
+        self.model_name = model_name
+        self.max_rows = max_rows
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("CREATE TABLE IF NOT EXISTS embeddings (key TEXT PRIMARY KEY, vector BLOB NOT NULL)")
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(embeddings)")}
+        # Caches from before eviction have neither column; their entries are evicted first.
+        if "signature" not in columns:
+            self._conn.execute("ALTER TABLE embeddings ADD COLUMN signature TEXT")
+        if "last_used" not in columns:
+            self._conn.execute("ALTER TABLE embeddings ADD COLUMN last_used REAL NOT NULL DEFAULT 0")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS embeddings_last_used ON embeddings (last_used)")
+        pruned = self._conn.execute(
+            "DELETE FROM embeddings WHERE signature IS NOT NULL AND signature != ?", (model_name,)
+        ).rowcount
+        self._conn.commit()
+        if pruned:
+            print(f"🗑️ Dropped {pruned} cached embeddings from other embedding signatures.")
+
+    def _lookup(self, keys: List[str]) -> dict:
+        found = {}
+        now = time.time()
+        with self._lock:
+            for start in range(0, len(keys), LOOKUP_CHUNK):
+                chunk = keys[start:start + LOOKUP_CHUNK]
+                placeholders = ",".join("?" * len(chunk))
+                rows = self._conn.execute(f"SELECT key, vector FROM embeddings WHERE key IN ({placeholders})", chunk)
+                found.update((key, np.frombuffer(blob, dtype=np.float32)) for key, blob in rows)
+                # A hit proves the entry belongs to this signature, which older entries never recorded.
+                self._conn.execute(
+                    f"UPDATE embeddings SET last_used = ?, signature = ? WHERE key IN ({placeholders})",
+                    [now, self.model_name, *chunk],
+                )
+            self._conn.commit()
+        return found
+
+    def _store(self, keys: List[str], vectors: np.ndarray):
+        now = time.time()
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (key, vector, signature, last_used) VALUES (?, ?, ?, ?)",
+                [(key, vector.astype(np.float32).tobytes(), self.model_name, now) for key, vector in zip(keys, vectors)],
+            )
+            self._evict()
+            self._conn.commit()
+
+    def _evict(self):
+        """Drops the least recently used entries once the table is over max_rows. Caller holds the lock."""
+        rows = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+        if rows <= self.max_rows:
+            return
+        excess = rows - int(self.max_rows * EVICT_TO_RATIO)
+        self._conn.execute(
+            "DELETE FROM embeddings WHERE key IN (SELECT key FROM embeddings ORDER BY last_used LIMIT ?)", (excess,)
+        )
+        print(f"🗑️ Evicted {excess} least recently used cached embeddings.")
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM embeddings")
+            self._conn.commit()
+
+    def stats(self) -> dict:
+        with self._lock:
+            rows = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+        return {"rows": rows, "max_rows": self.max_rows}
+
+    def encode(self, texts: List[str], encode_fn: Callable[[List[str]], np.ndarray]) -> Tuple[np.ndarray, int, int]:
+        """Embeds `texts`, calling `encode_fn` only for texts not seen before.
+
+        Returns the vectors in input order plus the number of cache hits and misses.
+        """
+        keys = [text_key(self.model_name, text) for text in texts]
+        cached = self._lookup(list(set(keys)))
+        # Duplicate rows within one upload only need to be embedded once.
+        missing = {}
+        for key, text in zip(keys, texts):
+            if key not in cached and key not in missing:
+                missing[key] = text
+        if missing:
+            new_vectors = encode_fn(list(missing.values()))
+            self._store(list(missing.keys()), new_vectors)
+            cached.update(zip(missing.keys(), new_vectors.astype(np.float32)))
+        hits = sum(1 for key in keys if key not in missing)
+        vectors = np.vstack([cached[key] for key in keys]) if keys else np.empty((0, 0), dtype=np.float32)
+        return vectors, hits, len(keys) - hits
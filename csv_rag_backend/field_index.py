@@ -0,0 +1,144 @@
+"""Hash/inverted indexes over parsed CSV columns for the chat router's lookup tools.
+
+Every indexed column maps a normalized cell value to the ids of the rows
+holding it. Key columns such as USN are always indexed; any other column is
+indexed only while it stays low-cardinality (year, department, section, ...),
+so the structure stays small. The postings live in the metadata store's
+SQLite file, so they are appended per upload and read per lookup rather than
+loaded or rewritten as a whole.
+"""
+import os
+from typing import Dict, List
+
+import pandas as pd
+
+from metadata_store import LOOKUP_CHUNK, MetadataStore
+
+KEY_COLUMNS = {"usn"}
+MAX_DISTINCT_VALUES = int(os.getenv("CSV_RAG_FIELD_INDEX_MAX_VALUES", "64"))
+
+
+def normalize(value) -> str:
+    return str(value).strip().lower()
+
+
+def parse_display_text(text: str) -> Dict[str, str]:
+    """Turns a stored "col: val | col: val" row text back into a column -> value dict."""
+    record = {}
+    col = None
+    for part in text.split(" | "):
+        name, sep, val = part.partition(": ")
+        if sep:
+            col = name
+            record[col] = val
+        elif col is not None:
+            # A " | " inside a cell value, not a column separator.
+            record[col] += " | " + part
+    return record
+
+
+def is_tabular(doc: dict) -> bool:
+    """True for stored table rows (CSV, Excel); False for PDF text chunks, which carry a page number."""
+    return "page" not in doc
+
+
+class FieldIndex:
+    def __init__(self, store: MetadataStore):
+        self.store = store
+        self.conn = store.conn
+        with store.lock:
+            self.conn.execute("CREATE TABLE IF NOT EXISTS field_values (col TEXT, value TEXT, doc_id INTEGER)")
+            self.conn.execute("CREATE INDEX IF NOT EXISTS field_values_lookup ON field_values (col, value)")
+            # distinct_values is -1 once a column has been dropped for being high-cardinality.
+            self.conn.execute("CREATE TABLE IF NOT EXISTS field_columns (col TEXT PRIMARY KEY, distinct_values INTEGER)")
+            self.conn.commit()
+        self.refresh()
+
+    def refresh(self):
+        """Re-reads the per-column state, which another worker may have changed."""
+        with self.store.lock:
+            self.columns = dict(self.conn.execute("SELECT col, distinct_values FROM field_columns"))
+
+    def _add(self, column: str, values: Dict[str, List[int]]):
+        """Adds value -> ids postings for one column. Caller holds the store lock."""
+        if self.columns.get(column) == -1:
+            return
+        values = {value: ids for value, ids in values.items() if value}
+        if not values:
+            return
+        if column not in KEY_COLUMNS:
+            if len(values) > MAX_DISTINCT_VALUES:
+                new_values = values
+            else:
+                new_values = [
+                    value for value in values
+                    if self.conn.execute("SELECT 1 FROM field_values WHERE col = ? AND value = ? LIMIT 1",
+                                         (column, value)).fetchone() is None
+                ]
+            distinct = self.columns.get(column, 0) + len(new_values)
+            if distinct > MAX_DISTINCT_VALUES:
+                self.conn.execute("DELETE FROM field_values WHERE col = ?", (column,))
+                self._set_distinct(column, -1)
+                return
+            self._set_distinct(column, distinct)
+        elif column not in self.columns:
+            self._set_distinct(column, 0)
+        self.conn.executemany(
+            "INSERT INTO field_values (col, value, doc_id) VALUES (?, ?, ?)",
+            [(column, value, int(doc_id)) for value, ids in values.items() for doc_id in ids],
+        )
+
+    def _set_distinct(self, column: str, distinct: int):
+        self.conn.execute("INSERT OR REPLACE INTO field_columns (col, distinct_values) VALUES (?, ?)", (column, distinct))
+        self.columns[column] = distinct
+
+    def add_rows(self, start_id: int, df: pd.DataFrame):
+        """Indexes a block of rows whose ids are start_id, start_id + 1, ..."""
+        with self.store.lock:
+            for col in df.columns:
+                column = normalize(col)
+                if self.columns.get(column) == -1:
+                    continue
+                values = df[col].astype(str).str.strip().str.lower()
+                self._add(column, {value: positions + start_id for value, positions in values.groupby(values).indices.items()})
+
+    def add_record(self, doc_id: int, record: Dict[str, str]):
+        with self.store.lock:
+            for col, val in record.items():
+                self._add(normalize(col), {normalize(val): [doc_id]})
+
+    def has_column(self, column: str) -> bool:
+        return self.columns.get(column, -1) != -1
+
+    def lookup(self, column: str, value: str) -> List[int]:
+        with self.store.lock:
+            rows = self.conn.execute(
+                "SELECT doc_id FROM field_values WHERE col = ? AND value = ? ORDER BY doc_id", (column, normalize(value))
+            )
+            return [doc_id for (doc_id,) in rows]
+
+    def remove_ids(self, ids):
+        """Drops the postings of deleted rows. Distinct-value counts are left as they were."""
+        ids = [int(i) for i in ids]
+        with self.store.lock:
+            for start in range(0, len(ids), LOOKUP_CHUNK):
+                chunk = ids[start:start + LOOKUP_CHUNK]
+                self.conn.execute(f"DELETE FROM field_values WHERE doc_id IN ({','.join('?' * len(chunk))})", chunk)
+
+    def is_empty(self) -> bool:
+        return not self.columns
+
+    def clear(self):
+        with self.store.lock:
+            self.conn.execute("DELETE FROM field_values")
+            self.conn.execute("DELETE FROM field_columns")
+            self.conn.commit()
+            self.columns = {}
+
+    def rebuild_from_store(self):
+        """Rebuilds the postings from stored row texts (used for stores that predate them)."""
+        self.clear()
+        for doc_id, doc in self.store.iter_with_ids():
+            if is_tabular(doc):
+                self.add_record(doc_id, parse_display_text(doc.get("text", "")))
+        self.store.commit()
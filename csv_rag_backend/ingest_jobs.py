@@ -0,0 +1,106 @@
+"""Background ingestion jobs and chunked CSV reading for /upload-csv/."""
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Iterator, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from field_index import parse_display_text
+
+CSV_CHUNK_ROWS = 5000
+# Only this many finished jobs are remembered for the status endpoint.
+MAX_FINISHED_JOBS = 100
+
+
+def iter_csv_chunks(path: str, chunk_rows: int = CSV_CHUNK_ROWS) -> Iterator[Tuple[pd.DataFrame, float]]:
+    """Yields (chunk, fraction of the file read so far) without loading the whole CSV."""
+    size = os.path.getsize(path) or 1
+    with open(path, "rb") as f:
+        for chunk in pd.read_csv(f, dtype=str, chunksize=chunk_rows):
+            yield chunk.fillna(""), min(f.tell() / size, 1.0)
+
+
+def build_row_texts(df: pd.DataFrame) -> Tuple[List[str], List[str]]:
+    """Builds the embedding and display strings for every row with column-wise string ops.
+
+    Produces exactly what the old per-row loop did: the embedding text is the
+    non-empty values joined by spaces, the display text is "col: val | col: val".
+    """
+    if df.empty:
+        return [], []
+    embedding = pd.Series("", index=df.index)
+    display = None
+    for col in df.columns:
+        values = df[col].astype(str)
+        embedding = embedding + np.where(values != "", " " + values, "")
+        part = f"{col}: " + values
+        display = part if display is None else display + " | " + part
+    return embedding.str[1:].tolist(), display.tolist()
+
+
+def embedding_text_from_display(text: str) -> str:
+    """Recovers a row's embedding text from its stored "col: val | col: val" display text."""
+    return " ".join(value for value in parse_display_text(text).values() if value != "")
+
+
+def batched(items: list, size: int) -> Iterator[Tuple[int, list]]:
+    for start in range(0, len(items), size):
+        yield start, items[start:start + size]
+
+
+class JobRegistry:
+    """Runs ingestion jobs one at a time on a background thread and tracks their progress."""
+
+    def __init__(self):
+        self._jobs = OrderedDict()
+        self._lock = threading.Lock()
+        # A single worker keeps uploads from interleaving their writes to the index.
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="ingest")
+
+    def submit(self, filename: str, work: Callable[[str], dict]) -> dict:
+        job_id = uuid.uuid4().hex
+        job = {
+            "job_id": job_id,
+            "filename": filename,
+            "status": "queued",
+            "progress": 0.0,
+            "rows_indexed": 0,
+            "submitted_at": time.time(),
+            "started_at": None,
+            "finished_at": None,
+            "error": None,
+        }
+        with self._lock:
+            self._jobs[job_id] = job
+            self._forget_old_jobs()
+        self._executor.submit(self._run, job_id, work)
+        return dict(job)
+
+    def _run(self, job_id: str, work: Callable[[str], dict]):
+        self.update(job_id, status="running", started_at=time.time())
+        try:
+            result = work(job_id)
+            self.update(job_id, status="completed", progress=1.0, finished_at=time.time(), **result)
+        except Exception as e:
+            print(f"❌ Ingestion job {job_id} failed: {e}")
+            self.update(job_id, status="failed", finished_at=time.time(), error=str(e))
+
+    def update(self, job_id: str, **fields):
+        with self._lock:
+            if job_id in self._jobs:
+                self._jobs[job_id].update(fields)
+
+    def get(self, job_id: str) -> Optional[dict]:
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return dict(job) if job else None
+
+    def _forget_old_jobs(self):
+        finished = [jid for jid, job in self._jobs.items() if job["status"] in ("completed", "failed")]
+        for jid in finished[:max(0, len(finished) - MAX_FINISHED_JOBS)]:
+            del self._jobs[jid]
@@ -0,0 +1,214 @@
+"""In-memory BM25 inverted index over the row texts, for hybrid retrieval.
+
+Sentence embeddings are poor at matching names, subject codes and USN
+fragments, so the default chat retrieval also ranks rows lexically and fuses
+both rankings with reciprocal rank fusion. Postings are appended as rows are
+ingested and filtered out lazily when rows are removed; terms that occur in more than half of all rows (column names such
+as "usn" or "year") carry no signal and are skipped at query time.
+
+save() writes the postings and row lengths as flat numpy arrays next to each
+published snapshot, so a starting worker loads them instead of re-tokenizing
+every stored row.
+"""
+import math
+import os
+import re
+from array import array
+from typing import Dict, Iterable, List, Tuple
+
+import numpy as np
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+PART_PATTERN = re.compile(r"[a-z]+|[0-9]+")
+K1 = 1.2
+B = 0.75
+MAX_DF_RATIO = 0.5
+# Shorter letter/digit runs ("4", "dm", "22") match too many rows to be useful.
+MIN_PART_LENGTH = 3
+# Removed rows stay in the posting lists until this share of the corpus has been removed.
+COMPACT_RATIO = 0.25
+# Standard constant from the reciprocal rank fusion paper.
+RRF_K = 60
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercase alphanumeric tokens; mixed tokens such as "4dm22ai001" also yield
+    their longer letter/digit runs so a fragment like "ai001" still matches."""
+    tokens = []
+    for token in TOKEN_PATTERN.findall(text.lower()):
+        tokens.append(token)
+        parts = PART_PATTERN.findall(token)
+        if len(parts) > 1:
+            tokens.extend(part for part in parts if len(part) >= MIN_PART_LENGTH)
+    return tokens
+
+
+def reciprocal_rank_fusion(rankings: Iterable[List[int]], limit: int) -> List[int]:
+    scores: Dict[int, float] = {}
+    for ranking in rankings:
+        for rank, doc_id in enumerate(ranking):
+            scores[doc_id] = scores.get(doc_id, 0.0) + 1.0 / (RRF_K + rank + 1)
+    return sorted(scores, key=lambda doc_id: -scores[doc_id])[:limit]
+
+
+class LexicalIndex:
+    def __init__(self):
+        self._postings: Dict[str, Tuple[array, array]] = {}
+        # numpy copies of posting lists, dropped whenever a term gets new postings.
+        self._arrays: Dict[str, Tuple[np.ndarray, np.ndarray]] = {}
+        # Posting lists read by load(), as [start, end) spans of the flat arrays below; a term
+        # moves to _postings the first time it gets new postings.
+        self._spans: Dict[str, Tuple[int, int]] = {}
+        self._span_ids = np.zeros(0, dtype=np.int64)
+        self._span_tfs = np.zeros(0, dtype=np.float32)
+        self._doc_len = np.zeros(1024, dtype=np.float32)
+        self._live = np.zeros(1024, dtype=bool)
+        self.doc_count = 0
+        self._total_len = 0
+        self._removed = 0
+
+    def add(self, doc_id: int, text: str):
+        tokens = tokenize(text)
+        if doc_id >= len(self._doc_len):
+            size = max(doc_id + 1, 2 * len(self._doc_len))
+            self._doc_len = np.concatenate([self._doc_len, np.zeros(size - len(self._doc_len), dtype=np.float32)])
+            self._live = np.concatenate([self._live, np.zeros(size - len(self._live), dtype=bool)])
+        self._doc_len[doc_id] = len(tokens)
+        self._live[doc_id] = True
+        self.doc_count += 1
+        self._total_len += len(tokens)
+        counts: Dict[str, int] = {}
+        for token in tokens:
+            counts[token] = counts.get(token, 0) + 1
+        for token, tf in counts.items():
+            ids, tfs = self._posting_lists(token)
+            ids.append(doc_id)
+            tfs.append(tf)
+            self._arrays.pop(token, None)
+
+    def _posting_lists(self, term: str) -> Tuple[array, array]:
+        lists = self._postings.get(term)
+        if lists is None:
+            lists = self._postings[term] = (array("q"), array("f"))
+            span = self._spans.pop(term, None)
+            if span is not None:
+                lists[0].frombytes(self._span_ids[span[0]:span[1]].tobytes())
+                lists[1].frombytes(self._span_tfs[span[0]:span[1]].tobytes())
+        return lists
+
+    def add_many(self, start_id: int, texts: List[str]):
+        for offset, text in enumerate(texts):
+            self.add(start_id + offset, text)
+
+    def remove(self, ids):
+        ids = np.asarray([i for i in ids if 0 <= i < len(self._live)], dtype=np.int64)
+        ids = ids[self._live[ids]]
+        self._live[ids] = False
+        self.doc_count -= len(ids)
+        self._total_len -= int(self._doc_len[ids].sum())
+        self._removed += len(ids)
+        if self._removed > COMPACT_RATIO * max(self.doc_count, 1):
+            self._compact()
+
+    def _compact(self):
+        """Rewrites the posting lists without removed rows."""
+        for term in list(self._postings) + list(self._spans):
+            ids, tfs = self._term_arrays(term)
+            keep = self._live[ids]
+            self._arrays.pop(term, None)
+            if keep.all():
+                continue
+            self._postings.pop(term, None)
+            self._spans.pop(term, None)
+            if not keep.any():
+                continue
+            new_ids, new_tfs = array("q"), array("f")
+            new_ids.frombytes(ids[keep].tobytes())
+            new_tfs.frombytes(tfs[keep].tobytes())
+            self._postings[term] = (new_ids, new_tfs)
+        self._removed = 0
+
+    def save(self, path: str, next_id: int):
+        """Writes the index, covering the rows below `next_id`, to an .npz file (replaced atomically)."""
+        terms = list(self._postings) + list(self._spans)
+        spans = list(self._spans.values())
+        postings = [
+            [term_ids.tobytes() for term_ids, _ in self._postings.values()]
+            + [self._span_ids[start:end].tobytes() for start, end in spans],
+            [term_tfs.tobytes() for _, term_tfs in self._postings.values()]
+            + [self._span_tfs[start:end].tobytes() for start, end in spans],
+        ]
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "wb") as f:
+            np.savez(
+                f,
+                # Tokens are [a-z0-9]+, so newlines can separate them.
+                terms=np.frombuffer("\n".join(terms).encode("ascii"), dtype=np.uint8),
+                lengths=np.array([len(term_ids) // 8 for term_ids in postings[0]], dtype=np.int64),
+                ids=np.frombuffer(b"".join(postings[0]), dtype=np.int64),
+                tfs=np.frombuffer(b"".join(postings[1]), dtype=np.float32),
+                doc_len=self._doc_len,
+                live=self._live,
+                counts=np.array([self.doc_count, self._total_len, self._removed, next_id], dtype=np.int64),
+            )
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str) -> Tuple["LexicalIndex", int]:
+        """Reads an index written by save(); returns it with the `next_id` it covers."""
+        index = cls()
+        with np.load(path) as data:
+            terms = data["terms"].tobytes().decode("ascii").split("\n") if data["terms"].size else []
+            bounds = np.concatenate([[0], np.cumsum(data["lengths"])]).tolist()
+            index._spans = dict(zip(terms, zip(bounds[:-1], bounds[1:])))
+            index._span_ids, index._span_tfs = data["ids"], data["tfs"]
+            index._doc_len = data["doc_len"].copy()
+            index._live = data["live"].copy()
+            index.doc_count, index._total_len, index._removed, next_id = (int(n) for n in data["counts"])
+        return index, next_id
+
+    def _term_arrays(self, term: str):
+        span = self._spans.get(term)
+        if span is not None:
+            return self._span_ids[span[0]:span[1]], self._span_tfs[span[0]:span[1]]
+        arrays = self._arrays.get(term)
+        if arrays is None:
+            ids, tfs = self._postings[term]
+            arrays = self._arrays[term] = (np.array(ids, dtype=np.int64), np.array(tfs, dtype=np.float32))
+        return arrays
+
+    def search(self, query: str, k: int) -> List[int]:
+        """Returns up to k doc ids ranked by BM25 score."""
+        if self.doc_count == 0:
+            return []
+        avg_len = self._total_len / self.doc_count
+        ids_parts, score_parts = [], []
+        for term in set(tokenize(query)):
+            if term not in self._postings and term not in self._spans:
+                continue
+            ids, tfs = self._term_arrays(term)
+            df = len(ids)
+            if df > MAX_DF_RATIO * self.doc_count:
+                continue
+            idf = math.log(1 + (self.doc_count - df + 0.5) / (df + 0.5))
+            lengths = self._doc_len[ids]
+            ids_parts.append(ids)
+            score_parts.append(idf * tfs * (K1 + 1) / (tfs + K1 * (1 - B + B * lengths / avg_len)))
+        if not ids_parts:
+            return []
+        all_ids, all_scores = np.concatenate(ids_parts), np.concatenate(score_parts)
+        if len(all_ids) * 16 < len(self._doc_len):
+            # Few postings: sum per distinct id instead of touching a corpus-sized array.
+            candidates, inverse = np.unique(all_ids, return_inverse=True)
+            totals = np.bincount(inverse, weights=all_scores)
+        else:
+            totals = np.bincount(all_ids, weights=all_scores)
+            candidates = np.flatnonzero(totals)
+            totals = totals[candidates]
+        if self._removed:
+            live = self._live[candidates]
+            candidates, totals = candidates[live], totals[live]
+        if len(candidates) > k:
+            top = np.argpartition(-totals, k)[:k]
+            candidates, totals = candidates[top], totals[top]
+        return [int(i) for i in candidates[np.argsort(-totals, kind="stable")]]
@@ -1,27 +1,50 @@
 import os
 import uuid
+import asyncio
+import base64
+import itertools
 import json
-import shutil
 import re
-from typing import List, Optional
+import threading
+import time
+from typing import Any, Callable, List, Literal, Optional, Tuple
 
 # FastAPI for creating the API
-from fastapi import FastAPI, File, UploadFile, HTTPException
+from fastapi import FastAPI, File, Form, UploadFile, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse
+from starlette.concurrency import run_in_threadpool
 from pydantic import BaseModel
 
 # Data handling and vector processing
 import pandas as pd
 import numpy as np
-import faiss
 
 # For loading environment variables, embedding models, and API requests
 from dotenv import load_dotenv
-from sentence_transformers import SentenceTransformer
-import requests
-from requests.utils import get_environ_proxies
 import google.generativeai as genai
 
+import vector_index
+from concurrent.futures.process import BrokenProcessPool
+
+from embedding_backend import EMBED_WORKERS, EmbeddingPool, load_embedding_model, embedding_signature
+from embedding_cache import EmbeddingCache
+from ingest_jobs import JobRegistry, iter_csv_chunks, build_row_texts, batched, embedding_text_from_display
+from field_index import FieldIndex, is_tabular, normalize as normalize_value
+from row_keys import RowKeyIndex, row_digest
+from metadata_store import MetadataStore
+from answer_cache import AnswerCache, question_key
+from lexical_index import LexicalIndex, reciprocal_rank_fusion
+from context_packing import CONTEXT_TOKEN_BUDGET, pack_context, render_table
+from question_paper_search import QuestionPaperSearch
+from snapshots import SnapshotStore
+from table_store import TableStore, table_name
+from query_batcher import QUERY_BATCHING, QueryBatcher, QueueFull
+from session_store import SessionStore, is_follow_up, rows_cover
+from document_ingest import DOCUMENT_EXTENSIONS, ExtractionPool
+from answer_templates import TEMPLATE_TOOLS, AnswerStats, render_list, render_usn, wants_template, year_summary
+from structured_query import parse_query, run_query
+
 # --- 1. CONFIGURATION & INITIALIZATION ---
 
 load_dotenv()
@@ -38,8 +61,18 @@ if not SERPER_API_KEY:
 
 STORE_DIR = "data_store"
 os.makedirs(STORE_DIR, exist_ok=True)
-INDEX_PATH = os.path.join(STORE_DIR, "vector_index.faiss")
+# Legacy JSON metadata; imported into METADATA_DB_PATH on first start.
 METADATA_PATH = os.path.join(STORE_DIR, "metadata.json")
+METADATA_DB_PATH = os.path.join(STORE_DIR, "metadata.sqlite")
+EMBEDDING_CACHE_PATH = os.path.join(STORE_DIR, "embedding_cache.sqlite")
+# Signature of the model/backend the stored vectors were embedded with.
+EMBEDDING_SIGNATURE_PATH = os.path.join(STORE_DIR, "embedding_signature.txt")
+QUESTION_PAPER_CACHE_PATH = os.path.join(STORE_DIR, "question_paper_cache.sqlite")
+# Typed Parquet copies of the uploaded CSVs for the structured-query tool.
+TABLES_DIR = os.path.join(STORE_DIR, "tables")
+EMBEDDING_MODEL_NAME = "all-MiniLM-L6-v2"
+EMBED_BATCH_SIZE = int(os.getenv("CSV_RAG_EMBED_BATCH_SIZE", "256"))
+UPLOAD_COPY_CHUNK = 1024 * 1024
 
 app = FastAPI(title="📄 Yenepoya Campus Chat API")
 
@@ -60,9 +93,50 @@ app.add_middleware(
 # --- 2. GLOBAL VARIABLES & MODELS ---
 
 embed_model = None
+embed_signature = None
+# Worker processes for bulk embedding; None when CSV_RAG_EMBED_WORKERS is 0.
+embedding_pool = None
+# Batches concurrent question embeddings into one forward pass; None when CSV_RAG_QUERY_BATCHING is 0.
+query_batcher = None
+embedding_cache = None
 index = None
+# True while `index` is memory-mapped from its snapshot file; it must be copied into RAM before any write.
+index_mapped = False
 metadata = []
+field_index = None
+row_keys = None
+table_store = None
+lexical_index = LexicalIndex()
+# Set once lexical_index covers every stored row; until then /chat/ retrieves by vectors alone.
+lexical_ready = threading.Event()
+# Guards index/metadata against the ingestion worker writing while /chat/ reads.
+index_lock = threading.RLock()
+# Rows of an in-progress upload or replacement; indexed but not yet visible to /chat/.
+hidden_ids = set()
+# Version of the published snapshot this worker serves; cached answers are keyed on it.
+data_version = 0
+# Versioned index files and the writer lock shared by every uvicorn worker on STORE_DIR.
+snapshots = SnapshotStore(STORE_DIR)
+# Held while swapping in a newer snapshot, so concurrent requests don't all reload it.
+reload_lock = threading.Lock()
+answer_cache = AnswerCache()
+sessions = SessionStore()
+answer_stats = AnswerStats()
+# Worker processes for PDF and Excel text extraction, started on the first such upload.
+extraction_pool = ExtractionPool()
+question_papers = QuestionPaperSearch(QUESTION_PAPER_CACHE_PATH, SERPER_API_KEY)
+ingest_jobs = JobRegistry()
 EMBEDDING_DIM = 384
+MAX_BATCH_QUESTIONS = int(os.getenv("CSV_RAG_MAX_BATCH_QUESTIONS", "100"))
+LLM_CONCURRENCY = int(os.getenv("CSV_RAG_LLM_CONCURRENCY", "8"))
+HYBRID_SEARCH = os.getenv("CSV_RAG_HYBRID_SEARCH", "1") == "1"
+HYBRID_CANDIDATE_FACTOR = 4
+# Rows added to the BM25 index per index_lock hold while it is built in the background.
+LEXICAL_FILL_BATCH = 1000
+# Rows per page of a list answer (e.g. "list all final year students").
+LIST_PAGE_SIZE = int(os.getenv("CSV_RAG_LIST_PAGE_SIZE", "25"))
+MAX_LIST_PAGE_SIZE = 200
+LIST_TOOLS = {"year_filter", "structured"}
 USN_PATTERN = re.compile(r'\b4DM\d{2}[A-Z]{2}\d{3}\b', re.IGNORECASE)
 FILTER_PATTERN = re.compile(r'\b(list|show|get)\s+(all|every)\b.*\b(final|third|second|first)\s+year\b', re.IGNORECASE)
 
@@ -72,87 +146,525 @@ FILTER_PATTERN = re.compile(r'\b(list|show|get)\s+(all|every)\b.*\b(final|third|
 class ChatRequest(BaseModel):
     question: str
     session_id: Optional[str] = None
+    # Starts a server-side conversation when no session_id is sent; its id comes back in the response.
+    new_session: bool = False
     top_k: int = 5
+    # For list answers: the next_cursor of the previous page, and rows per page.
+    cursor: Optional[str] = None
+    page_size: int = LIST_PAGE_SIZE
+    # "auto": exact lookups (USN, year, counts) are answered from a template; "prose": the LLM always writes the answer.
+    answer_style: Literal["auto", "prose"] = "auto"
 
 class ChatResponse(BaseModel):
-    session_id: str
+    # None for one-shot questions, which are not remembered.
+    session_id: Optional[str] = None
     answer: str
     source_documents: List[dict]
+    next_cursor: Optional[str] = None
+
+class ChatBatchRequest(BaseModel):
+    questions: List[str]
+    session_id: Optional[str] = None
+    new_session: bool = False
+    top_k: int = 5
+    answer_style: Literal["auto", "prose"] = "auto"
+
+class ChatBatchResponse(BaseModel):
+    results: List[ChatResponse]
 
 # --- 4. CORE FUNCTIONS ---
 
 def load_models_and_index():
-    global embed_model, EMBEDDING_DIM, index, metadata
+    global embed_model, embed_signature, embedding_pool, query_batcher, embedding_cache, EMBEDDING_DIM
+    global index, index_mapped, metadata, field_index, row_keys, table_store, lexical_index, data_version
     print("Loading embedding model...")
-    embed_model = SentenceTransformer("all-MiniLM-L6-v2")
+    embed_model, backend = load_embedding_model(EMBEDDING_MODEL_NAME)
     EMBEDDING_DIM = embed_model.get_sentence_embedding_dimension()
-    print(f"✅ Embedding model loaded (Dimension: {EMBEDDING_DIM}).")
-
-    if os.path.exists(INDEX_PATH) and os.path.exists(METADATA_PATH):
-        print("Loading existing FAISS index and metadata...")
-        index = faiss.read_index(INDEX_PATH)
-        with open(METADATA_PATH, "r") as f:
-            metadata = json.load(f)
-        print(f"✅ Index loaded with {len(metadata)} documents.")
-    else:
-        print("No index found. Creating a new one.")
-        index = faiss.IndexFlatIP(EMBEDDING_DIM)
-        metadata = []
-        print("✅ New empty index created.")
+    embed_signature = embedding_signature(EMBEDDING_MODEL_NAME, backend)
+    embedding_cache = EmbeddingCache(EMBEDDING_CACHE_PATH, embed_signature)
+    print(f"✅ Embedding model loaded ({backend} backend, Dimension: {EMBEDDING_DIM}).")
+    if EMBED_WORKERS > 0 and embedding_pool is None:
+        embedding_pool = EmbeddingPool(EMBEDDING_MODEL_NAME, backend, EMBED_WORKERS)
+    if QUERY_BATCHING and query_batcher is None:
+        query_batcher = QueryBatcher(lambda texts: embed_model.encode(texts, convert_to_numpy=True, show_progress_bar=False))
+
+    # Other workers may be starting or writing at the same time; migrations run under the writer lock.
+    with snapshots.writer_lock():
+        metadata = MetadataStore(METADATA_DB_PATH)
+        if len(metadata) == 0 and os.path.exists(METADATA_PATH):
+            print("Migrating metadata.json into the metadata store...")
+            metadata.import_json(METADATA_PATH)
+        field_index = FieldIndex(metadata)
+        if field_index.is_empty() and len(metadata) > 0:
+            print("Building field indexes from stored metadata...")
+            field_index.rebuild_from_store()
+        row_keys = RowKeyIndex(metadata)
+        table_store = TableStore(TABLES_DIR)
+        if table_store.is_empty() and len(metadata) > 0:
+            print("Building typed tables from stored metadata...")
+            table_store.rebuild_from_store(metadata)
+
+        manifest = snapshots.current()
+        data_version = manifest["version"]
+        index_path = snapshots.index_path(manifest)
+        ids_lost = False
+        if index_path is not None:
+            print(f"Loading FAISS index snapshot v{data_version}...")
+            loaded = vector_index.load_index(index_path)
+            index = vector_index.ensure_id_map(loaded)
+            if index is None:
+                ids_lost = True
+                index = vector_index.create_index(EMBEDDING_DIM, "flat")
+            index_mapped = vector_index.MMAP_INDEX and index is loaded
+            print(f"✅ Index loaded with {len(metadata)} documents ({vector_index.describe_index(index)}).")
+        else:
+            print("No index found. Creating a new one.")
+            index = vector_index.create_index(EMBEDDING_DIM, vector_index.target_kind(0), codec=vector_index.target_codec(0))
+            print("✅ New empty index created.")
+
+        stored_signature = read_embedding_signature()
+        if ids_lost:
+            reembed_store()
+        elif index.ntotal > 0 and (stored_signature != embed_signature or index.d != EMBEDDING_DIM):
+            print(f"Stored vectors were embedded with '{stored_signature}', not '{embed_signature}'.")
+            reembed_store()
+        elif vector_index.needs_rebuild(index):
+            index = vector_index.maybe_rebuild_index(index)
+            index_mapped = False
+            save_index()
+        with open(EMBEDDING_SIGNATURE_PATH, "w") as f:
+            f.write(embed_signature)
+        loaded_next_id = metadata.next_id
+
+        loaded_version = data_version
+
+    # Rows past loaded_next_id belong to snapshots published since, and are added by refresh_snapshot().
+    if loaded_next_id == 0:
+        lexical_index = LexicalIndex()
+        lexical_ready.set()
+        return
+    try:
+        loaded_lexical, saved_next_id = LexicalIndex.load(snapshots.lexical_path(loaded_version))
+    except (OSError, KeyError, ValueError):
+        # No postings saved with this snapshot (older stores, or pruned meanwhile): build them in the background.
+        lexical_index = LexicalIndex()
+        threading.Thread(target=fill_lexical_index, args=(loaded_next_id,), daemon=True).start()
+        return
+    with index_lock:
+        for doc_id, doc in metadata.iter_with_ids(after_id=saved_next_id - 1):
+            if doc_id >= loaded_next_id:
+                break
+            loaded_lexical.add(doc_id, doc.get("text", ""))
+        lexical_index = loaded_lexical
+    lexical_ready.set()
+    print(f"✅ BM25 index loaded from snapshot v{loaded_version} ({lexical_index.doc_count} rows).")
+
+def fill_lexical_index(stop_id: int):
+    """Adds the stored rows below `stop_id` to lexical_index, then saves it with the current snapshot.
+
+    Newer rows and deletions reach lexical_index through the usual write
+    paths meanwhile; each batch is read and added under index_lock, so a row
+    deleted mid-build is never re-added.
+    """
+    print("🔧 Building the BM25 index in the background; hybrid search is vector-only until it's ready.")
+    start = time.time()
+    last_id = -1
+    while True:
+        with index_lock:
+            batch = list(itertools.islice(metadata.iter_with_ids(after_id=last_id), LEXICAL_FILL_BATCH))
+            batch = [(doc_id, doc) for doc_id, doc in batch if doc_id < stop_id]
+            for doc_id, doc in batch:
+                lexical_index.add(doc_id, doc.get("text", ""))
+        if len(batch) < LEXICAL_FILL_BATCH:
+            break
+        last_id = batch[-1][0]
+    lexical_ready.set()
+    print(f"✅ BM25 index built over {lexical_index.doc_count} rows in {time.time() - start:.1f}s.")
+    # Saved under the writer lock so no write is half-applied; the next publish saves it otherwise.
+    with snapshots.writer_lock():
+        with index_lock:
+            path = snapshots.lexical_path(data_version)
+            if data_version == snapshots.current()["version"] and not hidden_ids and not os.path.exists(path):
+                lexical_index.save(path, metadata.next_id)
+
+def read_embedding_signature() -> str:
+    if not os.path.exists(EMBEDDING_SIGNATURE_PATH):
+        # Stores from before signatures were recorded were embedded with eager PyTorch.
+        return embedding_signature(EMBEDDING_MODEL_NAME, "torch")
+    with open(EMBEDDING_SIGNATURE_PATH) as f:
+        return f.read().strip()
+
+def reembed_store():
+    """Re-embeds every stored row into a fresh index with the current model and backend."""
+    global index, index_mapped
+    print(f"🔧 Re-embedding {len(metadata)} stored rows...")
+    new_index = vector_index.create_index(EMBEDDING_DIM, "flat")
+    ids, texts = [], []
+    for doc_id, doc in metadata.iter_with_ids():
+        ids.append(doc_id)
+        # PDF chunks were embedded from their plain text; table rows from their row text.
+        texts.append(embedding_text_from_display(doc.get("text", "")) if is_tabular(doc) else doc.get("text", ""))
+        if len(ids) == ingest_batch_size():
+            new_index.add_with_ids(embedding_cache.encode(texts, embed_documents)[0], np.array(ids, dtype=np.int64))
+            ids, texts = [], []
+    if ids:
+        new_index.add_with_ids(embedding_cache.encode(texts, embed_documents)[0], np.array(ids, dtype=np.int64))
+    index = vector_index.maybe_rebuild_index(new_index)
+    index_mapped = False
+    save_index()
 
-def save_index():
-    faiss.write_index(index, INDEX_PATH)
-    with open(METADATA_PATH, "w") as f:
-        json.dump(metadata, f)
-    print(f"💾 Index and metadata saved with {len(metadata)} documents.")
+def save_index(unhide=()):
+    """Publishes the current index and metadata as a new snapshot version, then shows `unhide` to /chat/.
+
+    Caller holds the snapshot writer lock.
+    """
+    global data_version
+    version = max(data_version, snapshots.current()["version"]) + 1
+    path = snapshots.new_index_path(version)
+    # Only the writer changes the index, so it can be written out while /chat/ keeps searching it.
+    vector_index.save_index_file(index, path)
+    if lexical_ready.is_set():
+        lexical_index.save(snapshots.lexical_path(version), metadata.next_id)
+    table_store.save()
+    # Metadata rows were already appended as they were indexed; this only makes them durable.
+    metadata.mark_published(version)
+    metadata.commit()
+    # Keeps this worker's own requests from reloading the snapshot it is publishing.
+    with reload_lock:
+        snapshots.publish(version, path)
+        with index_lock:
+            hidden_ids.difference_update(unhide)
+            data_version = version
+    print(f"💾 Index and metadata saved as snapshot v{version} with {len(metadata)} documents.")
+
+def refresh_snapshot(block: bool = True):
+    """Swaps in snapshots another worker has published since this one last loaded.
+
+    Requests call this with block=False and skip it while another request is
+    already reloading; writers call it under the writer lock before changing
+    anything, so they always build on the latest version.
+    """
+    global index, index_mapped, data_version, lexical_index
+    if not reload_lock.acquire(blocking=block):
+        return
+    try:
+        while True:
+            # Taken before reading the manifest, so a publish that lands meanwhile is still seen as a change.
+            signature = snapshots.signature()
+            manifest = snapshots.current()
+            if manifest["version"] <= data_version:
+                snapshots.mark_seen(signature)
+                return
+            path = snapshots.index_path(manifest)
+            try:
+                # Loaded outside index_lock, so /chat/ keeps answering from the old version meanwhile.
+                loaded = vector_index.load_index(path)
+            except RuntimeError:
+                # Pruned by a newer publish while reading the manifest; read it again.
+                continue
+            new_index = vector_index.ensure_id_map(loaded)
+            table_store.load()
+            with index_lock:
+                old_next_id = metadata.next_id
+                metadata.refresh()
+                field_index.refresh()
+                if metadata.cleared_since(data_version):
+                    lexical_index = LexicalIndex()
+                    old_next_id = 0
+                else:
+                    lexical_index.remove(metadata.deleted_since(data_version))
+                for doc_id, doc in metadata.iter_with_ids(after_id=old_next_id - 1):
+                    lexical_index.add(doc_id, doc.get("text", ""))
+                index = new_index
+                index_mapped = vector_index.MMAP_INDEX and new_index is loaded
+                data_version = manifest["version"]
+            print(f"🔧 Reloaded index snapshot v{data_version} ({len(metadata)} documents).")
+    finally:
+        reload_lock.release()
 
 def normalize_vectors(vectors: np.ndarray) -> np.ndarray:
     norms = np.linalg.norm(vectors, axis=1, keepdims=True)
     return np.divide(vectors, norms, where=norms != 0)
 
-def filter_students_by_year(year: str) -> List[dict]:
+def ingest_batch_size() -> int:
+    """Rows embedded per step; with a worker pool, each worker gets a full batch."""
+    return EMBED_BATCH_SIZE * max(1, EMBED_WORKERS)
+
+def embed_documents(texts: List[str]) -> np.ndarray:
+    """Embeds and normalizes document texts with the model or the worker pool (no caching)."""
+    if embedding_pool is not None:
+        try:
+            return normalize_vectors(embedding_pool.encode(texts)).astype(np.float32)
+        except BrokenProcessPool as e:
+            print(f"⚠️ Embedding pool failed ({e}); restarting it and embedding this batch in-process.")
+            embedding_pool.restart()
+    vectors = embed_model.encode(texts, convert_to_numpy=True, show_progress_bar=False)
+    return normalize_vectors(vectors).astype(np.float32)
+
+def ensure_writable_index():
+    """Swaps a memory-mapped index for an in-RAM copy before it is modified. Caller holds index_lock."""
+    global index, index_mapped
+    if index_mapped:
+        print("Copying the memory-mapped index into RAM for writing...")
+        index = vector_index.writable_copy(index)
+        index_mapped = False
+
+def delete_documents(ids: List[int]):
+    """Removes rows from the vector, metadata, field and lexical indexes.
+
+    Caller holds the writer lock and index_lock, and calls save_index() afterwards.
+    """
+    global index
+    if not ids:
+        return
+    ensure_writable_index()
+    index = vector_index.remove_ids(index, ids)
+    metadata.delete_ids(ids)
+    field_index.remove_ids(ids)
+    row_keys.remove_ids(ids)
+    table_store.remove_ids(ids)
+    lexical_index.remove(ids)
+
+def plan_upsert(chunk: pd.DataFrame, display_texts: List[str], key_column: str) -> Tuple[List[bool], dict, List[int]]:
+    """Decides which rows of a keyed upload's chunk to index.
+
+    Returns a keep flag per row, inserted/updated/unchanged/duplicate_keys
+    counts and the ids of the stored rows that updated keys replace. Rows
+    without a key value are always inserted; within the chunk, the last row
+    of a repeated key wins.
+    """
+    keys = chunk[key_column].map(normalize_value)
+    existing = row_keys.lookup(key_column, [key for key in keys if key])
+    last_of_key = (~keys.duplicated(keep="last") | (keys == "")).tolist()
+    keep, stale = [], []
+    counts = {"inserted": 0, "updated": 0, "unchanged": 0, "duplicate_keys": 0}
+    for key, text, is_last in zip(keys, display_texts, last_of_key):
+        prior = existing.get(key, []) if key else []
+        if not is_last:
+            counts["duplicate_keys"] += 1
+            keep.append(False)
+        elif len(prior) == 1 and prior[0][1] == row_digest(text):
+            counts["unchanged"] += 1
+            keep.append(False)
+        else:
+            counts["updated" if prior else "inserted"] += 1
+            stale.extend(doc_id for doc_id, _ in prior)
+            keep.append(True)
+    return keep, counts, stale
+
+def record_row_keys(rows: pd.DataFrame, ids: List[int], display_texts: List[str], key_columns: List[str]):
+    """Records the new rows' values of every column used as an upsert key. Caller holds index_lock."""
+    by_name = {normalize_value(col): col for col in rows.columns}
+    for key_column in key_columns:
+        if key_column in by_name:
+            values = rows[by_name[key_column]].tolist()
+            row_keys.add(key_column, [(value, doc_id, row_digest(text))
+                                      for value, doc_id, text in zip(values, ids, display_texts) if value.strip()])
+
+def index_batch(state: dict, entries: List[dict], embedding_texts: List[str], rows: Optional[pd.DataFrame] = None,
+                table: str = "", key_columns: List[str] = ()):
+    """Embeds and indexes one batch of an upload, hidden until the upload is published.
+
+    `rows` are the batch's parsed table rows for tabular uploads (CSV, Excel
+    sheets); they also go to the field indexes, the typed tables and the key index.
+    """
+    vectors, hits, misses = embedding_cache.encode(embedding_texts, embed_documents)
+    display_texts = [entry["text"] for entry in entries]
+    with index_lock:
+        start_id = metadata.extend(entries)
+        ids = list(range(start_id, start_id + len(entries)))
+        hidden_ids.update(ids)
+        state["new_ids"].extend(ids)
+        if rows is not None:
+            field_index.add_rows(start_id, rows)
+            table_store.append(table, ids, rows)
+            record_row_keys(rows, ids, display_texts, key_columns)
+        lexical_index.add_many(start_id, display_texts)
+        ensure_writable_index()
+        index.add_with_ids(vectors, np.array(ids, dtype=np.int64))
+    state["rows_indexed"] += len(entries)
+    state["cache_hits"] += hits
+    state["cache_misses"] += misses
+
+def index_rows(state: dict, chunk: pd.DataFrame, filename: str, table: str, key_columns: List[str],
+               key_column: Optional[str] = None, extra: Optional[dict] = None):
+    """Indexes a frame of table rows (a CSV chunk or an Excel sheet) in embedding batches."""
+    embedding_texts, display_texts = build_row_texts(chunk)
+    if key_column:
+        keep, counts, stale = plan_upsert(chunk, display_texts, key_column)
+        for name, count in counts.items():
+            state["upsert"][name] += count
+        state["stale_ids"].extend(stale)
+        chunk = chunk[keep]
+        embedding_texts = [text for text, kept in zip(embedding_texts, keep) if kept]
+        display_texts = [text for text, kept in zip(display_texts, keep) if kept]
+    row_numbers = chunk.index.tolist()
+    for start, texts in batched(embedding_texts, ingest_batch_size()):
+        entries = [
+            {"source": filename, **(extra or {}), "row": int(row), "text": text}
+            for row, text in zip(row_numbers[start:start + len(texts)], display_texts[start:start + len(texts)])
+        ]
+        index_batch(state, entries, texts, chunk.iloc[start:start + len(texts)], table, key_columns)
+
+def chunk_done(job_id: str, state: dict, progress: float, **fields):
+    global index
+    with index_lock:
+        index = vector_index.maybe_rebuild_index(index)
+    ingest_jobs.update(job_id, progress=round(progress, 3), rows_indexed=state["rows_indexed"],
+                       cache_hits=state["cache_hits"], cache_misses=state["cache_misses"], **fields)
+
+def run_ingest(path: str, filename: str, work: Callable[[dict], None], replace: bool = False,
+               atomic: bool = False) -> dict:
+    """Runs an upload's `work` under the writer lock and publishes its rows as one snapshot.
+
+    The new rows stay hidden from /chat/ until the whole file is indexed. With
+    replace=True the source's previous rows are dropped in that same snapshot,
+    as are the rows `work` lists in state["stale_ids"]. An `atomic` upload that
+    fails is rolled back; a plain one keeps and publishes what it indexed.
+    """
+    state = {"rows_indexed": 0, "cache_hits": 0, "cache_misses": 0, "new_ids": [], "stale_ids": [],
+             "upsert": {"inserted": 0, "updated": 0, "unchanged": 0, "duplicate_keys": 0}}
+    atomic = atomic or replace
+    completed = False
+    with snapshots.writer_lock():
+        refresh_snapshot()
+        try:
+            work(state)
+            if replace:
+                with index_lock:
+                    new_id_set = set(state["new_ids"])
+                    delete_documents([i for i in metadata.ids_for_source(filename) if i not in new_id_set])
+            if state["stale_ids"]:
+                with index_lock:
+                    delete_documents(state["stale_ids"])
+            completed = True
+        except Exception:
+            if atomic:
+                # Leave the store exactly as it was before the upload started.
+                with index_lock:
+                    delete_documents(state["new_ids"])
+                    hidden_ids.difference_update(state["new_ids"])
+            raise
+        finally:
+            # Whatever made it into the index is published, so index and metadata stay in step on disk.
+            if state["rows_indexed"] and (completed or not atomic):
+                save_index(unhide=state["new_ids"])
+            elif atomic and state["new_ids"]:
+                save_index()
+            else:
+                # Nothing to publish, but a key backfill may still be pending.
+                metadata.commit()
+            if os.path.exists(path):
+                os.remove(path)
+    return state
+
+def ingest_result(state: dict, key_column: Optional[str] = None, **fields) -> dict:
+    counts = {"rows_indexed": state["rows_indexed"], **fields,
+              "cache_hits": state["cache_hits"], "cache_misses": state["cache_misses"]}
+    if key_column:
+        upsert = state["upsert"]
+        return {"message": (f"Upserted on '{key_column}': {upsert['inserted']} inserted, "
+                            f"{upsert['updated']} updated, {upsert['unchanged']} unchanged."), **counts, **upsert}
+    if not state["rows_indexed"]:
+        return {"message": "The file has no rows to index."}
+    return {"message": f"Successfully indexed {state['rows_indexed']} rows.", **counts}
+
+def ingest_csv(job_id: str, path: str, filename: str, replace: bool = False, key_column: Optional[str] = None) -> dict:
+    """Indexes an uploaded CSV chunk by chunk. Runs on the ingestion worker thread.
+
+    With a `key_column`, rows whose key is already stored replace the stored
+    rows (in the same snapshot), and rows identical to the stored ones are skipped.
+    """
+    def work(state: dict):
+        if key_column:
+            row_keys.ensure_column(key_column)
+        key_columns = row_keys.columns()
+        for chunk, progress in iter_csv_chunks(path):
+            index_rows(state, chunk, filename, filename, key_columns, key_column)
+            chunk_done(job_id, state, progress)
+
+    state = run_ingest(path, filename, work, replace=replace, atomic=key_column is not None)
+    return ingest_result(state, key_column)
+
+def ingest_xlsx(job_id: str, path: str, filename: str, replace: bool = False) -> dict:
+    """Indexes every sheet of an Excel workbook like a CSV, keeping the sheet name on each row."""
+    sheets = []
+
+    def work(state: dict):
+        key_columns = row_keys.columns()
+        for sheet, frame, sheets_done, total_sheets in extraction_pool.iter_sheets(path):
+            index_rows(state, frame, filename, table_name(filename, sheet), key_columns, extra={"sheet": sheet})
+            sheets.append(sheet)
+            chunk_done(job_id, state, sheets_done / total_sheets)
+
+    state = run_ingest(path, filename, work, replace=replace)
+    return ingest_result(state, sheets=len(sheets))
+
+def ingest_pdf(job_id: str, path: str, filename: str, replace: bool = False) -> dict:
+    """Indexes a PDF as overlapping text chunks, each stored with its page number."""
+    started = time.perf_counter()
+    # Pages extracted so far, updated by work().
+    pages = {"done": 0}
+
+    def work(state: dict):
+        pending = []
+        for chunks, pages_done, total_pages in extraction_pool.iter_pdf_chunks(path):
+            pending.extend({"source": filename, "page": page, "chunk": chunk, "text": text}
+                           for page, chunk, text in chunks)
+            while len(pending) >= ingest_batch_size():
+                batch, pending = pending[:ingest_batch_size()], pending[ingest_batch_size():]
+                index_batch(state, batch, [entry["text"] for entry in batch])
+            if pages_done == total_pages and pending:
+                index_batch(state, pending, [entry["text"] for entry in pending])
+                pending = []
+            pages["done"] = pages_done
+            chunk_done(job_id, state, pages_done / total_pages, pages_indexed=pages_done)
+
+    state = run_ingest(path, filename, work, replace=replace)
+    seconds = time.perf_counter() - started
+    pages_per_second = round(pages["done"] / seconds, 2) if seconds > 0 else 0.0
+    print(f"📊 {filename}: {pages['done']} pages, {state['rows_indexed']} chunks in {seconds:.1f}s "
+          f"({pages_per_second} pages/s).")
+    return ingest_result(state, pages=pages["done"], chunks=state["rows_indexed"], seconds=round(seconds, 2),
+                         pages_per_second=pages_per_second)
+
+def ingest_file(job_id: str, path: str, filename: str, extension: str, replace: bool = False) -> dict:
+    """Picks the ingestion pipeline by the uploaded file's `extension`; `filename` is the source it is stored under."""
+    if extension == ".pdf":
+        return ingest_pdf(job_id, path, filename, replace)
+    if extension == ".xlsx":
+        return ingest_xlsx(job_id, path, filename, replace)
+    return ingest_csv(job_id, path, filename, replace)
+
+def lookup_field_ids(column: str, value: str) -> List[int]:
+    """Ids of the rows whose `column` equals `value`, in id order. Caller holds index_lock."""
+    if field_index.has_column(column):
+        return [i for i in field_index.lookup(column, value) if i not in hidden_ids]
+    # Column is not indexed (unknown or too many distinct values): fall back to a scan.
+    query = f"{column}: {value}".lower()
+    return [doc_id for doc_id, doc in metadata.iter_with_ids()
+            if doc_id not in hidden_ids and query in doc.get("text", "").lower()]
+
+def lookup_field(column: str, value: str) -> List[dict]:
+    """Returns the rows whose `column` equals `value`, using the field indexes when possible."""
+    with index_lock:
+        return metadata.get_many(lookup_field_ids(column, value))
+
+def filter_students_by_year(year: str, offset: int = 0, limit: Optional[int] = None) -> Tuple[List[dict], int]:
+    """One page of the rows for `year` and the total match count; only the page's rows are read."""
     print(f"🔍 Performing direct filter for year: {year}")
-    year_query = f"year: {year}".lower()
-    results = [doc for doc in metadata if year_query in doc.get("text", "").lower()]
-    return results
+    with index_lock:
+        ids = lookup_field_ids("year", year)
+        page_ids = ids[offset:] if limit is None else ids[offset:offset + limit]
+        return metadata.get_many(page_ids), len(ids)
 
 def find_student_by_usn(usn: str) -> List[dict]:
     print(f"🔍 Performing direct lookup for USN: {usn}")
-    usn_query = usn.lower()
-    results = [doc for doc in metadata if f"usn: {usn_query}" in doc.get("text", "").lower()]
-    return results
+    return lookup_field("usn", usn)
 
 def search_for_question_papers(subject: str) -> str:
-    """Searches for question papers using the simple and reliable Serper API."""
-    url = "https://google.serper.dev/search"
-    payload = json.dumps({"q": f"VTU {subject} question paper filetype:pdf"})
-    headers = {
-        'X-API-KEY': SERPER_API_KEY,
-        'Content-Type': 'application/json'
-    }
-
-    try:
-        proxies = get_environ_proxies(url)
-        if proxies:
-            print(f"🌐 Detected system proxies: {proxies}")
-            
-        response = requests.post(url, headers=headers, data=payload, proxies=proxies, timeout=20)
-        response.raise_for_status()
-        data = response.json()
-
-        if "organic" in data and data["organic"]:
-            links = []
-            for item in data["organic"][:5]: # Get top 5 results
-                title = item.get("title", "No Title")
-                link = item.get("link", "#")
-                links.append(f"* **{title}**: [Link]({link})")
-            return "Here are some links I found:\n" + "\n".join(links)
-        else:
-            return "I couldn't find any direct links for that subject, but you can try searching on the official VTU website."
-
-    except requests.exceptions.RequestException as e:
-        print(f"Error calling Serper API: {e}")
-        return f"API_ERROR: The search request failed. Details: {e}"
+    """Searches for question papers via Serper, with results cached per subject."""
+    return question_papers.search(subject)
 
 def get_llm_response(prompt: str) -> str:
     """Gets a response from the Google Gemini API for RAG questions."""
@@ -165,6 +677,28 @@ def get_llm_response(prompt: str) -> str:
         print(f"Error calling Gemini API: {e}")
         return f"API_ERROR: The request to Gemini API failed. Details: {e}"
 
+async def get_llm_response_async(prompt: str) -> str:
+    """Async version of get_llm_response, so many prompts can be in flight at once."""
+    try:
+        model = genai.GenerativeModel('models/gemini-2.5-flash')
+        response = await model.generate_content_async(prompt)
+        return response.text
+    except Exception as e:
+        print(f"Error calling Gemini API: {e}")
+        return f"API_ERROR: The request to Gemini API failed. Details: {e}"
+
+async def stream_llm_response(prompt: str):
+    """Yields Gemini's answer text as it is generated, without blocking a worker thread."""
+    try:
+        model = genai.GenerativeModel('models/gemini-2.5-flash')
+        response = await model.generate_content_async(prompt, stream=True)
+        async for chunk in response:
+            if chunk.text:
+                yield chunk.text
+    except Exception as e:
+        print(f"Error calling Gemini API: {e}")
+        yield f"API_ERROR: The request to Gemini API failed. Details: {e}"
+
 # --- 5. FASTAPI LIFECYCLE & ENDPOINTS ---
 
 @app.on_event("startup")
@@ -173,59 +707,248 @@ async def startup_event():
     genai.configure(api_key=GEMINI_API_KEY)
     load_models_and_index()
 
+@app.middleware("http")
+async def reload_published_snapshot(request, call_next):
+    # One stat() per request; the index is only reloaded after another worker has published.
+    # A request that finds a reload already running skips it; the next request checks again.
+    if snapshots.changed():
+        await run_in_threadpool(refresh_snapshot, False)
+    return await call_next(request)
+
+@app.on_event("shutdown")
+def shutdown_event():
+    if embedding_pool is not None:
+        embedding_pool.shutdown()
+    if query_batcher is not None:
+        query_batcher.shutdown()
+    extraction_pool.shutdown()
+
 @app.get("/")
 def get_status():
     return {
         "status": "online",
         "message": "Welcome to the Yenepoya Chatbot API!",
-        "indexed_documents": len(metadata)
+        "indexed_documents": len(metadata),
+        "index": vector_index.describe_index(index) if index is not None else None,
+        "index_memory_mapped": index_mapped
     }
 
-@app.post("/upload-csv/")
-async def upload_and_index_csv(file: UploadFile = File(...)):
-    global index, metadata
-    if not file.filename.endswith(".csv"):
-        raise HTTPException(status_code=400, detail="Please upload a .csv file.")
-    temp_path = os.path.join(STORE_DIR, f"temp_{file.filename}")
+async def stage_upload(file: UploadFile, extensions: Tuple[str, ...] = (".csv",)) -> str:
+    """Streams an uploaded file to a temp file in STORE_DIR for the ingestion worker."""
+    if not file.filename.lower().endswith(extensions):
+        raise HTTPException(status_code=400, detail=f"Please upload a {' or '.join(extensions)} file.")
+    temp_path = os.path.join(STORE_DIR, f"temp_{uuid.uuid4().hex}_{os.path.basename(file.filename)}")
     with open(temp_path, "wb") as buffer:
-        shutil.copyfileobj(file.file, buffer)
-    try:
-        df = pd.read_csv(temp_path, dtype=str).fillna("")
-        documents_for_embedding, new_metadata_entries = [], []
-        for idx, row in df.iterrows():
-            embedding_text = " ".join(str(val) for val in row.values if val)
-            display_text = " | ".join(f"{col}: {val}" for col, val in row.items())
-            documents_for_embedding.append(embedding_text)
-            new_metadata_entries.append({"source": file.filename, "row": idx, "text": display_text})
-        if not documents_for_embedding:
-            return {"message": "CSV file is empty."}
-        new_embeddings = embed_model.encode(documents_for_embedding, convert_to_numpy=True, show_progress_bar=True)
-        new_embeddings = normalize_vectors(new_embeddings)
-        index.add(new_embeddings.astype(np.float32))
-        metadata.extend(new_metadata_entries)
-        save_index()
-        return {"message": f"Successfully indexed {len(documents_for_embedding)} rows."}
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Failed to process file: {str(e)}")
-    finally:
-        if os.path.exists(temp_path):
+        while chunk := await file.read(UPLOAD_COPY_CHUNK):
+            buffer.write(chunk)
+    return temp_path
+
+def job_response(job: dict) -> dict:
+    return {
+        "message": "File received. Indexing has started in the background.",
+        "job_id": job["job_id"],
+        "status": job["status"],
+        "status_url": f"/upload-status/{job['job_id']}"
+    }
+
+@app.post("/upload-csv/")
+async def upload_and_index_csv(file: UploadFile = File(...), key_column: Optional[str] = Form(None)):
+    """Indexes a CSV; with `key_column` (e.g. USN), rows whose key is already stored are updated instead of duplicated."""
+    temp_path = await stage_upload(file)
+    filename = os.path.basename(file.filename)
+    if key_column:
+        try:
+            header = pd.read_csv(temp_path, nrows=0, dtype=str).columns
+        except (pd.errors.EmptyDataError, pd.errors.ParserError, UnicodeDecodeError) as e:
             os.remove(temp_path)
+            raise HTTPException(status_code=400, detail=f"Could not read the CSV header: {e}")
+        matches = [col for col in header if normalize_value(col) == normalize_value(key_column)]
+        if not matches:
+            os.remove(temp_path)
+            raise HTTPException(status_code=400, detail=f"Key column '{key_column}' is not in the CSV header.")
+        key_column = matches[0]
+    job = ingest_jobs.submit(filename, lambda job_id: ingest_csv(job_id, temp_path, filename, key_column=key_column))
+    return job_response(job)
 
-@app.post("/chat/", response_model=ChatResponse)
-def chat_with_csv(request: ChatRequest):
-    question = request.question.strip()
-    session_id = request.session_id or str(uuid.uuid4())
-    final_answer = ""
-    source_docs = []
-    retrieved_docs = []
+@app.post("/upload-document/")
+async def upload_and_index_document(file: UploadFile = File(...)):
+    """Indexes a PDF (page-aware overlapping chunks) or an Excel workbook (one row per document, every sheet)."""
+    temp_path = await stage_upload(file, DOCUMENT_EXTENSIONS)
+    filename = os.path.basename(file.filename)
+    extension = os.path.splitext(filename)[1].lower()
+    job = ingest_jobs.submit(filename, lambda job_id: ingest_file(job_id, temp_path, filename, extension))
+    return job_response(job)
+
+@app.get("/sources/")
+def list_sources():
+    return {"sources": [{"source": source, "documents": count} for source, count in metadata.sources().items()]}
 
+@app.delete("/sources/{source}")
+def delete_source(source: str):
+    with snapshots.writer_lock():
+        refresh_snapshot()
+        with index_lock:
+            ids = metadata.ids_for_source(source)
+            if not ids:
+                raise HTTPException(status_code=404, detail=f"No documents from '{source}'.")
+            delete_documents(ids)
+        save_index()
+    print(f"🗑️ Removed {len(ids)} documents from '{source}'.")
+    return {"message": f"Removed {len(ids)} documents from '{source}'."}
+
+@app.put("/sources/{source}")
+async def replace_source(source: str, file: UploadFile = File(...)):
+    """Re-indexes `source` from a new file; the old rows are swapped out only once the new ones are ready."""
+    temp_path = await stage_upload(file, (".csv",) + DOCUMENT_EXTENSIONS)
+    # The new file may be of another type than the one it replaces (a.csv re-uploaded as a.xlsx).
+    extension = os.path.splitext(file.filename)[1].lower()
+    job = ingest_jobs.submit(source, lambda job_id: ingest_file(job_id, temp_path, source, extension, replace=True))
+    return job_response(job)
+
+@app.get("/upload-status/{job_id}")
+def get_upload_status(job_id: str):
+    job = ingest_jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Unknown upload job.")
+    return job
+
+GREETINGS = ["hi", "hello", "hey", "hello there", "greetings"]
+
+def classify_question(question: str) -> Tuple[str, Any]:
+    """Picks the chat router's tool for a question: (tool name, tool argument)."""
     usn_match = USN_PATTERN.search(question)
     filter_match = FILTER_PATTERN.search(question)
-    
+    if question.lower() in GREETINGS:
+        return "greeting", None
+    if "question paper" in question.lower() or "exam paper" in question.lower():
+        subject = question.lower().replace("question paper of", "").replace("exam paper of", "").replace("question paper", "").replace("exam paper", "").replace("i need", "").strip()
+        return "question_paper", subject
+    if usn_match:
+        return "usn", usn_match.group(0)
+    plan = parse_query(question, table_store.schema()) if table_store is not None else None
+    # A plain "list all <n> year students" stays with the year filter; anything more goes to the tables.
+    if filter_match and (plan is None or (plan["intent"] == "filter" and len(plan["conditions"]) == 1)):
+        return "year_filter", filter_match.group(3) + " year"
+    if plan is not None:
+        return "structured", plan
+    return "vector", None
+
+def encode_queries(questions: List[str]) -> np.ndarray:
+    if query_batcher is None:
+        embeddings = embed_model.encode(questions, convert_to_numpy=True)
+    else:
+        try:
+            embeddings = query_batcher.encode(questions)
+        except QueueFull as e:
+            raise HTTPException(status_code=503, detail=f"The server is busy, please retry. ({e})")
+    return normalize_vectors(embeddings).astype(np.float32)
+
+def search_documents(questions: List[str], query_embeddings: np.ndarray, top_k: int) -> List[List[dict]]:
+    """Hybrid retrieval for one or more questions: FAISS and BM25 rankings fused with RRF."""
+    # Each ranking contributes a deeper candidate list so fusion has something to reorder.
+    candidates = top_k * HYBRID_CANDIDATE_FACTOR if HYBRID_SEARCH else top_k
+    with index_lock:
+        k = min(candidates, index.ntotal)
+        _, I = index.search(query_embeddings, k)
+        # Approximate indexes pad with -1 when they find fewer than top_k hits.
+        id_lists = [[int(i) for i in row if i >= 0 and i not in hidden_ids] for row in I]
+        if HYBRID_SEARCH and lexical_ready.is_set():
+            id_lists = [
+                reciprocal_rank_fusion([
+                    vector_ids,
+                    [i for i in lexical_index.search(question, candidates) if i not in hidden_ids]
+                ], top_k)
+                for question, vector_ids in zip(questions, id_lists)
+            ]
+        by_id = metadata.get_map({i for ids in id_lists for i in ids})
+    return [[by_id[i] for i in ids if i in by_id] for ids in id_lists]
+
+def encode_cursor(version: int, offset: int) -> str:
+    return base64.urlsafe_b64encode(f"{version}:{offset}".encode()).decode()
+
+def decode_cursor(cursor: str, version: int) -> int:
+    """Returns the row offset a list-answer cursor points at."""
+    try:
+        cursor_version, offset = (int(part) for part in base64.urlsafe_b64decode(cursor.encode()).decode().split(":"))
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor.")
+    if cursor_version != version:
+        raise HTTPException(status_code=409, detail="The data has changed since this cursor was issued. Please ask again.")
+    return max(offset, 0)
+
+def fill_list_page(result: dict, page_docs: List[dict], total: int, offset: int, page_size: int, version: int):
+    """Sets a list tool's page of rows, its table and the cursor for the next page on `result`."""
+    result["docs"], result["total"] = page_docs, total
+    if page_docs:
+        result["table"] = (f"{render_table(page_docs)}\n\nShowing rows {offset + 1}-{offset + len(page_docs)} "
+                           f"of {total}.")
+    if offset + page_size < total:
+        result["next_cursor"] = encode_cursor(version, offset + page_size)
+    if offset > 0:
+        # Later pages are just the table; the summary came with the first page.
+        result["answer"], result["table"] = result["table"], ""
+
+def render_template(result: dict, tool: str, argument: Any):
+    """Answers an exact tool's result from its rows or numbers, so the LLM is not called."""
+    if tool == "usn" and result["docs"]:
+        result["answer"] = render_usn(argument, result["docs"])
+    elif tool == "year_filter" and result["table"]:
+        result["answer"] = render_list(year_summary(argument, result["total"]), result["table"])
+    elif tool == "structured" and result["table"]:
+        result["answer"] = render_list(result["structured"], result["table"])
+    elif tool == "structured" and argument["intent"] != "filter":
+        result["answer"] = result["structured"]
+    if result["answer"]:
+        result["table"], result["templated"] = "", True
+
+def route_question(question: str, top_k: int, version: int,
+                   embedding: Optional[np.ndarray] = None, docs: Optional[List[dict]] = None,
+                   offset: int = 0, page_size: int = LIST_PAGE_SIZE, session: Optional[dict] = None,
+                   answer_style: str = "auto", route: Optional[Tuple[str, Any]] = None) -> dict:
+    """Runs the chat router's tool selection and retrieval for one question.
+
+    Returns a dict with a direct "answer" (greeting, search tool, cache hit),
+    the retrieved "docs" to answer from, the question "embedding" when vector
+    search ran, and "cached" set when the whole answer came from the cache.
+    List tools return one page of rows starting at `offset`, a "table" of that
+    page to show under the LLM's summary, the "total" match count and a
+    "next_cursor" for the next page. The structured-query tool also sets
+    "structured" to a sentence stating its exact count or aggregate.
+    Batch callers pass the `route` from classify_question() and the
+    vector-search `embedding` and `docs` they already have.
+    A follow-up in a known `session` reuses that session's last rows and
+    condensed "history" instead of searching again, or searches again with
+    that history when the rows don't cover it; it is not cached, since the
+    answer depends on the session.
+    Exact tools' results are rendered from a template ("templated" is set)
+    unless `answer_style` is "prose" or the question is open-ended.
+    """
+    tool, argument = route if route is not None else classify_question(question)
+    page_size = min(max(page_size, 1), MAX_LIST_PAGE_SIZE)
+    page = f"{offset}+{page_size}" if tool in LIST_TOOLS else ""
+    templated = wants_template(tool, argument, question, answer_style)
+    if tool in TEMPLATE_TOOLS and not templated:
+        # LLM-written and template answers to the same question are cached apart.
+        page += "|prose"
+    result = {"answer": "", "docs": [], "embedding": None, "cached": False, "table": "", "total": 0,
+              "next_cursor": None, "structured": "", "history": [], "follow_up": False, "templated": False,
+              "tool": tool, "cache_key": question_key(question, top_k, page)}
+    if tool == "vector" and session is not None and session["history"] and is_follow_up(question):
+        if session["docs"] and session["version"] == version and rows_cover(session["docs"], question):
+            print("💬 Answering a follow-up from the session's previous rows...")
+            return {**result, "docs": session["docs"], "history": session["history"], "follow_up": True,
+                    "cache_key": None}
+        # The previous rows don't answer it: search again, keeping the conversation to resolve "his", "it", ...
+        result["history"], result["cache_key"] = session["history"], None
+    cached = answer_cache.get_exact(version, result["cache_key"]) if result["cache_key"] is not None else None
+    if cached is not None:
+        return {**result, "answer": cached["answer"], "docs": cached["source_documents"],
+                "next_cursor": cached.get("next_cursor"), "cached": True}
+
     # --- NEW: GREETING MESSAGE LOGIC ---
     # Check if the user's question is a simple greeting
-    if question.lower() in ["hi", "hello", "hey", "hello there", "greetings"]:
-        final_answer = (
+    if tool == "greeting":
+        result["answer"] = (
             "Welcome to the Yenepoya Chatbot!👋\n\n"
             "I'm here to help you with information about students, faculty, and more. Here are a few things you can ask me:\n\n"
             "🔹 Find a specific student:'What are the details for USN 4DM21AI001?'\n"
@@ -234,46 +957,90 @@ def chat_with_csv(request: ChatRequest):
             "How can I assist you today?"
         )
     
-    elif "question paper" in question.lower() or "exam paper" in question.lower():
+    elif tool == "question_paper":
         print("🌐 Activating Google Search Tool via Serper...")
-        subject = question.lower().replace("question paper of", "").replace("exam paper of", "").replace("question paper", "").replace("exam paper", "").replace("i need", "").strip()
-        if not subject:
-            final_answer = "Please tell me which subject's question paper you are looking for."
+        if not argument:
+            result["answer"] = "Please tell me which subject's question paper you are looking for."
         else:
-            final_answer = search_for_question_papers(subject)
+            result["answer"] = search_for_question_papers(argument)
 
-    elif usn_match:
+    elif tool == "usn":
         print("🆔 Activating USN Lookup Tool...")
-        retrieved_docs = find_student_by_usn(usn_match.group(0))
+        result["docs"] = find_student_by_usn(argument)
 
-    elif filter_match:
+    elif tool == "year_filter":
         print("📋 Activating Data Filter Tool...")
-        year = filter_match.group(3) + " year"
-        retrieved_docs = filter_students_by_year(year)
+        page_docs, total = filter_students_by_year(argument, offset, page_size)
+        fill_list_page(result, page_docs, total, offset, page_size, version)
+
+    elif tool == "structured":
+        print("📊 Activating Structured Query Tool...")
+        with index_lock:
+            outcome = run_query(argument, table_store.tables(), hidden_ids)
+            page_ids = outcome["ids"][offset:offset + page_size] if argument["intent"] == "filter" else []
+            page_docs = metadata.get_many(page_ids)
+        result["structured"] = outcome["summary"]
+        if argument["intent"] == "filter":
+            fill_list_page(result, page_docs, outcome["total"], offset, page_size, version)
+        if not outcome["total"]:
+            result["answer"] = f"No records match: {outcome['summary']}"
 
     else:
         print("🧠 Defaulting to Vector Search Tool...")
         if index is None or index.ntotal == 0:
-             final_answer = "I'm sorry, but no data has been uploaded yet. Please upload a CSV file with student or faculty information first."
+             result["answer"] = "I'm sorry, but no data has been uploaded yet. Please upload a CSV file with student or faculty information first."
         else:
-            question_embedding = embed_model.encode([request.question], convert_to_numpy=True)
-            question_embedding = normalize_vectors(question_embedding).astype(np.float32)
-            top_k = min(request.top_k, index.ntotal)
-            _, I = index.search(question_embedding, top_k)
-            retrieved_docs = [metadata[i] for i in I[0]]
+            if embedding is None:
+                embedding = encode_queries([question])
+            result["embedding"] = embedding
+            cached = answer_cache.get_similar(version, embedding, top_k) if result["cache_key"] is not None else None
+            if cached is not None:
+                return {**result, "answer": cached["answer"], "docs": cached["source_documents"], "cached": True}
+            result["docs"] = docs if docs is not None else search_documents([question], embedding, top_k)[0]
 
-    source_docs = retrieved_docs
+    if templated and not result["answer"]:
+        render_template(result, tool, argument)
 
-    if not final_answer:
-        if not retrieved_docs:
-            final_answer = "I could not find any relevant information to answer your question. Please try asking in a different way."
-        else:
-            context_str = "\n".join([doc['text'] for doc in retrieved_docs])
-            prompt_with_context = f"""
+    if result["embedding"] is None:
+        answer_cache.record_miss()
+    if not result["answer"] and not result["docs"] and not result["structured"]:
+        result["answer"] = "I could not find any relevant information to answer your question. Please try asking in a different way."
+    return result
+
+def route_questions(questions: List[str], top_k: int, version: int, answer_style: str = "auto") -> List[dict]:
+    """Routes a batch of questions, embedding and searching all vector-search questions at once."""
+    routes = [classify_question(question) for question in questions]
+    vector_positions = [i for i, (tool, _) in enumerate(routes) if tool == "vector"]
+    embeddings, doc_lists = {}, {}
+    if vector_positions and index is not None and index.ntotal > 0:
+        vector_questions = [questions[i] for i in vector_positions]
+        batch_embeddings = encode_queries(vector_questions)
+        batch_docs = search_documents(vector_questions, batch_embeddings, top_k)
+        for i, embedding, docs in zip(vector_positions, batch_embeddings, batch_docs):
+            embeddings[i], doc_lists[i] = embedding.reshape(1, -1), docs
+    return [route_question(question, top_k, version, embeddings.get(i), doc_lists.get(i), answer_style=answer_style,
+                           route=routes[i])
+            for i, question in enumerate(questions)]
+
+def build_rag_prompt(question: str, docs: List[dict], history: Optional[List[dict]] = None) -> str:
+    rows, omitted = pack_context(docs, CONTEXT_TOKEN_BUDGET)
+    context_str = "\n".join(rows)
+    if omitted:
+        context_str += f"\n({omitted} less relevant rows were left out.)"
+    history_str = ""
+    if history:
+        turns = "\n".join(f"User: {turn['question']}\nAssistant: {turn['answer']}" for turn in history)
+        history_str = f"""
+            CONVERSATION SO FAR (use it to resolve words like "his", "her" or "that student"):
+            ---
+            {turns}
+            ---
+"""
+    return f"""
             You are a helpful assistant for Yenepoya Institute of Technology.
             Answer the user's question based only on the CONTEXT provided below.
             If the context contains a list of items (like students), list them all clearly without omitting any.
-
+{history_str}
             CONTEXT:
             ---
             {context_str}
@@ -282,18 +1049,195 @@ def chat_with_csv(request: ChatRequest):
             ---
             Answer:
             """
-            final_answer = get_llm_response(prompt_with_context)
 
-    if final_answer.startswith("API_ERROR:"):
-        final_answer = f"There was a problem connecting to the AI model. Please check the API key and network connection.\n\nDetails: {final_answer}"
+def build_list_summary_prompt(question: str, routed: dict) -> str:
+    """Asks for a short summary of a list answer; the rows themselves are shown as a table."""
+    rows, _ = pack_context(routed["docs"], CONTEXT_TOKEN_BUDGET)
+    context_str = "\n".join(rows)
+    return f"""
+            You are a helpful assistant for Yenepoya Institute of Technology.
+            The user's question matched a list of records. A table of them is shown to the user under your reply.
+            {routed["total"]} records match; the table shows the first {len(routed["docs"])}.
+            {routed["structured"]}
+            Write one or two sentences summarizing the result. Do NOT list or repeat the individual records.
+
+            SAMPLE OF THE RECORDS:
+            ---
+            {context_str}
+            ---
+            USER'S QUESTION: {question}
+            ---
+            Summary:
+            """
+
+def build_structured_prompt(question: str, routed: dict) -> str:
+    """Asks the LLM to phrase an exact count or aggregate computed from the typed tables."""
+    return f"""
+            You are a helpful assistant for Yenepoya Institute of Technology.
+            The answer to the user's question was computed exactly from the uploaded tables:
+            ---
+            {routed["structured"]}
+            ---
+            State this result in one or two sentences. Use the numbers exactly as given; do NOT recompute or estimate them.
+            USER'S QUESTION: {question}
+            ---
+            Answer:
+            """
+
+def build_prompt(question: str, routed: dict) -> str:
+    if routed["table"]:
+        return build_list_summary_prompt(question, routed)
+    if routed["structured"]:
+        return build_structured_prompt(question, routed)
+    return build_rag_prompt(question, routed["docs"], routed["history"])
+
+def finish_answer(top_k: int, version: int, routed: dict, answer: str) -> str:
+    """Adds a list answer's table, turns API errors into a user-facing message and caches every other fresh answer."""
+    if routed["templated"]:
+        answer_stats.record("template", routed["tool"])
+    elif routed["cached"]:
+        answer_stats.record("cache")
+    else:
+        answer_stats.record("direct" if routed["answer"] else "llm")
+    if answer.startswith("API_ERROR:"):
+        if routed["table"]:
+            # The rows don't depend on the LLM; only the summary is lost.
+            return routed["table"]
+        if routed["structured"]:
+            return routed["structured"]
+        return f"There was a problem connecting to the AI model. Please check the API key and network connection.\n\nDetails: {answer}"
+    if routed["table"]:
+        answer = f"{answer.strip()}\n\n{routed['table']}"
+    if not routed["cached"] and routed["cache_key"] is not None:
+        answer_cache.put(version, routed["cache_key"],
+                         {"answer": answer.strip(), "source_documents": routed["docs"], "next_cursor": routed["next_cursor"]},
+                         top_k, routed["embedding"])
+    return answer
+
+def chat_session_id(request) -> Optional[str]:
+    """The session a chat request belongs to; clients that send no id and don't ask for one get none."""
+    if request.session_id:
+        return request.session_id
+    return str(uuid.uuid4()) if request.new_session else None
+
+@app.post("/chat/", response_model=ChatResponse)
+def chat_with_csv(request: ChatRequest):
+    question = request.question.strip()
+    session_id = chat_session_id(request)
+    version = data_version
+    offset = decode_cursor(request.cursor, version) if request.cursor else 0
+    session = sessions.get(request.session_id) if request.session_id else None
+
+    routed = route_question(question, request.top_k, version, offset=offset, page_size=request.page_size,
+                            session=session, answer_style=request.answer_style)
+    final_answer = routed["answer"] or get_llm_response(build_prompt(question, routed))
+    final_answer = finish_answer(request.top_k, version, routed, final_answer)
+    if session_id:
+        sessions.record(session_id, question, final_answer, routed["docs"], version, routed["follow_up"])
+
+    return ChatResponse(session_id=session_id, answer=final_answer.strip(), source_documents=routed["docs"],
+                        next_cursor=routed["next_cursor"])
 
-    return ChatResponse(session_id=session_id, answer=final_answer.strip(), source_documents=source_docs)
+@app.post("/chat/batch", response_model=ChatBatchResponse)
+async def chat_with_csv_batch(request: ChatBatchRequest):
+    """Answers many questions in one call; results come back in the order asked."""
+    if len(request.questions) > MAX_BATCH_QUESTIONS:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_BATCH_QUESTIONS} questions per batch.")
+    questions = [question.strip() for question in request.questions]
+    session_id = chat_session_id(request)
+    version = data_version
+    routed = await run_in_threadpool(route_questions, questions, request.top_k, version, request.answer_style)
+
+    llm_slots = asyncio.Semaphore(LLM_CONCURRENCY)
+
+    async def answer(question: str, routed_question: dict) -> ChatResponse:
+        final_answer = routed_question["answer"]
+        if not final_answer:
+            async with llm_slots:
+                final_answer = await get_llm_response_async(build_prompt(question, routed_question))
+        final_answer = finish_answer(request.top_k, version, routed_question, final_answer)
+        return ChatResponse(session_id=session_id, answer=final_answer.strip(), source_documents=routed_question["docs"],
+                            next_cursor=routed_question["next_cursor"])
+
+    results = await asyncio.gather(*(answer(q, r) for q, r in zip(questions, routed)))
+    # Batch questions are answered independently, but they still count as turns for later follow-ups.
+    if session_id:
+        for question, routed_question, result in zip(questions, routed, results):
+            sessions.record(session_id, question, result.answer, routed_question["docs"], version)
+    return ChatBatchResponse(results=list(results))
+
+def sse_event(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+@app.post("/chat/stream")
+async def chat_with_csv_stream(request: ChatRequest):
+    """Server-sent-event version of /chat/: a "sources" event, "token" events as Gemini writes, then "done"."""
+    question = request.question.strip()
+    session_id = chat_session_id(request)
+    version = data_version
+    offset = decode_cursor(request.cursor, version) if request.cursor else 0
+    session = sessions.get(request.session_id) if request.session_id else None
+    # Retrieval is blocking (embedding, FAISS, SQLite), so it runs on the threadpool.
+    routed = await run_in_threadpool(route_question, question, request.top_k, version,
+                                     offset=offset, page_size=request.page_size, session=session,
+                                     answer_style=request.answer_style)
+
+    async def events():
+        yield sse_event("sources", {"session_id": session_id, "source_documents": routed["docs"]})
+        if routed["answer"]:
+            answer = routed["answer"]
+            yield sse_event("token", {"text": answer})
+        else:
+            parts, answer = [], ""
+            async for text in stream_llm_response(build_prompt(question, routed)):
+                if text.startswith("API_ERROR:"):
+                    answer = text
+                    break
+                parts.append(text)
+                yield sse_event("token", {"text": text})
+            answer = answer or "".join(parts)
+            if routed["table"]:
+                yield sse_event("token", {"text": ("\n\n" if parts else "") + routed["table"]})
+        answer = finish_answer(request.top_k, version, routed, answer)
+        if session_id:
+            sessions.record(session_id, question, answer, routed["docs"], version, routed["follow_up"])
+        yield sse_event("done", {"session_id": session_id, "answer": answer.strip(), "next_cursor": routed["next_cursor"]})
+
+    return StreamingResponse(events(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+@app.get("/embedding-stats/")
+def get_embedding_stats():
+    """Queue depth, batch sizes and added wait of the question-embedding batcher."""
+    if query_batcher is None:
+        return {"query_batching": False}
+    return {"query_batching": True, **query_batcher.stats()}
+
+@app.get("/answer-stats/")
+def get_answer_stats():
+    """How answers were produced (LLM, template, cache, direct) and the share that bypassed the LLM."""
+    return answer_stats.stats()
+
+@app.get("/cache-stats/")
+def get_cache_stats():
+    return {**answer_cache.stats(), "question_papers": question_papers.stats(), "sessions": sessions.stats(),
+            "embeddings": embedding_cache.stats()}
 
 @app.post("/clear-index/")
 def clear_index():
-    global index, metadata
-    index = faiss.IndexFlatIP(EMBEDDING_DIM)
-    metadata = []
-    save_index()
+    global index, index_mapped, lexical_index
+    with snapshots.writer_lock():
+        refresh_snapshot()
+        with index_lock:
+            index_mapped = False
+            index = vector_index.create_index(EMBEDDING_DIM, vector_index.target_kind(0), codec=vector_index.target_codec(0))
+            metadata.clear()
+            field_index.clear()
+            row_keys.clear()
+            table_store.clear()
+            lexical_index = LexicalIndex()
+            lexical_ready.set()
+        save_index()
+        embedding_cache.clear()
     print("🗑️ Index has been cleared.")
     return {"message": "Index cleared successfully."}
\ No newline at end of file
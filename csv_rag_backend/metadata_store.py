@@ -0,0 +1,180 @@
+"""Row metadata for the vector index, stored in SQLite and keyed by vector id.
+
+Replaces the old metadata.json, which was rewritten in full after every
+upload and loaded entirely into RAM at startup. Rows are appended in place,
+fetched by id on demand, and nothing is read at startup beyond the row count.
+Ids are never reused, even after rows are deleted, so a stale id can only
+ever miss rather than point at somebody else's row. Deleted ids are logged
+with the snapshot version that removed them, so other workers can catch up
+on a newer snapshot incrementally (new rows are simply the ids past their
+old next_id).
+"""
+import json
+import os
+import sqlite3
+import threading
+from typing import Dict, Iterator, List, Optional
+
+# SQLite limits the number of "?" parameters in a single statement.
+LOOKUP_CHUNK = 500
+IMPORT_BATCH_SIZE = 10000
+
+
+class MetadataStore:
+    def __init__(self, path: str):
+        self.path = path
+        self.lock = threading.RLock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS documents (id INTEGER PRIMARY KEY, source TEXT NOT NULL, data TEXT NOT NULL)"
+        )
+        self.conn.execute("CREATE INDEX IF NOT EXISTS documents_source ON documents (source)")
+        self.conn.execute("CREATE TABLE IF NOT EXISTS store_state (key TEXT PRIMARY KEY, value INTEGER)")
+        # version is NULL until the deletion is published in a snapshot.
+        self.conn.execute("CREATE TABLE IF NOT EXISTS deleted_ids (doc_id INTEGER, version INTEGER)")
+        self.conn.execute("CREATE INDEX IF NOT EXISTS deleted_ids_version ON deleted_ids (version)")
+        self.conn.commit()
+        self._cleared = False
+        self.refresh()
+
+    def refresh(self):
+        """Re-reads the row count and next id, which another worker may have changed."""
+        with self.lock:
+            max_id = self.conn.execute("SELECT MAX(id) FROM documents").fetchone()[0]
+            self._next_id = 0 if max_id is None else max_id + 1
+            saved = self._state("next_id")
+            if saved is not None:
+                self._next_id = max(self._next_id, saved)
+            self._count = self.conn.execute("SELECT COUNT(*) FROM documents").fetchone()[0]
+
+    def _state(self, key: str) -> Optional[int]:
+        row = self.conn.execute("SELECT value FROM store_state WHERE key = ?", (key,)).fetchone()
+        return None if row is None else row[0]
+
+    def __len__(self) -> int:
+        return self._count
+
+    @property
+    def next_id(self) -> int:
+        return self._next_id
+
+    def __getitem__(self, doc_id) -> dict:
+        doc_id = int(doc_id)
+        with self.lock:
+            row = self.conn.execute("SELECT data FROM documents WHERE id = ?", (doc_id,)).fetchone()
+        if row is None:
+            raise IndexError(f"No metadata for vector id {doc_id}")
+        return json.loads(row[0])
+
+    def get_many(self, ids) -> List[dict]:
+        """Fetches several rows at once, returned in the order of `ids`."""
+        ids = [int(i) for i in ids]
+        found = self.get_map(ids)
+        return [found[i] for i in ids if i in found]
+
+    def get_map(self, ids) -> Dict[int, dict]:
+        """Fetches several rows at once as an id -> row dict; unknown ids are left out."""
+        ids = [int(i) for i in ids]
+        found = {}
+        with self.lock:
+            for start in range(0, len(ids), LOOKUP_CHUNK):
+                chunk = ids[start:start + LOOKUP_CHUNK]
+                placeholders = ",".join("?" * len(chunk))
+                rows = self.conn.execute(f"SELECT id, data FROM documents WHERE id IN ({placeholders})", chunk)
+                found.update((doc_id, json.loads(data)) for doc_id, data in rows)
+        return found
+
+    def __iter__(self) -> Iterator[dict]:
+        for _, doc in self.iter_with_ids():
+            yield doc
+
+    def iter_with_ids(self, batch_size: int = IMPORT_BATCH_SIZE, after_id: int = -1):
+        """Streams (id, row) pairs in id order without holding the whole table in memory."""
+        last_id = after_id
+        while True:
+            with self.lock:
+                rows = self.conn.execute(
+                    "SELECT id, data FROM documents WHERE id > ? ORDER BY id LIMIT ?", (last_id, batch_size)
+                ).fetchall()
+            if not rows:
+                return
+            for doc_id, data in rows:
+                yield doc_id, json.loads(data)
+            last_id = rows[-1][0]
+
+    def extend(self, entries: List[dict]) -> int:
+        """Appends rows with the next free ids and returns the first id used.
+
+        Changes become durable on the next commit().
+        """
+        with self.lock:
+            start_id = self._next_id
+            self.conn.executemany(
+                "INSERT INTO documents (id, source, data) VALUES (?, ?, ?)",
+                [(start_id + i, entry.get("source", ""), json.dumps(entry)) for i, entry in enumerate(entries)],
+            )
+            self._next_id += len(entries)
+            self._count += len(entries)
+            self.conn.execute("INSERT OR REPLACE INTO store_state (key, value) VALUES ('next_id', ?)", (self._next_id,))
+        return start_id
+
+    def sources(self) -> Dict[str, int]:
+        """Row count per source file."""
+        with self.lock:
+            return dict(self.conn.execute("SELECT source, COUNT(*) FROM documents GROUP BY source ORDER BY source"))
+
+    def ids_for_source(self, source: str) -> List[int]:
+        with self.lock:
+            return [doc_id for (doc_id,) in self.conn.execute("SELECT id FROM documents WHERE source = ?", (source,))]
+
+    def delete_ids(self, ids):
+        """Deletes rows by id. Changes become durable on the next commit()."""
+        ids = [int(i) for i in ids]
+        with self.lock:
+            for start in range(0, len(ids), LOOKUP_CHUNK):
+                chunk = ids[start:start + LOOKUP_CHUNK]
+                placeholders = ",".join("?" * len(chunk))
+                self._count -= self.conn.execute(f"DELETE FROM documents WHERE id IN ({placeholders})", chunk).rowcount
+            self.conn.executemany("INSERT INTO deleted_ids (doc_id, version) VALUES (?, NULL)", [(i,) for i in ids])
+
+    def deleted_since(self, version: int) -> List[int]:
+        """Ids deleted by snapshots newer than `version`."""
+        with self.lock:
+            return [doc_id for (doc_id,) in self.conn.execute("SELECT doc_id FROM deleted_ids WHERE version > ?", (version,))]
+
+    def cleared_since(self, version: int) -> bool:
+        with self.lock:
+            return (self._state("cleared_version") or 0) > version
+
+    def mark_published(self, version: int):
+        """Stamps pending deletions (and a pending clear) with the snapshot version being published."""
+        with self.lock:
+            self.conn.execute("UPDATE deleted_ids SET version = ? WHERE version IS NULL", (version,))
+            if self._cleared:
+                self.conn.execute("INSERT OR REPLACE INTO store_state (key, value) VALUES ('cleared_version', ?)", (version,))
+                self._cleared = False
+
+    def commit(self):
+        with self.lock:
+            self.conn.commit()
+
+    def clear(self):
+        with self.lock:
+            self.conn.execute("DELETE FROM documents")
+            # Other workers rebuild from scratch after a clear, so the deletion log is no longer needed.
+            self.conn.execute("DELETE FROM deleted_ids")
+            self.conn.commit()
+            self._count = 0
+            self._cleared = True
+
+    def import_json(self, json_path: str):
+        """One-off migration from the old metadata.json list; ids are the list positions."""
+        with open(json_path, "r") as f:
+            entries = json.load(f)
+        for start in range(0, len(entries), IMPORT_BATCH_SIZE):
+            self.extend(entries[start:start + IMPORT_BATCH_SIZE])
+        self.commit()
+        os.replace(json_path, json_path + ".migrated")
+        print(f"✅ Migrated {len(entries)} rows from {json_path} into {self.path}.")
@@ -0,0 +1,9 @@
+"""Worker process pools for the CPU-heavy ingestion steps (embedding, PDF and Excel extraction)."""
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+
+def spawn_pool(workers: int, initializer=None, initargs=()) -> ProcessPoolExecutor:
+    # Spawned, not forked: the server process holds model threads, FAISS and SQLite handles.
+    return ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"),
+                               initializer=initializer, initargs=initargs)
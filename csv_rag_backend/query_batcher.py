@@ -0,0 +1,139 @@
+"""Micro-batching of concurrent question embeddings.
+
+Each /chat/ request used to run its own batch-of-one forward pass. With the
+batcher, request threads put their questions on a queue and wait; a single
+scheduler thread takes the first waiting request, keeps collecting more for
+up to CSV_RAG_QUERY_BATCH_WAIT_MS or until CSV_RAG_QUERY_BATCH_MAX questions,
+then embeds them all in one encode() call and hands each caller its rows.
+At most CSV_RAG_QUERY_QUEUE_MAX requests may wait; beyond that encode()
+raises QueueFull so the server can shed load instead of queueing without end.
+"""
+import os
+import queue
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+from typing import Callable, List
+
+import numpy as np
+
+QUERY_BATCHING = os.getenv("CSV_RAG_QUERY_BATCHING", "1") == "1"
+MAX_BATCH_SIZE = int(os.getenv("CSV_RAG_QUERY_BATCH_MAX", "32"))
+MAX_WAIT_MS = float(os.getenv("CSV_RAG_QUERY_BATCH_WAIT_MS", "5"))
+MAX_QUEUE_DEPTH = int(os.getenv("CSV_RAG_QUERY_QUEUE_MAX", "1000"))
+# Wait and encode times kept for the percentiles in stats().
+TIMING_SAMPLES = 1000
+# Upper bounds of the batch-size histogram buckets; larger batches land in the last, open bucket.
+HISTOGRAM_BOUNDS = (1, 2, 4, 8, 16, 32, 64)
+
+
+class QueueFull(Exception):
+    pass
+
+
+def bucket_label(size: int) -> str:
+    low = 1
+    for bound in HISTOGRAM_BOUNDS:
+        if size <= bound:
+            return str(bound) if low == bound else f"{low}-{bound}"
+        low = bound + 1
+    return f"{low}+"
+
+
+class QueryBatcher:
+    def __init__(self, encode: Callable[[List[str]], np.ndarray], max_batch: int = MAX_BATCH_SIZE,
+                 max_wait_ms: float = MAX_WAIT_MS, max_queue: int = MAX_QUEUE_DEPTH):
+        self._encode = encode
+        self.max_batch = max_batch
+        self.max_wait = max_wait_ms / 1000
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._lock = threading.Lock()
+        self.batches = 0
+        self.requests = 0
+        self.questions = 0
+        self.rejected = 0
+        self._histogram = {bucket_label(bound): 0 for bound in HISTOGRAM_BOUNDS + (HISTOGRAM_BOUNDS[-1] + 1,)}
+        self._wait_ms = deque(maxlen=TIMING_SAMPLES)
+        self._encode_ms = deque(maxlen=TIMING_SAMPLES)
+        self._thread = threading.Thread(target=self._run, name="query-batcher", daemon=True)
+        self._thread.start()
+
+    def encode(self, texts: List[str]) -> np.ndarray:
+        """Embeds `texts` as part of the next batch; blocks until its rows are ready."""
+        future = Future()
+        try:
+            self._queue.put_nowait((texts, future, time.perf_counter()))
+        except queue.Full:
+            with self._lock:
+                self.rejected += 1
+            raise QueueFull(f"{self._queue.maxsize} embedding requests are already waiting.")
+        return future.result()
+
+    def _collect(self, first) -> list:
+        batch, size = [first], len(first[0])
+        deadline = first[2] + self.max_wait
+        while size < self.max_batch:
+            remaining = deadline - time.perf_counter()
+            try:
+                # Whatever is already queued joins at once; after that, wait out the rest of the window.
+                item = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is None:
+                self._queue.put(None)
+                break
+            batch.append(item)
+            size += len(item[0])
+        return batch
+
+    def _run(self):
+        while True:
+            first = self._queue.get()
+            if first is None:
+                return
+            batch = self._collect(first)
+            texts = [text for item in batch for text in item[0]]
+            started = time.perf_counter()
+            try:
+                vectors = self._encode(texts)
+            except Exception as e:
+                for _, future, _ in batch:
+                    future.set_exception(e)
+                continue
+            encode_ms = (time.perf_counter() - started) * 1000
+            row = 0
+            for item_texts, future, _ in batch:
+                future.set_result(vectors[row:row + len(item_texts)])
+                row += len(item_texts)
+            with self._lock:
+                self.batches += 1
+                self.requests += len(batch)
+                self.questions += len(texts)
+                self._histogram[bucket_label(len(texts))] += 1
+                self._wait_ms.extend((started - queued_at) * 1000 for _, _, queued_at in batch)
+                self._encode_ms.append(encode_ms)
+
+    def stats(self) -> dict:
+        with self._lock:
+            wait = np.array(self._wait_ms) if self._wait_ms else np.zeros(1)
+            encode = np.array(self._encode_ms) if self._encode_ms else np.zeros(1)
+            return {
+                "queue_depth": self._queue.qsize(),
+                "batches": self.batches,
+                "requests": self.requests,
+                "questions": self.questions,
+                "rejected": self.rejected,
+                "mean_batch_size": round(self.questions / self.batches, 2) if self.batches else 0.0,
+                "batch_size_histogram": dict(self._histogram),
+                "added_wait_ms": {"mean": round(float(wait.mean()), 3),
+                                  "p50": round(float(np.percentile(wait, 50)), 3),
+                                  "p99": round(float(np.percentile(wait, 99)), 3)},
+                "encode_ms": {"mean": round(float(encode.mean()), 3),
+                              "p99": round(float(np.percentile(encode, 99)), 3)},
+                "limits": {"max_batch": self.max_batch, "max_wait_ms": self.max_wait * 1000,
+                           "max_queue": self._queue.maxsize},
+            }
+
+    def shutdown(self):
+        self._queue.put(None)
@@ -0,0 +1,159 @@
+"""Serper-backed question paper search with a persistent per-subject result cache.
+
+A handful of subjects account for most "question paper" questions, so answers
+are cached per normalized subject in a SQLite file in STORE_DIR and survive
+restarts. Upstream calls go through one pooled requests.Session, and
+concurrent questions about the same subject share a single call. SERPER_URL
+can point the tool at a local stand-in (see benchmarks/serper_stub.py).
+"""
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from typing import Callable, Dict, Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+from requests.utils import get_environ_proxies
+
+SERPER_URL = os.getenv("SERPER_URL", "https://google.serper.dev/search")
+CACHE_TTL_SECONDS = float(os.getenv("CSV_RAG_QUESTION_PAPER_CACHE_TTL", str(7 * 24 * 3600)))
+# (connect, read) timeouts in seconds.
+SERPER_TIMEOUT = (5, float(os.getenv("CSV_RAG_SERPER_TIMEOUT", "20")))
+POOL_SIZE = 8
+MAX_LINKS = 5
+FILLER_WORDS = {"a", "an", "the", "for", "of", "on", "in", "me", "my", "please", "give", "find", "get", "need",
+                "want", "i", "vtu", "subject", "question", "questions", "paper", "papers", "exam", "previous", "year"}
+NON_WORD_PATTERN = re.compile(r"[^a-z0-9+#]+")
+
+
+def normalize_subject(subject: str) -> str:
+    """Cache key for a subject: lowercase words without punctuation or filler ("the DSA paper" -> "dsa")."""
+    words = NON_WORD_PATTERN.sub(" ", subject.lower()).split()
+    kept = [word for word in words if word not in FILLER_WORDS]
+    return " ".join(kept or words)
+
+
+def format_results(data: dict) -> str:
+    if data.get("organic"):
+        links = []
+        for item in data["organic"][:MAX_LINKS]:
+            title = item.get("title", "No Title")
+            link = item.get("link", "#")
+            links.append(f"* **{title}**: [Link]({link})")
+        return "Here are some links I found:\n" + "\n".join(links)
+    return "I couldn't find any direct links for that subject, but you can try searching on the official VTU website."
+
+
+class SingleFlight:
+    """Lets concurrent callers with the same key share one call instead of each making their own."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls: Dict[str, dict] = {}
+
+    def do(self, key: str, fn: Callable[[], str]) -> str:
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = {"done": threading.Event(), "result": None, "error": None}
+        if not leader:
+            call["done"].wait()
+        else:
+            try:
+                call["result"] = fn()
+            except Exception as e:
+                call["error"] = e
+            finally:
+                with self._lock:
+                    del self._calls[key]
+                call["done"].set()
+        if call["error"] is not None:
+            raise call["error"]
+        return call["result"]
+
+
+class QuestionPaperSearch:
+    def __init__(self, cache_path: str, api_key: str, url: str = SERPER_URL, ttl: float = CACHE_TTL_SECONDS):
+        self.api_key = api_key
+        self.url = url
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(cache_path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS question_papers (subject TEXT PRIMARY KEY, answer TEXT NOT NULL, expires_at REAL)"
+        )
+        self._conn.commit()
+        self._flights = SingleFlight()
+        self._session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=POOL_SIZE)
+        self._session.mount("https://", adapter)
+        self._session.mount("http://", adapter)
+        # Proxies and CA bundle are resolved once here rather than from the environment on every request.
+        self._session.trust_env = False
+        self._session.proxies = get_environ_proxies(url)
+        self._session.verify = os.getenv("REQUESTS_CA_BUNDLE") or os.getenv("CURL_CA_BUNDLE") or True
+        if self._session.proxies:
+            print(f"🌐 Detected system proxies: {self._session.proxies}")
+        self.hits = 0
+        self.misses = 0
+        self.upstream_calls = 0
+
+    def _cached(self, subject: str) -> Optional[str]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT answer FROM question_papers WHERE subject = ? AND expires_at > ?", (subject, time.time())
+            ).fetchone()
+        return row[0] if row else None
+
+    def _store(self, subject: str, answer: str):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO question_papers (subject, answer, expires_at) VALUES (?, ?, ?)",
+                (subject, answer, time.time() + self.ttl),
+            )
+            self._conn.execute("DELETE FROM question_papers WHERE expires_at <= ?", (time.time(),))
+            self._conn.commit()
+
+    def _fetch(self, subject: str) -> str:
+        # Another caller may have finished the same search while this one was queued.
+        answer = self._cached(subject)
+        if answer is not None:
+            return answer
+        payload = json.dumps({"q": f"VTU {subject} question paper filetype:pdf"})
+        headers = {"X-API-KEY": self.api_key, "Content-Type": "application/json"}
+        with self._lock:
+            self.upstream_calls += 1
+        try:
+            response = self._session.post(self.url, headers=headers, data=payload, timeout=SERPER_TIMEOUT)
+            response.raise_for_status()
+            answer = format_results(response.json())
+        except (requests.exceptions.RequestException, ValueError) as e:
+            print(f"Error calling Serper API: {e}")
+            # Failures are not cached, so the next question retries.
+            return f"API_ERROR: The search request failed. Details: {e}"
+        self._store(subject, answer)
+        return answer
+
+    def search(self, subject: str) -> str:
+        """Returns the formatted links answer for a subject, from the cache when possible."""
+        key = normalize_subject(subject)
+        answer = self._cached(key)
+        with self._lock:
+            if answer is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        if answer is not None:
+            return answer
+        return self._flights.do(key, lambda: self._fetch(key))
+
+    def stats(self) -> dict:
+        with self._lock:
+            entries = self._conn.execute(
+                "SELECT COUNT(*) FROM question_papers WHERE expires_at > ?", (time.time(),)
+            ).fetchone()[0]
+            return {"entries": entries, "hits": self.hits, "misses": self.misses, "upstream_calls": self.upstream_calls}
@@ -0,0 +1,93 @@
+"""Primary-key index for keyed (upsert) uploads.
+
+When an upload names a key column (for example USN), every row it stores is
+recorded here under (column, normalized key value) with a digest of its row
+text. The next keyed upload on that column looks its keys up in one query
+per chunk: a key whose stored row has the same digest is unchanged and
+skipped, a key with a different row is re-indexed and its old rows dropped.
+Rows stored before a column was first used as a key are backfilled from
+their stored text the first time it is.
+"""
+import hashlib
+from typing import Dict, List, Tuple
+
+from field_index import is_tabular, normalize, parse_display_text
+from metadata_store import LOOKUP_CHUNK, MetadataStore
+
+
+def row_digest(text: str) -> str:
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+
+class RowKeyIndex:
+    def __init__(self, store: MetadataStore):
+        self.store = store
+        self.conn = store.conn
+        with store.lock:
+            self.conn.execute("CREATE TABLE IF NOT EXISTS row_keys (col TEXT, value TEXT, doc_id INTEGER, digest TEXT)")
+            self.conn.execute("CREATE INDEX IF NOT EXISTS row_keys_lookup ON row_keys (col, value)")
+            self.conn.execute("CREATE INDEX IF NOT EXISTS row_keys_doc ON row_keys (doc_id)")
+            self.conn.execute("CREATE TABLE IF NOT EXISTS key_columns (col TEXT PRIMARY KEY)")
+            self.conn.commit()
+
+    def columns(self) -> List[str]:
+        """Normalized names of the columns used as keys so far; every upload records its keys for them."""
+        with self.store.lock:
+            return [col for (col,) in self.conn.execute("SELECT col FROM key_columns")]
+
+    def ensure_column(self, column: str):
+        """Backfills `column`'s keys from the stored rows the first time it is used as a key."""
+        column = normalize(column)
+        with self.store.lock:
+            if self.conn.execute("SELECT 1 FROM key_columns WHERE col = ?", (column,)).fetchone():
+                return
+        entries = []
+        for doc_id, doc in self.store.iter_with_ids():
+            if not is_tabular(doc):
+                continue
+            text = doc.get("text", "")
+            record = {normalize(col): value for col, value in parse_display_text(text).items()}
+            if record.get(column, "").strip():
+                entries.append((normalize(record[column]), doc_id, row_digest(text)))
+        with self.store.lock:
+            self._insert(column, entries)
+            self.conn.execute("INSERT OR IGNORE INTO key_columns (col) VALUES (?)", (column,))
+        print(f"🔧 Indexed {len(entries)} existing rows by key column '{column}'.")
+
+    def _insert(self, column: str, entries: List[Tuple[str, int, str]]):
+        self.conn.executemany("INSERT INTO row_keys (col, value, doc_id, digest) VALUES (?, ?, ?, ?)",
+                              [(column, value, int(doc_id), digest) for value, doc_id, digest in entries])
+
+    def add(self, column: str, entries: List[Tuple[str, int, str]]):
+        """Records (key value, doc id, row digest) triples. Changes become durable on the store's next commit()."""
+        with self.store.lock:
+            self._insert(normalize(column), [(normalize(value), doc_id, digest) for value, doc_id, digest in entries])
+
+    def lookup(self, column: str, values: List[str]) -> Dict[str, List[Tuple[int, str]]]:
+        """Normalized key value -> [(doc id, digest), ...] of the stored rows holding it."""
+        column = normalize(column)
+        values = list({normalize(value) for value in values})
+        found: Dict[str, List[Tuple[int, str]]] = {}
+        with self.store.lock:
+            for start in range(0, len(values), LOOKUP_CHUNK):
+                chunk = values[start:start + LOOKUP_CHUNK]
+                rows = self.conn.execute(
+                    f"SELECT value, doc_id, digest FROM row_keys WHERE col = ? AND value IN ({','.join('?' * len(chunk))})",
+                    [column] + chunk,
+                )
+                for value, doc_id, digest in rows:
+                    found.setdefault(value, []).append((doc_id, digest))
+        return found
+
+    def remove_ids(self, ids):
+        ids = [int(i) for i in ids]
+        with self.store.lock:
+            for start in range(0, len(ids), LOOKUP_CHUNK):
+                chunk = ids[start:start + LOOKUP_CHUNK]
+                self.conn.execute(f"DELETE FROM row_keys WHERE doc_id IN ({','.join('?' * len(chunk))})", chunk)
+
+    def clear(self):
+        with self.store.lock:
+            self.conn.execute("DELETE FROM row_keys")
+            self.conn.execute("DELETE FROM key_columns")
+            self.conn.commit()
@@ -0,0 +1,147 @@
+"""Bounded server-side conversation memory for /chat/, keyed by session_id.
+
+Only clients that send a session_id, or ask for one with new_session, get a
+session; one-shot questions are not remembered.
+
+Each session keeps a condensed history (the last few questions with their
+answers cut short) and the rows the last retrieving turn answered from,
+stamped with the data version. A follow-up such as "what about his seat?"
+is answered from those rows and that history instead of being embedded and
+searched again from scratch. A follow-up that asks about something those
+rows don't hold is searched afresh, with the history kept for the LLM.
+
+Sessions are evicted least-recently-used first, after CSV_RAG_SESSION_TTL
+seconds idle, and whenever the estimated size of all sessions goes over
+CSV_RAG_SESSION_MEMORY_MB.
+"""
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import List, Optional
+
+MAX_SESSIONS = int(os.getenv("CSV_RAG_SESSION_MAX", "10000"))
+TTL_SECONDS = float(os.getenv("CSV_RAG_SESSION_TTL", "1800"))
+MAX_MEMORY_BYTES = int(float(os.getenv("CSV_RAG_SESSION_MEMORY_MB", "32")) * 1024 * 1024)
+MAX_TURNS = int(os.getenv("CSV_RAG_SESSION_TURNS", "6"))
+MAX_QUESTION_CHARS = 200
+MAX_ANSWER_CHARS = 300
+# Rough per-session overhead of the dicts and lists around the strings.
+SESSION_OVERHEAD_BYTES = 512
+# Openings that continue the previous question: "what about his seat?", "and her floor?".
+ELLIPSIS_PATTERN = re.compile(r"^\s*(what about|how about|what of|and|also)\b", re.IGNORECASE)
+# Words that point back at the student of the previous turn.
+PERSON_PATTERN = re.compile(r"\b(he|she|him|his|her|hers|(that|this|the same|same) student)\b", re.IGNORECASE)
+# Lower-case only, and only in short questions without an entity of their own: "is it on the ground floor?"
+# is a follow-up, "What is the IT helpdesk phone number?" is not.
+REFERENCE_PATTERN = re.compile(r"\b(it|its|they|them|their|those|these)\b")
+ENTITY_PATTERN = re.compile(r"\b([A-Z]{2,}|\w*\d\w*)\b")
+SHORT_QUESTION_WORDS = 6
+# Words that say nothing about what a follow-up asks for, ignored by rows_cover().
+FILLER_WORDS = {
+    "what", "about", "how", "and", "also", "the", "his", "her", "him", "she", "hers", "they", "them", "their",
+    "those", "these", "its", "that", "this", "same", "student", "students", "which", "where", "when", "who",
+    "whom", "does", "did", "are", "was", "were", "tell", "give", "show", "please", "for", "with", "from", "is",
+    "any", "can", "you", "your", "there", "then", "what's", "whats", "one", "ones",
+}
+
+
+def is_follow_up(question: str) -> bool:
+    """True for questions that only make sense with the previous turn ("what about his seat?")."""
+    if ELLIPSIS_PATTERN.match(question) or PERSON_PATTERN.search(question):
+        return True
+    return (len(question.split()) <= SHORT_QUESTION_WORDS and bool(REFERENCE_PATTERN.search(question))
+            and not ENTITY_PATTERN.search(question))
+
+
+def rows_cover(docs: List[dict], question: str) -> bool:
+    """True when the rows mention what the follow-up asks about ("seat" in "what about his seat?").
+
+    A follow-up with nothing but pronouns and filler words ("and him?") is covered by any rows.
+    """
+    asked = [word for word in re.findall(r"[a-z']+", question.lower()) if len(word) > 2 and word not in FILLER_WORDS]
+    if not asked:
+        return True
+    text = " ".join(str(doc.get("text", "")) for doc in docs).lower()
+    return any(word in text for word in asked)
+
+
+def condense(text: str, limit: int) -> str:
+    text = " ".join(text.split())
+    return text if len(text) <= limit else text[:limit - 3] + "..."
+
+
+def session_size(session: dict) -> int:
+    size = SESSION_OVERHEAD_BYTES
+    for turn in session["history"]:
+        size += len(turn["question"]) + len(turn["answer"])
+    for doc in session["docs"]:
+        size += sum(len(str(value)) for value in doc.values())
+    return size
+
+
+class SessionStore:
+    def __init__(self, max_sessions: int = MAX_SESSIONS, ttl: float = TTL_SECONDS,
+                 max_memory: int = MAX_MEMORY_BYTES):
+        self.max_sessions = max_sessions
+        self.ttl = ttl
+        self.max_memory = max_memory
+        self._sessions = OrderedDict()
+        self._lock = threading.Lock()
+        self._memory = 0
+        self.follow_ups = 0
+        self.evictions = 0
+
+    def get(self, session_id: str) -> Optional[dict]:
+        """A copy of the session's history and last rows, or None if it is unknown or expired."""
+        with self._lock:
+            session = self._sessions.get(session_id)
+            if session is None:
+                return None
+            if time.time() - session["updated_at"] > self.ttl:
+                self._drop(session_id)
+                return None
+            self._sessions.move_to_end(session_id)
+            return {"history": list(session["history"]), "docs": list(session["docs"]), "version": session["version"]}
+
+    def record(self, session_id: str, question: str, answer: str, docs: List[dict], version: int,
+               follow_up: bool = False):
+        """Adds a turn; rows that were retrieved replace the session's last rows, other turns keep them."""
+        with self._lock:
+            session = self._sessions.pop(session_id, None)
+            if session is None:
+                session = {"history": [], "docs": [], "version": version, "size": 0}
+            else:
+                self._memory -= session["size"]
+            session["history"] = (session["history"] + [{
+                "question": condense(question, MAX_QUESTION_CHARS),
+                "answer": condense(answer, MAX_ANSWER_CHARS),
+            }])[-MAX_TURNS:]
+            if docs and not follow_up:
+                session["docs"], session["version"] = list(docs), version
+            session["updated_at"] = time.time()
+            session["size"] = session_size(session)
+            self._sessions[session_id] = session
+            self._memory += session["size"]
+            if follow_up:
+                self.follow_ups += 1
+            self._evict()
+
+    def _drop(self, session_id: str):
+        self._memory -= self._sessions.pop(session_id)["size"]
+
+    def _evict(self):
+        now = time.time()
+        while self._sessions:
+            oldest_id, oldest = next(iter(self._sessions.items()))
+            over = len(self._sessions) > self.max_sessions or self._memory > self.max_memory
+            if not over and now - oldest["updated_at"] <= self.ttl:
+                return
+            self._drop(oldest_id)
+            self.evictions += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"sessions": len(self._sessions), "memory_bytes": self._memory,
+                    "follow_ups_answered": self.follow_ups, "evictions": self.evictions}
@@ -0,0 +1,131 @@
+"""Versioned index snapshots shared by every uvicorn worker on one STORE_DIR.
+
+A writer (upload, delete, clear, re-embed) holds an exclusive file lock for
+the whole change, so writes from different workers never interleave. It
+publishes a new version by writing vector_index.v<N>.faiss (and the BM25
+postings as lexical_index.v<N>.npz), committing the SQLite stores and then atomically replacing snapshot.json. Readers never take
+the lock: between requests they compare the manifest file's stat signature
+with that of the manifest they last reloaded from and, when it differs, load
+the newer version and swap it in.
+"""
+import json
+import os
+import re
+import threading
+from contextlib import contextmanager
+from typing import Optional, Tuple
+
+if os.name == "nt":
+    import msvcrt
+
+    def lock_file(f):
+        f.seek(0)
+        while True:
+            try:
+                msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+                return
+            except OSError:
+                # LK_LOCK gives up after about 10 seconds; an upload can hold the lock for longer.
+                continue
+
+    def unlock_file(f):
+        f.seek(0)
+        msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+else:
+    import fcntl
+
+    def lock_file(f):
+        fcntl.flock(f, fcntl.LOCK_EX)
+
+    def unlock_file(f):
+        fcntl.flock(f, fcntl.LOCK_UN)
+
+MANIFEST_NAME = "snapshot.json"
+LOCK_NAME = "writer.lock"
+# Saved before snapshots existed; treated as version 0.
+LEGACY_INDEX_NAME = "vector_index.faiss"
+# Per-version files: the FAISS index and the BM25 postings.
+INDEX_FILE_PATTERN = re.compile(r"^(?:vector_index\.v(\d+)\.faiss|lexical_index\.v(\d+)\.npz)$")
+# Index files kept besides the current one, for workers still loading an older version.
+KEEP_PREVIOUS_VERSIONS = 1
+
+
+class SnapshotStore:
+    def __init__(self, store_dir: str):
+        self.store_dir = store_dir
+        self.manifest_path = os.path.join(store_dir, MANIFEST_NAME)
+        self.lock_path = os.path.join(store_dir, LOCK_NAME)
+        self._thread_lock = threading.RLock()
+        self._lock_depth = 0
+        self._lock_file = None
+        self._seen = None
+
+    def current(self) -> dict:
+        """The published manifest: {"version": N, "index_file": name or None}."""
+        try:
+            with open(self.manifest_path) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            legacy = os.path.exists(os.path.join(self.store_dir, LEGACY_INDEX_NAME))
+            return {"version": 0, "index_file": LEGACY_INDEX_NAME if legacy else None}
+
+    def index_path(self, manifest: dict) -> Optional[str]:
+        return os.path.join(self.store_dir, manifest["index_file"]) if manifest["index_file"] else None
+
+    def signature(self) -> Optional[Tuple[int, int, int]]:
+        """(mtime, inode, size) of the manifest; every publish replaces the file, so the inode changes too."""
+        try:
+            stat = os.stat(self.manifest_path)
+        except FileNotFoundError:
+            return None
+        return stat.st_mtime_ns, stat.st_ino, stat.st_size
+
+    def changed(self) -> bool:
+        """Cheap per-request check: True until a reload has caught up with the manifest on disk."""
+        return self.signature() != self._seen
+
+    def mark_seen(self, signature: Optional[Tuple[int, int, int]]):
+        """Records the manifest signature taken before reading the version that is now loaded."""
+        self._seen = signature
+
+    def new_index_path(self, version: int) -> str:
+        return os.path.join(self.store_dir, f"vector_index.v{version}.faiss")
+
+    def lexical_path(self, version: int) -> str:
+        return os.path.join(self.store_dir, f"lexical_index.v{version}.npz")
+
+    def publish(self, version: int, index_path: str):
+        """Makes `version` current. Caller holds the writer lock and has written its files."""
+        tmp_path = f"{self.manifest_path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump({"version": version, "index_file": os.path.basename(index_path)}, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.manifest_path)
+        self._prune(version)
+
+    def _prune(self, version: int):
+        # Workers that still have an old file memory-mapped keep their copy until they reload.
+        for name in os.listdir(self.store_dir):
+            match = INDEX_FILE_PATTERN.match(name)
+            file_version = match and int(match.group(1) or match.group(2))
+            stale = name == LEGACY_INDEX_NAME or (match and file_version < version - KEEP_PREVIOUS_VERSIONS)
+            if stale:
+                os.remove(os.path.join(self.store_dir, name))
+
+    @contextmanager
+    def writer_lock(self):
+        """Exclusive across worker processes; re-entrant within the thread that holds it."""
+        with self._thread_lock:
+            if self._lock_depth == 0:
+                self._lock_file = open(self.lock_path, "a+")
+                lock_file(self._lock_file)
+            self._lock_depth += 1
+            try:
+                yield
+            finally:
+                self._lock_depth -= 1
+                if self._lock_depth == 0:
+                    unlock_file(self._lock_file)
+                    self._lock_file.close()
+                    self._lock_file = None
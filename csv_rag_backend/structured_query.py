@@ -0,0 +1,220 @@
+"""Structured-query tool: simple filter, count and aggregate questions over the typed tables.
+
+parse_query() recognises questions such as "students with attendance below
+75%", "how many AI students in third year" or "average marks of final year
+students" against the columns the table store actually has: numeric
+comparisons name a numeric column next to a comparator and a number, and
+categorical conditions are any low-cardinality cell value quoted in the
+question. A count or list has to be about the table's rows ("students",
+"faculty", "rows") or the columns it filters on, and every other content
+word of the question has to be a condition, so "how many credits does the AI
+elective carry?" or "which lab is the CS HOD in?" is left to vector search
+rather than read as a count or list of AI or CS rows.
+Aggregates keep the words they could not place in "unexplained". run_query() evaluates the plan with vectorized pandas masks, so the
+counts and aggregates are exact rather than read off retrieved rows by the LLM.
+Questions it cannot map onto a table return None and go to the other tools.
+"""
+import re
+from typing import Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from table_store import ID_COLUMN
+
+COMPARATORS = [
+    (r"at least|no less than|not less than|>=", ">="),
+    (r"at most|no more than|not more than|<=", "<="),
+    (r"below|under|less than|lower than|fewer than|<", "<"),
+    (r"above|over|more than|greater than|higher than|>", ">"),
+    (r"equal to|equals|exactly|=", "=="),
+]
+COMPARISON_PATTERN = re.compile(
+    r"(?<![a-z])(" + "|".join(pattern for pattern, _ in COMPARATORS) + r")\s*(-?\d+(?:\.\d+)?)\s*%?", re.IGNORECASE
+)
+COUNT_PATTERN = re.compile(r"\b(how many|count|number of)\b", re.IGNORECASE)
+AGGREGATES = {
+    "average": "mean", "avg": "mean", "mean": "mean",
+    "maximum": "max", "max": "max", "highest": "max",
+    "minimum": "min", "min": "min", "lowest": "min",
+    "sum": "sum", "total": "sum",
+}
+AGGREGATE_PATTERN = re.compile(r"\b(" + "|".join(AGGREGATES) + r")\b", re.IGNORECASE)
+LIST_PATTERN = re.compile(r"\b(list|show|which|who|all|students with|students in)\b", re.IGNORECASE)
+# Nouns for a table's rows, in singular form; a count or list must be about these or a named column.
+ROW_NOUNS = {
+    "student", "faculty", "faculties", "staff", "teacher", "lecturer", "professor", "employee", "member",
+    "person", "people", "row", "record", "entry", "entries",
+}
+# Words that frame a table question without adding a condition to it.
+FRAME_WORDS = {
+    "how", "many", "count", "number", "total", "list", "show", "display", "which", "who", "whose", "what",
+    "all", "every", "each", "any", "there", "a", "an", "the", "of", "in", "on", "at", "from", "for", "with",
+    "by", "and", "or", "than", "to", "is", "are", "was", "were", "be", "do", "does", "have", "has",
+    "me", "us", "we", "i", "you", "please", "give", "get", "find", "tell", "those", "these", "them", "their",
+    "that", "this", "currently", "only", "percent",
+}
+# Words around a comparison that may name its column ("attendance below 75", "below 75% attendance").
+COLUMN_WINDOW_WORDS = 4
+AGGREGATE_LABELS = {"mean": "Average", "max": "Maximum", "min": "Minimum", "sum": "Total"}
+OPERATORS = {
+    ">=": np.greater_equal, "<=": np.less_equal, "<": np.less, ">": np.greater, "==": np.equal,
+}
+
+
+def words(text: str) -> List[str]:
+    return re.findall(r"[a-z0-9]+", text.lower())
+
+
+def phrase_in(phrase: List[str], text: List[str]) -> bool:
+    n = len(phrase)
+    return n > 0 and any(text[i:i + n] == phrase for i in range(len(text) - n + 1))
+
+
+def singular(word: str) -> str:
+    return word[:-1] if len(word) > 3 and word.endswith("s") and not word.endswith("ss") else word
+
+
+def merged_schema(schema: Dict[str, dict]) -> dict:
+    columns, numeric, categories = set(), set(), {}
+    for table in schema.values():
+        columns.update(table["columns"])
+        numeric.update(table["numeric"])
+        for col, values in table["categories"].items():
+            categories.setdefault(col, set()).update(values)
+    return {"columns": columns, "numeric": numeric, "categories": categories}
+
+
+def find_column(text: str, columns) -> Optional[str]:
+    """The column whose name is spelled out in `text` (the longest one if several are)."""
+    text_words = words(text)
+    named = [col for col in columns if phrase_in(words(col), text_words)]
+    return max(named, key=lambda col: len(words(col))) if named else None
+
+
+def parse_query(question: str, schema: Dict[str, dict]) -> Optional[dict]:
+    """Turns a question into {"intent", "conditions", "aggregate", "column", "unexplained"}, or None if it isn't one."""
+    if not schema:
+        return None
+    columns = merged_schema(schema)
+    source_words = {singular(word) for source in schema for word in words(source)}
+    # Question words a plan accounts for; whatever is left over is a condition it would drop.
+    explained = FRAME_WORDS | ROW_NOUNS | source_words
+    conditions = []
+    for match in COMPARISON_PATTERN.finditer(question):
+        before = " ".join(question[:match.start()].split()[-COLUMN_WINDOW_WORDS:])
+        after = " ".join(question[match.end():].split()[:COLUMN_WINDOW_WORDS])
+        column = find_column(before, columns["numeric"]) or find_column(after, columns["numeric"])
+        if column is not None:
+            operator = next(op for pattern, op in COMPARATORS if re.fullmatch(pattern, match.group(1), re.IGNORECASE))
+            conditions.append({"column": column, "op": operator, "value": float(match.group(2))})
+            explained.update(words(match.group(0)))
+    question_words = words(question)
+    for column, values in columns["categories"].items():
+        # The longest value wins, so "final year" beats "year" when a column has both.
+        quoted = [value for value in values if len(value.strip()) > 1 and phrase_in(words(value), question_words)]
+        if quoted:
+            value = max(quoted, key=lambda v: len(words(v)))
+            conditions.append({"column": column, "op": "==", "value": value})
+            explained.update(singular(word) for word in words(value))
+
+    about_rows = any(singular(word) in ROW_NOUNS or word in ROW_NOUNS for word in question_words)
+    named_columns = {condition["column"] for condition in conditions}
+    explained.update(singular(word) for column in named_columns for word in words(column))
+    if about_rows:
+        # Other columns of the rows asked about are what to show ("names of AI students").
+        explained.update(singular(word) for column in columns["columns"] for word in words(column))
+
+    aggregate_match = AGGREGATE_PATTERN.search(question)
+    if aggregate_match:
+        column = find_column(question[aggregate_match.end():], columns["numeric"])
+        if column is not None:
+            explained.add(aggregate_match.group(1).lower())
+            explained.update(singular(word) for word in words(column))
+            return {"intent": "aggregate", "aggregate": AGGREGATES[aggregate_match.group(1).lower()],
+                    "column": column, "conditions": conditions,
+                    "unexplained": unexplained_words(question_words, explained)}
+    # A count or list answers for the whole question, so it must be about rows and drop nothing.
+    if not conditions or unexplained_words(question_words, explained):
+        return None
+    names_condition_column = any(
+        phrase_in([singular(word) for word in words(column)], [singular(word) for word in question_words])
+        for column in named_columns
+    )
+    if not about_rows and not names_condition_column:
+        return None
+    if COUNT_PATTERN.search(question):
+        return {"intent": "count", "aggregate": None, "column": None, "conditions": conditions, "unexplained": []}
+    has_comparison = any(condition["column"] in columns["numeric"] for condition in conditions)
+    if has_comparison or LIST_PATTERN.search(question):
+        return {"intent": "filter", "aggregate": None, "column": None, "conditions": conditions, "unexplained": []}
+    return None
+
+
+def unexplained_words(question_words: List[str], explained) -> List[str]:
+    """Content words of the question that no part of the plan accounts for."""
+    return [word for word in question_words if word not in explained and singular(word) not in explained]
+
+
+def plural(count: int, noun: str) -> str:
+    return f"{count} {noun if count == 1 else noun + 's'}"
+
+
+def describe_conditions(conditions: List[dict]) -> str:
+    parts = []
+    for condition in conditions:
+        value = condition["value"]
+        if isinstance(value, float) and value.is_integer():
+            value = int(value)
+        parts.append(f"{condition['column']} {condition['op'].replace('==', '=')} {value}")
+    return " and ".join(parts) if parts else "all rows"
+
+
+def condition_mask(table: pd.DataFrame, condition: dict) -> pd.Series:
+    values = table[condition["column"]]
+    if pd.api.types.is_numeric_dtype(values):
+        numbers = values.astype("float64").to_numpy()
+        mask = OPERATORS[condition["op"]](numbers, float(condition["value"]))
+        return pd.Series(mask & ~np.isnan(numbers), index=table.index)
+    return values.astype(str).str.strip().str.lower() == str(condition["value"]).strip().lower()
+
+
+def run_query(plan: dict, tables: Dict[str, pd.DataFrame], hidden_ids=()) -> dict:
+    """Evaluates a parsed plan over every table that has the columns it names.
+
+    Returns the matching row "ids" (metadata ids, in table order), the
+    per-source match "counts", the aggregate "value" (if any) and a "summary"
+    sentence stating the exact result.
+    """
+    needed = {condition["column"] for condition in plan["conditions"]}
+    if plan["column"]:
+        needed.add(plan["column"])
+    ids, counts, values = [], {}, []
+    hidden = np.fromiter(hidden_ids, dtype=np.int64) if hidden_ids else None
+    for source, table in tables.items():
+        if not needed.issubset(table.columns):
+            continue
+        mask = pd.Series(True, index=table.index)
+        if hidden is not None:
+            mask &= ~table[ID_COLUMN].isin(hidden)
+        for condition in plan["conditions"]:
+            mask &= condition_mask(table, condition)
+        matched = table[mask]
+        counts[source] = len(matched)
+        ids.extend(int(i) for i in matched[ID_COLUMN])
+        if plan["intent"] == "aggregate" and pd.api.types.is_numeric_dtype(matched[plan["column"]]):
+            values.append(matched[plan["column"]].astype("float64").dropna())
+
+    where = describe_conditions(plan["conditions"])
+    total = sum(counts.values())
+    sources = ", ".join(f"{source}: {count}" for source, count in counts.items())
+    value = None
+    if plan["intent"] == "aggregate":
+        column_values = pd.concat(values) if values else pd.Series(dtype="float64")
+        if len(column_values):
+            value = round(float(getattr(column_values, plan["aggregate"])()), 2)
+        summary = (f"{AGGREGATE_LABELS[plan['aggregate']]} {plan['column']} over the {plural(len(column_values), 'row')} "
+                   f"where {where}: {value if value is not None else 'no values'} ({sources}).")
+    else:
+        summary = f"{plural(total, 'row')} {'matches' if total == 1 else 'match'} {where} ({sources})."
+    return {"ids": ids, "counts": counts, "total": total, "value": value, "summary": summary}
@@ -0,0 +1,186 @@
+"""Typed columnar copies of the uploaded CSVs, for the structured-query tool.
+
+The vector and metadata stores only keep each row as "col: val | col: val"
+text. Next to them, every source is kept as a pandas DataFrame with real
+column types: a column whose non-empty cells all parse as numbers (allowing
+"75%" or "1,200") becomes numeric, every other column stays text. Each row
+carries its metadata id in ID_COLUMN, so deletions, replacements and hidden
+rows apply to the tables exactly as to the other indexes.
+
+Tables are persisted as Parquet files in STORE_DIR/tables (needs pyarrow)
+when a snapshot is published, and re-read by other workers when they load a
+newer snapshot.
+"""
+import os
+import threading
+from typing import Dict, List, Tuple
+from urllib.parse import quote, unquote
+
+import numpy as np
+import pandas as pd
+
+from field_index import is_tabular, parse_display_text
+from metadata_store import MetadataStore
+
+ID_COLUMN = "_id"
+TABLE_SUFFIX = ".parquet"
+# Text columns with at most this many distinct values are offered to the query parser as categories.
+MAX_CATEGORY_VALUES = int(os.getenv("CSV_RAG_TABLE_MAX_CATEGORIES", "64"))
+
+
+def table_name(source: str, sheet: str = "") -> str:
+    """Each CSV is one table; each sheet of a workbook is a table of its own."""
+    return f"{source} [{sheet}]" if sheet else source
+
+
+def infer_types(chunk: pd.DataFrame) -> pd.DataFrame:
+    """Converts the all-string columns of a CSV chunk to numbers where every non-empty cell is one."""
+    typed = {}
+    for col in chunk.columns:
+        values = chunk[col].astype(str).str.strip()
+        present = values != ""
+        numbers = pd.to_numeric(values.str.replace(r"[,%]", "", regex=True).where(present), errors="coerce")
+        if present.any() and numbers[present].notna().all():
+            integral = numbers.dropna().mod(1).eq(0).all()
+            typed[col] = numbers.astype("Int64") if integral else numbers.astype("float64")
+        else:
+            typed[col] = values.astype(object)
+    return pd.DataFrame(typed, index=chunk.index)
+
+
+def as_text(values: pd.Series) -> pd.Series:
+    return values.astype(object).where(values.notna(), "").astype(str).astype(object)
+
+
+def merge_tables(frames: List[pd.DataFrame]) -> pd.DataFrame:
+    """Concatenates typed frames; a column that is numeric in some and text in others becomes text."""
+    numeric = {}
+    for frame in frames:
+        for col in frame.columns:
+            numeric.setdefault(col, set()).add(pd.api.types.is_numeric_dtype(frame[col]))
+    mixed = [col for col, kinds in numeric.items() if len(kinds) > 1]
+    if mixed:
+        frames = [frame.assign(**{col: as_text(frame[col]) for col in mixed if col in frame.columns})
+                  for frame in frames]
+    return pd.concat(frames, ignore_index=True)
+
+
+class TableStore:
+    def __init__(self, tables_dir: str):
+        self.tables_dir = tables_dir
+        os.makedirs(tables_dir, exist_ok=True)
+        self.lock = threading.RLock()
+        self._tables: Dict[str, pd.DataFrame] = {}
+        # Typed chunks appended since the source's table was last materialized.
+        self._pending: Dict[str, List[pd.DataFrame]] = {}
+        self._dirty = set()
+        self._schema = None
+        self.load()
+
+    def _path(self, source: str) -> str:
+        return os.path.join(self.tables_dir, quote(source, safe="") + TABLE_SUFFIX)
+
+    def load(self):
+        """(Re)reads every persisted table, dropping any unsaved changes."""
+        tables = {}
+        for name in os.listdir(self.tables_dir):
+            if name.endswith(TABLE_SUFFIX):
+                tables[unquote(name[:-len(TABLE_SUFFIX)])] = pd.read_parquet(os.path.join(self.tables_dir, name))
+        with self.lock:
+            self._tables, self._pending, self._dirty, self._schema = tables, {}, set(), None
+
+    def append(self, source: str, ids: List[int], chunk: pd.DataFrame):
+        """Adds the raw string rows of `chunk`, whose metadata ids are `ids`."""
+        typed = infer_types(chunk).reset_index(drop=True)
+        typed.insert(0, ID_COLUMN, np.asarray(ids, dtype=np.int64))
+        with self.lock:
+            self._pending.setdefault(source, []).append(typed)
+            self._dirty.add(source)
+            self._schema = None
+
+    def _materialize(self):
+        """Folds pending chunks into their tables. Caller holds the lock."""
+        for source, chunks in self._pending.items():
+            frames = ([self._tables[source]] if source in self._tables else []) + chunks
+            self._tables[source] = merge_tables(frames)
+        self._pending = {}
+
+    def tables(self) -> Dict[str, pd.DataFrame]:
+        with self.lock:
+            self._materialize()
+            return dict(self._tables)
+
+    def remove_ids(self, ids):
+        ids = np.asarray(list(ids), dtype=np.int64)
+        if not len(ids):
+            return
+        with self.lock:
+            self._materialize()
+            for source, table in list(self._tables.items()):
+                keep = ~table[ID_COLUMN].isin(ids)
+                if not keep.all():
+                    self._tables[source] = table[keep].reset_index(drop=True)
+                    self._dirty.add(source)
+            self._schema = None
+
+    def clear(self):
+        with self.lock:
+            self._dirty.update(self._tables)
+            self._dirty.update(self._pending)
+            self._tables, self._pending, self._schema = {}, {}, None
+
+    def save(self):
+        """Writes every changed table; empty or removed tables are deleted from disk."""
+        with self.lock:
+            self._materialize()
+            for source in self._dirty:
+                path = self._path(source)
+                table = self._tables.get(source)
+                if table is None or table.empty:
+                    self._tables.pop(source, None)
+                    if os.path.exists(path):
+                        os.remove(path)
+                    continue
+                tmp_path = f"{path}.tmp"
+                table.to_parquet(tmp_path, index=False)
+                os.replace(tmp_path, path)
+            self._dirty = set()
+
+    def is_empty(self) -> bool:
+        with self.lock:
+            return not self._tables and not self._pending
+
+    def rebuild_from_store(self, store: MetadataStore):
+        """Rebuilds every table from stored row texts (used for stores that predate the tables)."""
+        self.clear()
+        rows: Dict[str, Tuple[List[int], List[dict]]] = {}
+        for doc_id, doc in store.iter_with_ids():
+            if not is_tabular(doc):
+                continue
+            ids, records = rows.setdefault(table_name(doc.get("source", ""), doc.get("sheet", "")), ([], []))
+            ids.append(doc_id)
+            records.append(parse_display_text(doc.get("text", "")))
+        for source, (ids, records) in rows.items():
+            self.append(source, ids, pd.DataFrame.from_records(records).fillna(""))
+        self.save()
+
+    def schema(self) -> Dict[str, dict]:
+        """Per source: its columns, its numeric columns and the distinct values of its low-cardinality text columns."""
+        with self.lock:
+            if self._schema is None:
+                self._materialize()
+                self._schema = {}
+                for source, table in self._tables.items():
+                    numeric, categories = [], {}
+                    for col in table.columns:
+                        if col == ID_COLUMN:
+                            continue
+                        if pd.api.types.is_numeric_dtype(table[col]):
+                            numeric.append(col)
+                        else:
+                            values = table[col].unique()
+                            if len(values) <= MAX_CATEGORY_VALUES:
+                                categories[col] = [str(v) for v in values if str(v).strip()]
+                    columns = [col for col in table.columns if col != ID_COLUMN]
+                    self._schema[source] = {"columns": columns, "numeric": numeric, "categories": categories}
+            return self._schema
@@ -0,0 +1,362 @@
+"""FAISS index selection for the campus chat vector store.
+
+The index type is chosen with the CSV_RAG_INDEX_TYPE environment variable:
+"flat" (exact brute force), "ivf", "hnsw" or "auto". In "auto" mode the store
+starts as a flat index and is rebuilt as an IVF index once it grows past
+CSV_RAG_FLAT_MAX_ROWS. IVF indexes are retrained with more lists whenever the
+corpus has grown enough that the current list count is too small.
+
+A vector's id is the id of its row in the metadata store, so rows can be
+removed without renumbering the rest. Flat and HNSW indexes are wrapped in an
+IndexIDMap2 for that; IVF indexes keep the ids in their inverted lists
+themselves, because an IndexIDMap2 compacts its id map on removal while the
+IVF lists keep their old positions.
+
+CSV_RAG_VECTOR_CODEC picks how the vectors themselves are stored: "float32"
+(exact), "fp16", "sq8" (8-bit scalar quantization) or "pq" (product
+quantization). sq8 and pq have to be trained, so the store keeps float32
+vectors until it has CSV_RAG_CODEC_MIN_TRAIN_ROWS rows and is then rebuilt.
+With CSV_RAG_MMAP_INDEX=1 the saved index is memory-mapped instead of read
+into RAM, so uvicorn workers share its vectors through the page cache.
+"""
+import math
+import os
+
+import faiss
+import numpy as np
+
+INDEX_TYPE = os.getenv("CSV_RAG_INDEX_TYPE", "auto").lower()
+FLAT_MAX_ROWS = int(os.getenv("CSV_RAG_FLAT_MAX_ROWS", "20000"))
+IVF_MIN_TRAIN_ROWS = int(os.getenv("CSV_RAG_IVF_MIN_TRAIN_ROWS", "2000"))
+IVF_NPROBE = int(os.getenv("CSV_RAG_IVF_NPROBE", "16"))
+HNSW_M = int(os.getenv("CSV_RAG_HNSW_M", "32"))
+HNSW_EF_CONSTRUCTION = int(os.getenv("CSV_RAG_HNSW_EF_CONSTRUCTION", "80"))
+HNSW_EF_SEARCH = int(os.getenv("CSV_RAG_HNSW_EF_SEARCH", "64"))
+VECTOR_CODEC = os.getenv("CSV_RAG_VECTOR_CODEC", "float32").lower()
+CODEC_MIN_TRAIN_ROWS = int(os.getenv("CSV_RAG_CODEC_MIN_TRAIN_ROWS", "10000"))
+# Sub-vectors per PQ code (bytes per vector at 8 bits); lowered to a divisor of the dimension.
+PQ_SUBQUANTIZERS = int(os.getenv("CSV_RAG_PQ_M", "96"))
+PQ_BITS = 8
+MMAP_INDEX = os.getenv("CSV_RAG_MMAP_INDEX", "0") == "1"
+
+CODECS = ("float32", "fp16", "sq8", "pq")
+SQ_TYPES = {"fp16": faiss.ScalarQuantizer.QT_fp16, "sq8": faiss.ScalarQuantizer.QT_8bit}
+
+# Vectors are copied between indexes in batches so a rebuild never needs
+# the whole corpus as one float32 matrix.
+REBUILD_BATCH_SIZE = 50000
+# Number of training points k-means gets per inverted list.
+TRAIN_POINTS_PER_LIST = 64
+# Training sample for the sq8 ranges and the PQ codebooks (256 centroids each).
+CODEC_TRAIN_POINTS = 256 * 64
+
+
+def ivf_list_count(ntotal: int) -> int:
+    """The usual rule of thumb: about 4 * sqrt(n) inverted lists."""
+    return max(8, int(4 * math.sqrt(max(ntotal, 1))))
+
+
+def is_id_mapped(index) -> bool:
+    return isinstance(faiss.downcast_index(index), (faiss.IndexIDMap, faiss.IndexIDMap2))
+
+
+def inner_index(index):
+    """The underlying flat/IVF/HNSW index of an id-mapped index."""
+    index = faiss.downcast_index(index)
+    if isinstance(index, (faiss.IndexIDMap, faiss.IndexIDMap2)):
+        return faiss.downcast_index(index.index)
+    return index
+
+
+def index_ids(index) -> np.ndarray:
+    """Vector ids in storage order."""
+    index = faiss.downcast_index(index)
+    if isinstance(index, (faiss.IndexIDMap, faiss.IndexIDMap2)):
+        return faiss.vector_to_array(index.id_map).astype(np.int64)
+    if isinstance(index, faiss.IndexIVF):
+        return ivf_list_ids(index)
+    return np.arange(index.ntotal, dtype=np.int64)
+
+
+def ivf_list_ids(ivf) -> np.ndarray:
+    """The ids stored in an IVF index's inverted lists, list by list."""
+    invlists = ivf.invlists
+    ids = [faiss.rev_swig_ptr(invlists.get_ids(list_no), invlists.list_size(list_no)).copy()
+           for list_no in range(ivf.nlist) if invlists.list_size(list_no)]
+    return np.concatenate(ids).astype(np.int64) if ids else np.zeros(0, dtype=np.int64)
+
+
+def iter_ivf_vectors(ivf, ids: np.ndarray, batch_size: int = REBUILD_BATCH_SIZE):
+    """Yields (ids, vectors) for `ids` of an IVF index through a temporary id hash map."""
+    ivf.set_direct_map_type(faiss.DirectMap.Hashtable)
+    try:
+        for start in range(0, len(ids), batch_size):
+            batch_ids = ids[start:start + batch_size]
+            yield batch_ids, ivf.reconstruct_batch(batch_ids)
+    finally:
+        # remove_ids() refuses to run on some direct map types, so the map is never left behind.
+        ivf.set_direct_map_type(faiss.DirectMap.NoMap)
+
+
+def index_kind(index) -> str:
+    index = inner_index(index)
+    if isinstance(index, faiss.IndexHNSW):
+        return "hnsw"
+    if isinstance(index, faiss.IndexIVF):
+        return "ivf"
+    return "flat"
+
+
+def pq_subquantizers(dim: int) -> int:
+    m = max(1, min(PQ_SUBQUANTIZERS, dim))
+    while dim % m:
+        m -= 1
+    return m
+
+
+def index_codec(index) -> str:
+    inner = inner_index(index)
+    if isinstance(inner, faiss.IndexHNSW):
+        inner = faiss.downcast_index(inner.storage)
+    if isinstance(inner, (faiss.IndexScalarQuantizer, faiss.IndexIVFScalarQuantizer)):
+        qtype = inner.sq.qtype
+        return next((codec for codec, value in SQ_TYPES.items() if value == qtype), "sq8")
+    if isinstance(inner, (faiss.IndexPQ, faiss.IndexIVFPQ)):
+        return "pq"
+    return "float32"
+
+
+def target_codec(ntotal: int) -> str:
+    """The vector codec the configuration asks for at a given corpus size."""
+    if VECTOR_CODEC not in CODECS:
+        print(f"⚠️ Unknown CSV_RAG_VECTOR_CODEC '{VECTOR_CODEC}', using float32.")
+        return "float32"
+    if VECTOR_CODEC == "sq8" and ntotal < CODEC_MIN_TRAIN_ROWS:
+        return "float32"
+    # k-means needs at least one training point per PQ centroid.
+    if VECTOR_CODEC == "pq" and ntotal < max(CODEC_MIN_TRAIN_ROWS, 2 ** PQ_BITS):
+        return "float32"
+    return VECTOR_CODEC
+
+
+def target_kind(ntotal: int) -> str:
+    """The index type the configuration asks for at a given corpus size."""
+    if INDEX_TYPE == "flat":
+        return "flat"
+    if INDEX_TYPE == "hnsw":
+        return "hnsw"
+    if INDEX_TYPE == "ivf":
+        # IVF needs enough points to train its centroids on.
+        return "ivf" if ntotal >= IVF_MIN_TRAIN_ROWS else "flat"
+    if INDEX_TYPE != "auto":
+        print(f"⚠️ Unknown CSV_RAG_INDEX_TYPE '{INDEX_TYPE}', using auto.")
+    return "ivf" if ntotal > FLAT_MAX_ROWS else "flat"
+
+
+def tune_index(index):
+    """Applies the configured search-time parameters to an index."""
+    kind = index_kind(index)
+    if kind == "ivf":
+        faiss.extract_index_ivf(index).nprobe = IVF_NPROBE
+    elif kind == "hnsw":
+        inner_index(index).hnsw.efSearch = HNSW_EF_SEARCH
+    return index
+
+
+def create_index(dim: int, kind: str = "flat", nlist: int = 0, codec: str = "float32"):
+    """Creates an empty inner-product index that takes row ids with add_with_ids().
+
+    IVF indexes and the sq8/pq codecs still need training.
+    """
+    metric = faiss.METRIC_INNER_PRODUCT
+    m = pq_subquantizers(dim)
+    if kind == "hnsw":
+        if codec in SQ_TYPES:
+            index = faiss.IndexHNSWSQ(dim, SQ_TYPES[codec], HNSW_M, metric)
+        elif codec == "pq":
+            index = faiss.IndexHNSWPQ(dim, m, HNSW_M, PQ_BITS, metric)
+        else:
+            index = faiss.IndexHNSWFlat(dim, HNSW_M, metric)
+        index.hnsw.efConstruction = HNSW_EF_CONSTRUCTION
+    elif kind == "ivf":
+        quantizer = faiss.IndexFlatIP(dim)
+        nlist = nlist or ivf_list_count(0)
+        if codec in SQ_TYPES:
+            index = faiss.IndexIVFScalarQuantizer(quantizer, dim, nlist, SQ_TYPES[codec], metric)
+        elif codec == "pq":
+            index = faiss.IndexIVFPQ(quantizer, dim, nlist, m, PQ_BITS, metric)
+        else:
+            index = faiss.IndexIVFFlat(quantizer, dim, nlist, metric)
+        return tune_index(index)
+    elif codec in SQ_TYPES:
+        index = faiss.IndexScalarQuantizer(dim, SQ_TYPES[codec], metric)
+    elif codec == "pq":
+        index = faiss.IndexPQ(dim, m, PQ_BITS, metric)
+    else:
+        index = faiss.IndexFlatIP(dim)
+    return tune_index(faiss.IndexIDMap2(index))
+
+
+def ensure_id_map(index):
+    """Returns an index that maps vectors to row ids, or None if a saved one lost them.
+
+    Indexes saved before ids were tracked used the row positions as ids, which
+    IVF indexes hold natively and the others get wrapped for. IVF indexes saved
+    inside an IndexIDMap2 are unwrapped; if rows were ever removed from one,
+    its ids no longer match its vectors and the store has to be re-embedded.
+    """
+    if is_id_mapped(index) and isinstance(inner_index(index), faiss.IndexIVF):
+        return unwrap_ivf(index)
+    if is_id_mapped(index) or isinstance(faiss.downcast_index(index), faiss.IndexIVF):
+        return index
+    print("Adding an id map to the existing index...")
+    wrapped = create_index(index.d, "flat")
+    for ids, batch in iter_vectors(index):
+        wrapped.add_with_ids(batch, ids)
+    return wrapped
+
+
+def unwrap_ivf(index):
+    """Moves an IVF index out of its IndexIDMap2, storing the row ids in the inverted lists."""
+    inner = inner_index(index)
+    positions = ivf_list_ids(inner)
+    if not np.array_equal(np.sort(positions), np.arange(inner.ntotal)):
+        print("⚠️ The IVF index was changed after rows were removed from it; its row ids are unusable.")
+        return None
+    print("Moving the IVF index out of its id map...")
+    row_ids = index_ids(index)
+    unwrapped = faiss.clone_index(inner)
+    unwrapped.reset()
+    for batch_positions, batch in iter_ivf_vectors(inner, positions):
+        unwrapped.add_with_ids(batch, row_ids[batch_positions])
+    return tune_index(unwrapped)
+
+
+def iter_vectors(index, batch_size: int = REBUILD_BATCH_SIZE):
+    """Yields (ids, vectors) for everything stored in an index, batch by batch."""
+    if not is_id_mapped(index) and index_kind(index) == "ivf":
+        yield from iter_ivf_vectors(faiss.extract_index_ivf(index), index_ids(index), batch_size)
+        return
+    inner = inner_index(index)
+    ids = index_ids(index)
+    for start in range(0, inner.ntotal, batch_size):
+        count = min(batch_size, inner.ntotal - start)
+        yield ids[start:start + count], inner.reconstruct_n(start, count)
+
+
+def sample_vectors(index, count: int) -> np.ndarray:
+    """Returns an evenly spaced sample of the stored vectors for training."""
+    inner = inner_index(index)
+    positions = np.linspace(0, inner.ntotal - 1, num=min(count, inner.ntotal), dtype=np.int64)
+    if not is_id_mapped(index) and index_kind(index) == "ivf":
+        ids = index_ids(index)[positions]
+        return np.vstack([batch for _, batch in iter_ivf_vectors(faiss.extract_index_ivf(index), ids)]).astype(np.float32)
+    return np.vstack([inner.reconstruct(int(i)) for i in positions]).astype(np.float32)
+
+
+def rebuild_index(index, kind: str, skip_ids=None, codec: str = None):
+    """Copies the vectors of `index` (minus `skip_ids`) into a freshly built index of `kind`.
+
+    The codec defaults to the current one. Vectors come out of a compressed
+    index already quantized, so moving to a finer codec does not restore precision.
+    """
+    dim, ntotal = index.d, index.ntotal
+    nlist = ivf_list_count(ntotal) if kind == "ivf" else 0
+    new_index = create_index(dim, kind, nlist, codec or index_codec(index))
+    if not new_index.is_trained:
+        new_index.train(sample_vectors(index, max(nlist * TRAIN_POINTS_PER_LIST, CODEC_TRAIN_POINTS)))
+    for ids, batch in iter_vectors(index):
+        if skip_ids is not None:
+            keep = ~np.isin(ids, skip_ids)
+            ids, batch = ids[keep], batch[keep]
+        new_index.add_with_ids(batch, ids)
+    return new_index
+
+
+def remove_ids(index, ids):
+    """Removes vectors by id and returns the index to keep using.
+
+    HNSW graphs cannot delete nodes, so those are rebuilt without the removed ids.
+    """
+    ids = np.asarray(list(ids), dtype=np.int64)
+    if len(ids) == 0:
+        return index
+    if index_kind(index) == "hnsw":
+        return rebuild_index(index, "hnsw", skip_ids=ids)
+    index.remove_ids(faiss.IDSelectorBatch(ids))
+    return index
+
+
+def planned_layout(index):
+    """The (index type, codec) `index` should have, given its current size.
+
+    Outside of an explicit "flat" setting, a small corpus is not a reason to
+    throw away an approximate index that has already been built, and a trained
+    codec is likewise kept when the corpus shrinks below its training size.
+    """
+    kind, wanted = index_kind(index), target_kind(index.ntotal)
+    if wanted == "flat" and kind != "flat" and INDEX_TYPE != "flat" and index.ntotal > 0:
+        wanted = kind
+    codec, wanted_codec = index_codec(index), target_codec(index.ntotal)
+    if wanted_codec == "float32" and codec == VECTOR_CODEC:
+        wanted_codec = codec
+    return wanted, wanted_codec
+
+
+def needs_rebuild(index) -> bool:
+    if planned_layout(index) != (index_kind(index), index_codec(index)):
+        return True
+    if index_kind(index) == "ivf":
+        # Retrain once the ideal list count has doubled since the last training.
+        return ivf_list_count(index.ntotal) >= 2 * faiss.extract_index_ivf(index).nlist
+    return False
+
+
+def maybe_rebuild_index(index):
+    """Returns `index`, or a rebuilt replacement if the corpus has outgrown it."""
+    if not needs_rebuild(index):
+        return tune_index(index)
+    kind, codec = planned_layout(index)
+    print(f"🔧 Rebuilding {index_kind(index)}/{index_codec(index)} index as {kind}/{codec} "
+          f"for {index.ntotal} vectors...")
+    new_index = rebuild_index(index, kind, codec=codec)
+    print(f"✅ Index rebuilt ({describe_index(new_index)}).")
+    return new_index
+
+
+def load_index(path: str, mmap: bool = MMAP_INDEX):
+    """Reads a saved index, memory-mapping its vector codes when `mmap` is set.
+
+    A mapped index must never be added to or removed from (faiss aborts the
+    process); take an in-RAM copy with writable_copy() first.
+    """
+    if mmap:
+        return faiss.read_index(path, faiss.IO_FLAG_MMAP_IFC)
+    return faiss.read_index(path)
+
+
+def writable_copy(index):
+    """An in-RAM copy of a (possibly memory-mapped) index that can be modified."""
+    return tune_index(faiss.deserialize_index(faiss.serialize_index(index)))
+
+
+def save_index_file(index, path: str):
+    """Writes the index next to `path` and renames it into place.
+
+    Workers that have the old file memory-mapped keep reading the old copy
+    instead of seeing it rewritten under them.
+    """
+    tmp_path = f"{path}.tmp"
+    faiss.write_index(index, tmp_path)
+    os.replace(tmp_path, path)
+
+
+def describe_index(index) -> dict:
+    info = {"type": index_kind(index), "codec": index_codec(index), "ntotal": int(index.ntotal), "dim": int(index.d)}
+    if info["type"] == "ivf":
+        ivf = faiss.extract_index_ivf(index)
+        info.update(nlist=int(ivf.nlist), nprobe=int(ivf.nprobe))
+    elif info["type"] == "hnsw":
+        hnsw = inner_index(index).hnsw
+        info.update(M=HNSW_M, ef_search=int(hnsw.efSearch))
+    return info
@@ -3,6 +3,9 @@ from flask_cors import CORS
 import pandas as pd
 import os
 import json
+import pickle
+import re
+import threading
 import requests
 from werkzeug.utils import secure_filename
 import traceback
@@ -16,11 +19,15 @@ CORS(app, supports_credentials=True)
 
 # Configure upload folder - use absolute path
 UPLOAD_FOLDER = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'uploads')
+# Columnar snapshots of the uploads, one per file; lookups read these, never the spreadsheets.
+SNAPSHOT_FOLDER = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'snapshots')
 ALLOWED_EXTENSIONS = {'csv', 'xlsx', 'xls'}
+REQUIRED_COLUMNS = ['USN', 'STUDENT NAME', 'CLASS', 'SEAT NO.', 'YEAR']
 
-# Ensure upload folder exists
-if not os.path.exists(UPLOAD_FOLDER):
-    os.makedirs(UPLOAD_FOLDER)
+# Ensure upload and snapshot folders exist
+for folder in (UPLOAD_FOLDER, SNAPSHOT_FOLDER):
+    if not os.path.exists(folder):
+        os.makedirs(folder)
 
 # Enable debug logging
 app.debug = True
@@ -30,41 +37,166 @@ app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
 def allowed_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
-def load_student_data():
+def latest_upload():
+    """Path of the most recently uploaded data file, or None if there is none."""
+    files = [f for f in os.listdir(UPLOAD_FOLDER) if any(f.endswith(ext) for ext in ALLOWED_EXTENSIONS)]
+    if not files:
+        return None
+    return max([os.path.join(UPLOAD_FOLDER, f) for f in files], key=os.path.getctime)
+
+def normalize_column(name):
+    """'SEAT NO.' -> 'seat_no', ' Student Name ' -> 'student_name'."""
+    return re.sub(r'[^a-z0-9]+', '_', str(name).strip().lower()).strip('_')
+
+def read_upload(path):
+    """Reads an uploaded spreadsheet into one frame with normalized column names and USNs.
+
+    Every sheet of a workbook that has a USN column is included, in sheet order.
+    """
+    if path.endswith('.csv'):
+        frames = [pd.read_csv(path)]
+    else:
+        frames = list(pd.read_excel(path, sheet_name=None).values())
+    frames = [frame.rename(columns=normalize_column) for frame in frames]
+    with_usn = [frame for frame in frames if 'usn' in frame.columns]
+    df = pd.concat(with_usn, ignore_index=True) if with_usn else frames[0]
+    if 'usn' in df.columns:
+        df = df[df['usn'].notna()]
+        df = df.assign(usn=df['usn'].astype(str).str.strip().str.upper())
+        df = df[df['usn'] != ''].reset_index(drop=True)
+    return df
+
+def missing_columns(df):
+    return [col for col in REQUIRED_COLUMNS if normalize_column(col) not in df.columns]
+
+def file_signature(path):
+    stat = os.stat(path)
+    return stat.st_mtime_ns, stat.st_size
+
+def snapshot_path(path):
+    return os.path.join(SNAPSHOT_FOLDER, os.path.basename(path) + '.pkl')
+
+def write_snapshot(path, df):
+    """Saves df column by column as numpy arrays, stamped with the signature of the file it came from."""
+    snapshot = {
+        'source_signature': file_signature(path),
+        'columns': {col: df[col].to_numpy() for col in df.columns},
+    }
+    temp_path = snapshot_path(path) + '.tmp'
+    with open(temp_path, 'wb') as f:
+        pickle.dump(snapshot, f, protocol=pickle.HIGHEST_PROTOCOL)
+    # Readers see either the old snapshot or the complete new one.
+    os.replace(temp_path, snapshot_path(path))
+
+def read_snapshot(path):
+    """The snapshot of the file at path as a frame, or None if there is none or the file changed since."""
     try:
-        # Get the most recent file from the uploads folder
-        files = [f for f in os.listdir(UPLOAD_FOLDER) if any(f.endswith(ext) for ext in ALLOWED_EXTENSIONS)]
-        if not files:
-            return {}
-        
-        latest_file = max([os.path.join(UPLOAD_FOLDER, f) for f in files], key=os.path.getctime)
-        
-        # Read file based on extension
-        if latest_file.endswith('.csv'):
-            df = pd.read_csv(latest_file)
-        else:
-            df = pd.read_excel(latest_file)
-        
-        # Convert DataFrame to dictionary format for easy lookup
-        student_data = {}
-        for _, row in df.iterrows():
-            # Map the columns from the Excel format
-            usn = str(row['USN']).upper() if 'USN' in df.columns else None
-            if not usn:
-                continue
-                
-            student_data[usn] = {
-                'name': row['STUDENT NAME'] if 'STUDENT NAME' in df.columns else 'Not available',
-                'regNo': usn,
-                'hall': row['CLASS'] if 'CLASS' in df.columns else 'Not assigned',
-                'room': row['FLOOR'] if 'FLOOR' in df.columns else 'Not assigned',
-                'seat': f"Seat {row['SEAT NO.']}" if 'SEAT NO.' in df.columns else 'Not assigned',
-                'semester': row['YEAR'] if 'YEAR' in df.columns else 'Not available'
-            }
-        return student_data
-    except Exception as e:
-        print(f"Error loading student data: {e}")
+        with open(snapshot_path(path), 'rb') as f:
+            snapshot = pickle.load(f)
+    except (OSError, EOFError, pickle.UnpicklingError):
+        return None
+    if not os.path.exists(path) or snapshot['source_signature'] != file_signature(path):
+        return None
+    return pd.DataFrame(snapshot['columns'])
+
+def prune_snapshots():
+    """Removes the snapshots of files that are no longer in uploads/."""
+    uploads = set(os.listdir(UPLOAD_FOLDER))
+    for name in os.listdir(SNAPSHOT_FOLDER):
+        if name.endswith('.pkl') and name[:-len('.pkl')] not in uploads:
+            os.remove(os.path.join(SNAPSHOT_FOLDER, name))
+
+def build_student_index(df):
+    """USN -> display record for every row of a snapshot frame, built column-wise instead of row by row."""
+    if 'usn' not in df.columns:
+        return {}
+
+    def column(name, default):
+        return df[name] if name in df.columns else pd.Series(default, index=df.index)
+
+    records = pd.DataFrame({
+        'name': column('student_name', 'Not available'),
+        'regNo': df['usn'],
+        'hall': column('class', 'Not assigned'),
+        'room': column('floor', 'Not assigned'),
+        'seat': 'Seat ' + df['seat_no'].astype(str) if 'seat_no' in df.columns else 'Not assigned',
+        'semester': column('year', 'Not available'),
+    })
+    # Later rows win for a repeated USN, as they did with the old row loop.
+    return dict(zip(df['usn'], records.to_dict('records')))
+
+def load_student_data(latest_file):
+    """Builds the USN index from the snapshot of an upload; None if the snapshot is missing or out of date."""
+    if latest_file is None:
         return {}
+    df = read_snapshot(latest_file)
+    if df is None:
+        return None
+    return build_student_index(df)
+
+# Uploads whose snapshot is being written in the background.
+_converting = set()
+
+def convert_upload(path):
+    """Writes the snapshot of a file that arrived without one (e.g. copied into uploads/), then reloads the index."""
+    try:
+        try:
+            df = read_upload(path)
+        except Exception as e:
+            print(f"Error loading student data: {e}")
+            # An unreadable file serves no students, as before, instead of being retried on every request.
+            df = pd.DataFrame()
+        write_snapshot(path, df)
+        app.logger.info(f'Snapshot written for {path}: {len(df)} rows')
+    except OSError as e:
+        print(f"Error writing snapshot for {path}: {e}")
+        return
+    finally:
+        _converting.discard(path)
+    refresh_student_index()
+
+# In-memory USN index shared by all requests: (data signature, USN -> record, list of records).
+# It is replaced as a whole, never modified in place, so readers always see one consistent version.
+_student_index = ((None, None), {}, [])
+_student_index_lock = threading.Lock()
+
+def data_signature(path):
+    """(uploads/ mtime, path, mtime and size of path): changes when a file is added or removed, or path is rewritten."""
+    signature = (os.stat(UPLOAD_FOLDER).st_mtime_ns, path)
+    if path and os.path.exists(path):
+        stat = os.stat(path)
+        signature += (stat.st_mtime_ns, stat.st_size)
+    return signature
+
+def refresh_student_index(force=False):
+    """Rebuilds the USN index if the uploaded data changed since it was built (or always, with force)."""
+    global _student_index
+    with _student_index_lock:
+        signature = _student_index[0]
+        if not force and data_signature(signature[1]) == signature:
+            return
+        # Taken before reading, so a write that lands during the rebuild triggers another one.
+        latest_file = latest_upload()
+        signature = data_signature(latest_file)
+        data = load_student_data(latest_file)
+        if data is None:
+            # Convert off the request path; until then, keep serving the current index.
+            if latest_file not in _converting:
+                _converting.add(latest_file)
+                threading.Thread(target=convert_upload, args=(latest_file,), daemon=True).start()
+            return
+        _student_index = (signature, data, list(data.values()))
+        app.logger.info(f'USN index rebuilt: {len(data)} students from {latest_file}')
+
+def get_student_index():
+    """The current USN index. Checking it is fresh takes two stat() calls; the data is re-read only when it changed."""
+    signature = _student_index[0]
+    if data_signature(signature[1]) != signature:
+        refresh_student_index()
+    return _student_index
+
+# Load the index from the latest snapshot in the background, so the first lookups don't pay for it.
+threading.Thread(target=refresh_student_index, daemon=True).start()
 
 @app.route('/upload', methods=['POST'])
 def upload_file():
@@ -91,20 +223,18 @@ def upload_file():
         file.save(filepath)
         app.logger.info(f'File saved successfully: {filename}')
 
-        # Read and validate file based on extension
-        if filepath.endswith('.csv'):
-            df = pd.read_csv(filepath)
-        else:
-            df = pd.read_excel(filepath)
-        required_columns = ['USN', 'STUDENT NAME', 'CLASS', 'SEAT NO.', 'YEAR']
-        missing_columns = [col for col in required_columns if col not in df.columns]
+        # Read and validate the file once; lookups are served from its snapshot from now on
+        df = read_upload(filepath)
+        missing = missing_columns(df)
 
-        if missing_columns:
+        if missing:
             os.remove(filepath)
-            app.logger.error(f'Missing columns: {", ".join(missing_columns)}')
-            return jsonify({'error': f'Missing required columns: {", ".join(missing_columns)}'}), 400
+            app.logger.error(f'Missing columns: {", ".join(missing)}')
+            return jsonify({'error': f'Missing required columns: {", ".join(missing)}'}), 400
 
         app.logger.info('File validation successful')
+        write_snapshot(filepath, df)
+        refresh_student_index(force=True)
         return jsonify({
             'message': 'File uploaded successfully',
             'filename': filename
@@ -137,7 +267,9 @@ def delete_data():
             except Exception as e:
                 app.logger.error(f'Error deleting file {file}: {str(e)}')
                 continue
-        
+        prune_snapshots()
+        refresh_student_index(force=True)
+
         return jsonify({'message': 'All exam hall data has been deleted successfully'}), 200
     except Exception as e:
         app.logger.error(f'Error deleting data: {str(e)}')
@@ -145,8 +277,8 @@ def delete_data():
 
 @app.route('/search/<usn>', methods=['GET'])
 def search_student(usn):
-    student_data = load_student_data()
-    student = student_data.get(usn.upper())  # Convert USN to uppercase for consistency
+    _, student_data, _ = get_student_index()
+    student = student_data.get(usn.strip().upper())  # Convert USN to uppercase for consistency
     
     if student:
         # Format the data according to the display requirements
@@ -163,8 +295,8 @@ def search_student(usn):
 
 @app.route('/students', methods=['GET'])
 def get_all_students():
-    student_data = load_student_data()
-    return jsonify(list(student_data.values()))
+    _, _, students = get_student_index()
+    return jsonify(students)
 
 
 
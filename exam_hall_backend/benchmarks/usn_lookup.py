@@ -0,0 +1,131 @@
+"""Latency of /search/<usn> with the in-memory USN index versus re-reading the upload per request.
+
+Writes a synthetic allocation sheet into a temporary uploads folder, then
+reports per-request latency through the Flask test client for the cached
+index, the same lookups when every request re-reads and rebuilds from the
+file (the old behaviour), how long one index build takes row by row versus
+column-wise, and how long reading the sheet as .csv or .xlsx takes compared
+with loading its columnar snapshot.
+
+Run from the exam_hall_backend directory:
+
+    python -m benchmarks.usn_lookup --rows 5000
+    python -m benchmarks.usn_lookup --rows 20000 --requests 2000 --json usn.json
+"""
+import argparse
+import json
+import os
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+import app as exam_hall
+
+DEPARTMENTS = ['AI', 'CS', 'EC', 'ME', 'CV']
+YEARS = ['First Year', 'Second Year', 'Third Year', 'Final Year']
+
+
+def synthetic_sheet(rows, seed=0):
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({
+        'SEAT NO.': np.arange(1, rows + 1),
+        'USN': [f'4DM{22 - i % 4}{DEPARTMENTS[i % 5]}{i:05d}' for i in range(rows)],
+        'STUDENT NAME': [f'STUDENT {i}' for i in range(rows)],
+        'YEAR': rng.choice(YEARS, size=rows),
+        'CLASS': [f'GLH-{n:02d}' for n in rng.integers(1, 40, size=rows)],
+        'FLOOR': rng.choice(['G', '1ST', '2ND', '3RD'], size=rows),
+    })
+
+
+def row_by_row_index(df):
+    """The old iterrows() build, kept here for comparison."""
+    student_data = {}
+    for _, row in df.iterrows():
+        usn = str(row['USN']).upper()
+        student_data[usn] = {'name': row['STUDENT NAME'], 'regNo': usn, 'hall': row['CLASS'],
+                             'room': row['FLOOR'], 'seat': f"Seat {row['SEAT NO.']}", 'semester': row['YEAR']}
+    return student_data
+
+
+def timed_ms(fn, *args):
+    start = time.perf_counter()
+    result = fn(*args)
+    return result, round((time.perf_counter() - start) * 1000, 1)
+
+
+def percentiles(samples_ms):
+    samples = np.array(samples_ms)
+    return {'p50_ms': round(float(np.percentile(samples, 50)), 3),
+            'p99_ms': round(float(np.percentile(samples, 99)), 3),
+            'requests_per_s': round(1000 / float(samples.mean()), 1)}
+
+
+def time_requests(client, usns):
+    latencies = []
+    for usn in usns:
+        start = time.perf_counter()
+        response = client.get(f'/search/{usn}')
+        latencies.append((time.perf_counter() - start) * 1000)
+        assert response.status_code == 200, response.status_code
+    return percentiles(latencies)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=5000)
+    parser.add_argument('--requests', type=int, default=1000)
+    parser.add_argument('--json', help='also write the report to this file')
+    args = parser.parse_args()
+
+    df = synthetic_sheet(args.rows)
+    rng = np.random.default_rng(1)
+    usns = [df['USN'][i] for i in rng.integers(0, args.rows, size=args.requests)]
+    exam_hall.app.logger.disabled = True
+    report = {'rows': args.rows, 'requests': args.requests}
+    with tempfile.TemporaryDirectory() as tmp:
+        uploads, snapshots = os.path.join(tmp, 'uploads'), os.path.join(tmp, 'snapshots')
+        os.makedirs(uploads)
+        os.makedirs(snapshots)
+        exam_hall.UPLOAD_FOLDER, exam_hall.SNAPSHOT_FOLDER = uploads, snapshots
+        xlsx_path = os.path.join(tmp, 'students.xlsx')
+        df.to_excel(xlsx_path, index=False)
+        csv_path = os.path.join(uploads, 'students.csv')
+        df.to_csv(csv_path, index=False)
+        client = exam_hall.app.test_client()
+
+        _, report['read_xlsx_ms'] = timed_ms(exam_hall.read_upload, xlsx_path)
+        normalized, report['read_csv_ms'] = timed_ms(exam_hall.read_upload, csv_path)
+        exam_hall.write_snapshot(csv_path, normalized)
+        _, report['load_snapshot_ms'] = timed_ms(exam_hall.read_snapshot, csv_path)
+        _, report['build_row_by_row_ms'] = timed_ms(row_by_row_index, df)
+        _, report['build_vectorized_ms'] = timed_ms(exam_hall.build_student_index, normalized)
+
+        client.get(f'/search/{usns[0]}')  # builds the index
+        report['cached'] = time_requests(client, usns)
+
+        # Old behaviour: every request re-reads the upload and rebuilds the index.
+        rereads = max(args.requests // 20, 10)
+        refresh = exam_hall.get_student_index
+        exam_hall.get_student_index = lambda: (
+            None, exam_hall.build_student_index(exam_hall.read_upload(exam_hall.latest_upload())), [])
+        try:
+            report['reread_per_request'] = time_requests(client, usns[:rereads])
+        finally:
+            exam_hall.get_student_index = refresh
+
+    print(f"📊 {args.rows} students: index build {report['build_row_by_row_ms']} ms row by row, "
+          f"{report['build_vectorized_ms']} ms vectorized")
+    print(f"read .xlsx {report['read_xlsx_ms']} ms, .csv {report['read_csv_ms']} ms, "
+          f"snapshot {report['load_snapshot_ms']} ms")
+    for name in ('cached', 'reread_per_request'):
+        row = report[name]
+        print(f"{name:<20} p50={row['p50_ms']}ms p99={row['p99_ms']}ms  {row['requests_per_s']} req/s")
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()